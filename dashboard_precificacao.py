@@ -11,34 +11,22 @@ from datetime import datetime, timedelta
 import io
 import json
 import hashlib
+import tempfile
+import importlib.util
+import time
 import unicodedata
+import zlib
 
-# Bibliotecas de visualização
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import folium
-from streamlit_folium import st_folium
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # Backend não-interativo para PDFs
+# Bibliotecas pesadas (plotly, folium, matplotlib, reportlab, geopandas e requests)
+# são importadas dentro das funções que as usam: a maioria das sessões não gera
+# PDF e o custo de importação só é pago quando o recurso é usado pela primeira vez.
+# Para medir: python precificacao_cli.py benchmark-importacao
 
-import requests
+# GeoPandas é opcional (evita erros no Streamlit Cloud): verifica sem importar
+GEOPANDAS_AVAILABLE = importlib.util.find_spec("geopandas") is not None
 
-# GeoPandas será importado quando necessário para evitar erros no Streamlit Cloud
-try:
-    import geopandas as gpd
-    GEOPANDAS_AVAILABLE = True
-except ImportError:
-    GEOPANDAS_AVAILABLE = False
-    gpd = None
-
-# Bibliotecas para geração de PDF
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image
-from reportlab.lib.units import inch
+# DuckDB é opcional: sem ele o construtor de consultas executa em pandas
+DUCKDB_AVAILABLE = importlib.util.find_spec("duckdb") is not None
 
 # Bibliotecas para IA e Machine Learning (versão simplificada)
 import warnings
@@ -127,9 +115,118 @@ def formatar_valor_brasileiro(valor):
     except:
         return str(valor)
 
-def formatar_dataframe_para_exibicao(df, colunas_selecionadas=None):
+# Versões vetorizadas (colunas inteiras) das formatações acima, com saída idêntica.
+# A parte numérica é feita em inteiros (NumPy) e o texto é montado por tabelas de
+# grupos de 3 dígitos; valores em que o arredondamento em ponto flutuante poderia
+# divergir do f-string (quase empates em x,x5, infinitos, números enormes) são
+# formatados pela função escalar. Para medir:
+#   python precificacao_cli.py benchmark-formatacao --linhas 100000
+
+# Faixas de grandeza de formatar_valor_grande (limites inferiores K, M, B)
+LIMITES_VALOR_GRANDE = [1_000, 1_000_000, 1_000_000_000]
+DIVISORES_VALOR_GRANDE = np.array([1, 1_000, 1_000_000, 1_000_000_000], dtype=float)
+CASAS_VALOR_GRANDE = np.array([0, 0, 1, 1])
+SUFIXOS_VALOR_GRANDE = np.array(['', 'K', 'M', 'B'])
+
+# Tabelas de texto dos grupos de 3 dígitos: '7' (grupo inicial) e '007' (demais)
+_GRUPOS_INICIAIS = np.array([str(i) for i in range(1000)])
+_GRUPOS_COMPLETOS = np.array([f"{i:03d}" for i in range(1000)])
+
+def _inteiros_para_texto(inteiros, separador=''):
+    """Converte um array de inteiros não negativos em texto: (1234567, '.') → '1.234.567'"""
+    grupos = []
+    resto = inteiros
+    while True:
+        grupos.append(resto % 1000)
+        resto = resto // 1000
+        if not resto.any():
+            break
+
+    # Do grupo mais significativo para o menor; o primeiro grupo não nulo não leva zeros à esquerda
+    texto = np.full(len(inteiros), '', dtype=f'U{4 * len(grupos)}')
+    iniciado = np.zeros(len(inteiros), dtype=bool)
+    for indice in range(len(grupos) - 1, -1, -1):
+        grupo = grupos[indice]
+        comeca = ~iniciado & ((grupo > 0) | (indice == 0))
+        if iniciado.any():
+            continuacao = np.char.add(np.char.add(texto, separador), _GRUPOS_COMPLETOS[grupo])
+            texto = np.where(iniciado, continuacao, texto)
+        texto = np.where(comeca, _GRUPOS_INICIAIS[grupo], texto)
+        iniciado |= comeca
+    return texto
+
+def _preencher_texto(resultado, posicoes, texto):
+    """Copia texto para as posições do array de resultado, alargando o tipo de texto se preciso"""
+    resultado = resultado.astype(np.promote_types(resultado.dtype, texto.dtype), copy=False)
+    resultado[posicoes] = texto
+    return resultado
+
+def formatar_valor_grande_serie(valores, incluir_rs=True):
+    """
+    Versão vetorizada de formatar_valor_grande para uma coluna inteira
+    Valores ausentes ou não positivos viram 'N/A'
+    """
+    x = pd.to_numeric(valores, errors='coerce').to_numpy(dtype=float)
+    resultado = np.full(len(x), 'N/A')
+
+    positivos = np.flatnonzero(x > 0)
+    if len(positivos):
+        v = x[positivos]
+        faixa = np.searchsorted(LIMITES_VALOR_GRANDE, v, side='right')
+        casas = CASAS_VALOR_GRANDE[faixa]
+        escalado = v / DIVISORES_VALOR_GRANDE[faixa] * 10.0 ** casas
+
+        # Fora da faixa exata dos inteiros ou perto de x,x5: função escalar
+        escalar = ~np.isfinite(escalado) | (escalado >= 2 ** 53)
+        escalar |= (casas == 1) & (np.abs(escalado - np.floor(escalado) - 0.5) <= 2 * np.spacing(escalado))
+        inteiros = np.where(escalar, 0, np.rint(escalado)).astype(np.int64)
+
+        decimal = np.where(casas == 1, inteiros % 10, -1)
+        texto = _inteiros_para_texto(np.where(casas == 1, inteiros // 10, inteiros))
+        texto = np.char.add(texto, np.where(decimal >= 0, np.char.add(',', _GRUPOS_INICIAIS[decimal % 10]), ''))
+        texto = np.char.add(texto, SUFIXOS_VALOR_GRANDE[faixa])
+        if incluir_rs:
+            texto = np.char.add("R$ ", texto)
+        resultado = _preencher_texto(resultado, positivos, texto)
+
+        if escalar.any():
+            resultado = resultado.astype(object)
+            for posicao in positivos[escalar]:
+                resultado[posicao] = formatar_valor_grande(x[posicao], incluir_rs)
+
+    return pd.Series(resultado, index=valores.index)
+
+def formatar_numero_brasileiro_serie(valores):
+    """
+    Versão vetorizada de formatar_numero_brasileiro para uma coluna inteira
+    Valores ausentes viram 'N/A'
+    """
+    x = pd.to_numeric(valores, errors='coerce').to_numpy(dtype=float)
+    resultado = np.full(len(x), 'N/A')
+
+    validos = ~np.isnan(x)
+    truncados = np.trunc(x)
+    exatos = validos & (np.abs(truncados) < 2 ** 53)
+    if exatos.any():
+        inteiros = truncados[exatos].astype(np.int64)
+        texto = _inteiros_para_texto(np.abs(inteiros), separador='.')
+        resultado = _preencher_texto(resultado, exatos, np.char.add(np.where(inteiros < 0, '-', ''), texto))
+
+    # Infinitos e números enormes: função escalar
+    escalar = np.flatnonzero(validos & ~exatos)
+    if len(escalar):
+        resultado = resultado.astype(object)
+        for posicao in escalar:
+            resultado[posicao] = formatar_numero_brasileiro(x[posicao])
+
+    return pd.Series(resultado, index=valores.index)
+
+def formatar_dataframe_para_exibicao(df, colunas_selecionadas=None, df_referencia=None):
     """
     Formata DataFrame para exibição resumida, especialmente valores monetários grandes
+
+    df_referencia: DataFrame completo quando df é apenas uma página da tabela
+    (decide quais colunas monetárias usam a formatação resumida)
     """
     if df.empty:
         return df
@@ -145,9 +242,7 @@ def formatar_dataframe_para_exibicao(df, colunas_selecionadas=None):
                     # Converter para numérico e aplicar formatação resumida
                     valores_numericos = pd.to_numeric(df_formatado[coluna], errors='coerce')
                     # Criar nova coluna formatada em string para evitar warning
-                    df_formatado[coluna] = valores_numericos.apply(
-                        lambda x: formatar_valor_grande(x) if pd.notna(x) and x > 0 else 'N/A'
-                    ).astype(str)
+                    df_formatado[coluna] = formatar_valor_grande_serie(valores_numericos)
                 except:
                     pass
             
@@ -155,11 +250,13 @@ def formatar_dataframe_para_exibicao(df, colunas_selecionadas=None):
             elif any(palavra in coluna.lower() for palavra in ['preco', 'valor', 'custo', 'receita']):
                 try:
                     valores_numericos = pd.to_numeric(df_formatado[coluna], errors='coerce')
+                    referencia = (
+                        pd.to_numeric(df_referencia[coluna], errors='coerce')
+                        if df_referencia is not None else valores_numericos
+                    )
                     # Se os valores são muito grandes (> 1 milhão), usar formatação resumida
-                    if valores_numericos.max() > 1_000_000:
-                        df_formatado[coluna] = valores_numericos.apply(
-                            lambda x: formatar_valor_grande(x) if pd.notna(x) and x > 0 else 'N/A'
-                        ).astype(str)
+                    if referencia.max() > 1_000_000:
+                        df_formatado[coluna] = formatar_valor_grande_serie(valores_numericos)
                 except:
                     pass
                     
@@ -167,9 +264,7 @@ def formatar_dataframe_para_exibicao(df, colunas_selecionadas=None):
             elif 'populacao' in coluna.lower() or 'população' in coluna.lower():
                 try:
                     valores_numericos = pd.to_numeric(df_formatado[coluna], errors='coerce')
-                    df_formatado[coluna] = valores_numericos.apply(
-                        lambda x: formatar_numero_brasileiro(x) if pd.notna(x) else 'N/A'
-                    ).astype(str)
+                    df_formatado[coluna] = formatar_numero_brasileiro_serie(valores_numericos)
                 except:
                     pass
     
@@ -573,6 +668,46 @@ def clean_brazilian_number(value):
     except ValueError:
         return np.nan
 
+def converter_coluna_numerica(serie):
+    """
+    Versão vetorizada de clean_brazilian_number para uma coluna inteira
+    (mesmas regras de conversão, sem chamar a função linha a linha)
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+
+    texto = serie.astype(str).str.replace('"', '', regex=False).str.strip()
+    numeros = _texto_para_float(texto)
+
+    # Apenas os valores que não são números simples passam pelas regras brasileiras
+    pendentes = numeros.isna() & serie.notna()
+    if pendentes.any():
+        resto = texto[pendentes]
+        com_virgula = resto.str.contains(',', regex=False)
+
+        # Vírgula decimal: remove os pontos de milhares da parte antes da última vírgula
+        partes = resto[com_virgula].str.extract(r'^(.*),([^,]*)$')
+        resto[com_virgula] = partes[0].str.replace('.', '', regex=False) + '.' + partes[1]
+
+        # Apenas pontos: múltiplos pontos são separadores de milhares
+        varios_pontos = ~com_virgula & (resto.str.count(r'\.') > 1)
+        resto[varios_pontos] = resto[varios_pontos].str.replace('.', '', regex=False)
+
+        numeros[pendentes] = _texto_para_float(resto)
+
+    return numeros
+
+def _texto_para_float(texto):
+    """Converte textos em float (NaN quando inválido) com o mesmo arredondamento de float()"""
+    numeros = pd.to_numeric(texto, errors='coerce').astype(float)
+    validos = numeros.notna()
+    try:
+        # pd.to_numeric pode diferir de float() no último dígito em decimais longos
+        numeros[validos] = texto[validos].astype(float)
+    except ValueError:
+        pass
+    return numeros
+
 # =============================================================================
 # SISTEMA DE RECOMENDAÇÃO INTELIGENTE
 # =============================================================================
@@ -655,6 +790,13 @@ def calculate_municipality_score(df_row, preferences):
     
     return min(100, max(0, score)), explanations
 
+COLUNAS_RADAR = ['Nota_Vegetacao', 'Nota_Area', 'Nota_Relevo', 'Nota P Q1', 'Nota P Q2']
+
+# Colunas exibidas nos cards das recomendações (o dataset é carregado como texto)
+COLUNAS_NUMERICAS_RECOMENDACAO = [
+    'Valor_Municipal_Area', 'Populacao', 'Nota_Media', 'Num_Imoveis',
+] + COLUNAS_RADAR
+
 def get_smart_recommendations(df, preferences, top_n=5):
     """Gera recomendações inteligentes baseadas nas preferências"""
     recommendations = []
@@ -669,9 +811,17 @@ def get_smart_recommendations(df, preferences, top_n=5):
             'data': row
         })
     
-    # Ordena por score e retorna top N
+    # Ordena por score e retorna top N, com as colunas exibidas já numéricas
     recommendations.sort(key=lambda x: x['score'], reverse=True)
-    return recommendations[:top_n]
+    recommendations = recommendations[:top_n]
+    for rec in recommendations:
+        data = rec['data'].to_dict()
+        for coluna in COLUNAS_NUMERICAS_RECOMENDACAO:
+            if coluna in data:
+                valor = clean_brazilian_number(data[coluna])
+                data[coluna] = 0 if pd.isna(valor) else valor
+        rec['data'] = data
+    return recommendations
 
 def create_recommendation_interface(df):
     """Cria a interface de recomendação inteligente"""
@@ -858,20 +1008,18 @@ def display_recommendations(recommendations, df):
             
             # Gráfico radar do município
             if i < 3:  # Mostrar radar apenas para top 3
-                create_municipality_radar(data, municipio)
+                notas_radar = {coluna: data.get(coluna, 0) for coluna in COLUNAS_RADAR}
+                fig_radar = figura_em_cache('radar_municipio', notas_radar, municipio)
+                st.plotly_chart(fig_radar, use_container_width=True, config=PLOTLY_CONFIG)
             
             st.markdown("---")
 
 def create_municipality_radar(data, municipio):
     """Cria gráfico radar para um município específico"""
+    import plotly.graph_objects as go
+
     categories = ['Vegetação', 'Área', 'Relevo', 'Qualidade P.Q1', 'Qualidade P.Q2']
-    values = [
-        data.get('Nota_Vegetacao', 0),
-        data.get('Nota_Area', 0),
-        data.get('Nota_Relevo', 0),
-        data.get('Nota P Q1', 0),
-        data.get('Nota P Q2', 0)
-    ]
+    values = [data.get(coluna, 0) for coluna in COLUNAS_RADAR]
     
     # Normalizar valores para 0-10
     max_val = max(values) if max(values) > 0 else 1
@@ -900,15 +1048,18 @@ def create_municipality_radar(data, municipio):
         margin=dict(l=50, r=50, t=50, b=50)
     )
     
-    st.plotly_chart(fig, use_container_width=True, config=PLOTLY_CONFIG)
+    return fig
 
 # =============================================================================
 # CARREGAMENTO E PROCESSAMENTO DE DADOS
 # =============================================================================
 
+# Colunas de nome do município, em ordem de prioridade
+COLUNAS_MUNICIPIO = ['Municipio', 'mun_nome', 'Municipio_Raw', 'NM_MUN']
+
 def get_municipio_column(df):
     """Retorna o nome da coluna de município disponível no DataFrame, priorizando a capitalizada"""
-    for col in ['Municipio', 'mun_nome', 'Municipio_Raw', 'NM_MUN']:
+    for col in COLUNAS_MUNICIPIO:
         if col in df.columns:
             return col
     return None
@@ -923,6 +1074,28 @@ def normalizar_texto(texto):
     texto_sem_acentos = ''.join(c for c in texto_normalizado if unicodedata.category(c) != 'Mn')
     return texto_sem_acentos
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def indice_busca_municipios(_df, versao_dados, _delta=None):
+    """
+    Índice de busca dos municípios (calculado uma vez por versão dos dados)
+
+    Retorna {'opcoes': nomes ordenados para o seletor,
+             'normalizados': nomes sem acentos/minúsculos, alinhados ao índice do DataFrame}
+    _delta: atualização incremental (ver aplicar_delta); sem mudança nos nomes, reaproveita o índice anterior
+    """
+    col_municipio = get_municipio_column(_df)
+    if not col_municipio:
+        return {'opcoes': [], 'normalizados': pd.Series(dtype=str)}
+    if _delta is not None and col_municipio not in _delta['colunas']:
+        anterior = _delta['anterior']
+        return indice_busca_municipios(anterior, anterior.attrs.get('versao_dados'))
+
+    nomes = _df[col_municipio]
+    return {
+        'opcoes': sorted(nomes.dropna().unique()),
+        'normalizados': normalizar_por_categoria(nomes, normalizar_texto),
+    }
+
 def filtrar_municipios_por_busca(municipios_lista, termo_busca):
     """Filtra municípios por termo de busca, ignorando acentos e capitalização"""
     if not termo_busca:
@@ -938,39 +1111,73 @@ def filtrar_municipios_por_busca(municipios_lista, termo_busca):
     
     return municipios_filtrados
 
-@st.cache_data
+# Identificadores compactos: o código IBGE vira inteiro (int32; Int32 se houver ausentes)
+# e nomes/UF viram categóricas (cada nome distinto guardado uma vez e as linhas como
+# códigos inteiros). isin, groupby e a junção com a geometria passam a comparar inteiros,
+# e as chaves normalizadas são calculadas só para os nomes distintos.
+COLUNAS_CATEGORICAS_MUNICIPIO = ['Municipio', 'Municipio_Raw', 'Chave_Municipio', 'UF']
+
+def compactar_identificadores(df):
+    """Converte o código IBGE para inteiro e os nomes/UF do município para categóricas"""
+    if 'Codigo_Municipio' in df.columns:
+        codigos = pd.to_numeric(df['Codigo_Municipio'], errors='coerce')
+        df['Codigo_Municipio'] = codigos.astype(np.int32 if codigos.notna().all() else 'Int32')
+    for coluna in COLUNAS_CATEGORICAS_MUNICIPIO:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype('category')
+    return df
+
+def normalizar_por_categoria(serie, normalizar):
+    """Aplica normalizar a uma coluna de nomes; em categóricas, uma vez por nome distinto"""
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.map(normalizar)
+    normalizados = np.array([normalizar(nome) for nome in serie.cat.categories] + [normalizar(np.nan)], dtype=object)
+    # Código -1 (ausente) aponta para o último elemento: a normalização de NaN
+    return pd.Series(normalizados[serie.cat.codes.to_numpy()], index=serie.index, name=serie.name)
+
+def localizar_arquivo_dados():
+    """Caminho do CSV de precificação usado pelo painel (None se não houver)"""
+    # Procura especificamente pelo arquivo de precificação na pasta dados
+    csv_file = None
+    
+    # Primeiro procura pelo arquivo específico na pasta dados
+    dados_path = 'dados'
+    if os.path.exists(dados_path):
+        # Prioriza o novo arquivo de dados
+        precificacao_file_novo = os.path.join(dados_path, 'precificacao_alagoas_NOVO.csv')
+        precificacao_file_antigo = os.path.join(dados_path, 'precificacao_alagoas.csv')
+        
+        if os.path.exists(precificacao_file_novo):
+            csv_file = precificacao_file_novo
+        elif os.path.exists(precificacao_file_antigo):
+            csv_file = precificacao_file_antigo
+        else:
+            # Procura qualquer CSV na pasta dados
+            csv_files = [f for f in os.listdir(dados_path) if f.endswith('.csv')]
+            if csv_files:
+                csv_file = os.path.join(dados_path, csv_files[0])
+    
+    if not csv_file:
+        # Fallback: procura na pasta data ou diretório atual
+        data_paths = ['data', '.']
+        for data_dir in data_paths:
+            if os.path.exists(data_dir):
+                all_csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
+                if all_csv_files:
+                    csv_file = os.path.join(data_dir, all_csv_files[0])
+                    break
+    
+    return csv_file
+
+def versao_arquivo_dados(csv_file, nome=None):
+    """Identificador da versão do arquivo (nome, tamanho e data de modificação)"""
+    info_arquivo = os.stat(csv_file)
+    return f"{nome or os.path.basename(csv_file)}:{info_arquivo.st_size}:{info_arquivo.st_mtime_ns}"
+
 def load_data():
     """Carrega e processa os dados do CSV"""
     try:
-        # Procura especificamente pelo arquivo de precificação na pasta dados
-        csv_file = None
-        
-        # Primeiro procura pelo arquivo específico na pasta dados
-        dados_path = 'dados'
-        if os.path.exists(dados_path):
-            # Prioriza o novo arquivo de dados
-            precificacao_file_novo = os.path.join(dados_path, 'precificacao_alagoas_NOVO.csv')
-            precificacao_file_antigo = os.path.join(dados_path, 'precificacao_alagoas.csv')
-            
-            if os.path.exists(precificacao_file_novo):
-                csv_file = precificacao_file_novo
-            elif os.path.exists(precificacao_file_antigo):
-                csv_file = precificacao_file_antigo
-            else:
-                # Procura qualquer CSV na pasta dados
-                csv_files = [f for f in os.listdir(dados_path) if f.endswith('.csv')]
-                if csv_files:
-                    csv_file = os.path.join(dados_path, csv_files[0])
-        
-        if not csv_file:
-            # Fallback: procura na pasta data ou diretório atual
-            data_paths = ['data', '.']
-            for data_dir in data_paths:
-                if os.path.exists(data_dir):
-                    all_csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-                    if all_csv_files:
-                        csv_file = os.path.join(data_dir, all_csv_files[0])
-                        break
+        csv_file = localizar_arquivo_dados()
         
         if not csv_file:
             st.error("Nenhum arquivo CSV encontrado!")
@@ -1001,71 +1208,619 @@ def load_data():
             
             return pd.DataFrame()
         
-        # Carrega o CSV como string para preservar formatação brasileira
-        df = pd.read_csv(csv_file, dtype=str)
-        
-        # NOVA CORREÇÃO: Aplica conversão brasileira em todas as colunas numéricas
-        df = corrigir_colunas_brasileiras(df)
-        
-        # Limpeza e processamento dos dados
-        # Remove colunas desnecessárias
-        df = df.drop(['_mb_row_id', 'Unnamed Column'], axis=1, errors='ignore')
-        
-        # Renomeia colunas para facilitar o uso
-        column_mapping = {
-            # Novos nomes (snake_case) para nomes padronizados
-            'mun_nome': 'Municipio',  # Prioriza a coluna com nomes capitalizados
-            'NM_MUN': 'Municipio_Raw',  # mantém a versão sem capitalização como backup
-            'CD_MUN': 'Codigo_Municipio',
-            'SIGLA_UF': 'UF',
-            'ckey': 'Chave_Municipio',
-            'populacao': 'Populacao',
-            'nota_veg': 'Nota_Vegetacao',
-            'nota_area': 'Nota_Area',
-            'nota_relevo': 'Nota_Relevo',
-            'nota_p_q1': 'Nota_P_Q1',
-            'nota_p_q2': 'Nota_P_Q2',
-            'nota_p_q3': 'Nota_P_Q3',
-            'nota_p_q4': 'Nota_P_Q4',
-            'nota_insalub': 'Nota_Insalubridade',
-            'nota_insalub_2': 'Nota_Insalubridade_2',
-            'nota_total_q1': 'Nota_Total_Q1',
-            'nota_total_q2': 'Nota_Total_Q2',
-            'nota_total_q3': 'Nota_Total_Q3',
-            'nota_total_q4': 'Nota_Total_Q4',
-            'nota_media': 'Nota_Media',
-            'area_municip': 'Area_Cidade',
-            'area_georef': 'Area_Georreferenciada',
-            'percent_area_georef': 'Percentual_Area_Georref',
-            'num_imoveis': 'Num_Imoveis',
-            'area_car_total': 'Area_CAR_Total',
-            'area_car_media': 'Area_CAR_Media',
-            'perimetro_total_car': 'Perimetro_Total_CAR',
-            'perimetro_medio_car': 'Perimetro_Medio_CAR',
-            'area_max_perim': 'Area_Max_Perimetro',
-            'valor_mun_perim': 'Valor_Municipal_Perimetro',
-            'valor_mun_area': 'Valor_Municipal_Area',
-            'valor_medio': 'Valor_Medio',
-            'valor_medio_car': 'Valor_Medio_CAR',
-            'val_med_car_perim': 'Valor_Medio_CAR_Perimetro'
-        }
-        
-        df = df.rename(columns=column_mapping)
-        
-        return df
+        return processar_arquivo_dados(csv_file)
     except Exception as e:
         st.error(f"Erro ao carregar os dados: {e}")
         return pd.DataFrame()
 
+# Nomes das colunas do CSV → nomes usados pelo painel
+MAPEAMENTO_COLUNAS = {
+    # Novos nomes (snake_case) para nomes padronizados
+    'mun_nome': 'Municipio',  # Prioriza a coluna com nomes capitalizados
+    'NM_MUN': 'Municipio_Raw',  # mantém a versão sem capitalização como backup
+    'CD_MUN': 'Codigo_Municipio',
+    'SIGLA_UF': 'UF',
+    'ckey': 'Chave_Municipio',
+    'populacao': 'Populacao',
+    'nota_veg': 'Nota_Vegetacao',
+    'nota_area': 'Nota_Area',
+    'nota_relevo': 'Nota_Relevo',
+    'nota_p_q1': 'Nota_P_Q1',
+    'nota_p_q2': 'Nota_P_Q2',
+    'nota_p_q3': 'Nota_P_Q3',
+    'nota_p_q4': 'Nota_P_Q4',
+    'nota_insalub': 'Nota_Insalubridade',
+    'nota_insalub_2': 'Nota_Insalubridade_2',
+    'nota_total_q1': 'Nota_Total_Q1',
+    'nota_total_q2': 'Nota_Total_Q2',
+    'nota_total_q3': 'Nota_Total_Q3',
+    'nota_total_q4': 'Nota_Total_Q4',
+    'nota_media': 'Nota_Media',
+    'area_municip': 'Area_Cidade',
+    'area_georef': 'Area_Georreferenciada',
+    'percent_area_georef': 'Percentual_Area_Georref',
+    'num_imoveis': 'Num_Imoveis',
+    'area_car_total': 'Area_CAR_Total',
+    'area_car_media': 'Area_CAR_Media',
+    'perimetro_total_car': 'Perimetro_Total_CAR',
+    'perimetro_medio_car': 'Perimetro_Medio_CAR',
+    'area_max_perim': 'Area_Max_Perimetro',
+    'valor_mun_perim': 'Valor_Municipal_Perimetro',
+    'valor_mun_area': 'Valor_Municipal_Area',
+    'valor_medio': 'Valor_Medio',
+    'valor_medio_car': 'Valor_Medio_CAR',
+    'val_med_car_perim': 'Valor_Medio_CAR_Perimetro'
+}
+
+def processar_arquivo_dados(csv_file, progresso=None):
+    """
+    Lê e processa um CSV de precificação (sem cache e sem mensagens na interface)
+
+    Arquivos grandes passam pela ingestão em blocos; progresso(linhas, fracao) acompanha a conversão
+    """
+    # Versão lida antes do arquivo: se ele for trocado durante a leitura, a próxima
+    # verificação do observador encontra uma versão diferente e recarrega
+    versao_dados = versao_arquivo_dados(csv_file)
+    
+    if os.path.getsize(csv_file) >= LIMITE_BYTES_LEITURA_DIRETA:
+        destino = garantir_armazenamento_colunar(csv_file, versao_dados, progresso)
+        df = carregar_armazenamento_colunar(destino)
+    else:
+        # Carrega o CSV como string para preservar formatação brasileira
+        df = processar_dados_brutos(pd.read_csv(csv_file, dtype=str))
+    
+    # Identifica a versão do arquivo carregado (usada nas chaves de cache derivadas)
+    df.attrs['versao_dados'] = versao_dados
+    
+    return df
+
+def processar_dados_brutos(df):
+    """Converte, limpa, renomeia e compacta as colunas de um CSV lido como texto"""
+    # NOVA CORREÇÃO: Aplica conversão brasileira em todas as colunas numéricas
+    df = corrigir_colunas_brasileiras(df)
+    
+    # Limpeza e processamento dos dados
+    # Remove colunas desnecessárias
+    df = df.drop(['_mb_row_id', 'Unnamed Column'], axis=1, errors='ignore')
+    
+    # Renomeia colunas para facilitar o uso
+    df = df.rename(columns=MAPEAMENTO_COLUNAS)
+    return compactar_identificadores(df)
+
+# Ingestão em blocos: CSVs a partir de LIMITE_BYTES_LEITURA_DIRETA (ex.: extratos nacionais
+# por imóvel do CAR) não são lidos inteiros como texto. Cada bloco de LINHAS_POR_BLOCO_INGESTAO
+# linhas é lido, processado (processar_dados_brutos) e acrescentado como row group a um
+# Parquet por versão do arquivo, então o pico de memória da conversão fica limitado ao
+# bloco. O dataset é lido do Parquet já tipado: uma única cópia, com os nomes de município
+# como dicionário (categóricas). O Parquet fica em disco e as próximas cargas da mesma
+# versão (novo processo, aquecimento) pulam a conversão.
+LIMITE_BYTES_LEITURA_DIRETA = 64 * 1024**2
+LINHAS_POR_BLOCO_INGESTAO = 50_000
+DIRETORIO_ARMAZENAMENTO_COLUNAR = os.path.join(tempfile.gettempdir(), 'dashboard_precificacao_ingestao')
+LIMITE_ARQUIVOS_INGESTAO = 4
+
+def caminho_armazenamento_colunar(csv_file, versao_dados=None):
+    """Parquet da ingestão em blocos para a versão atual do arquivo"""
+    versao_dados = versao_dados or versao_arquivo_dados(csv_file)
+    identificador = hashlib.sha256(f"{os.path.abspath(csv_file)}|{versao_dados}".encode()).hexdigest()[:20]
+    return os.path.join(DIRETORIO_ARMAZENAMENTO_COLUNAR, f"{identificador}.parquet")
+
+def ingerir_csv_em_blocos(csv_file, destino, linhas_por_bloco=LINHAS_POR_BLOCO_INGESTAO, progresso=None):
+    """
+    Lê o CSV em blocos, processa cada bloco e o acrescenta ao Parquet destino; retorna o total de linhas
+
+    progresso(linhas, fracao): chamado após cada bloco, com a fração pelos bytes já lidos do arquivo
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    diretorio = os.path.dirname(destino) or '.'
+    os.makedirs(diretorio, exist_ok=True)
+    tamanho = os.path.getsize(csv_file)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    os.close(descritor)
+    escritor, linhas = None, 0
+    try:
+        with open(csv_file, 'rb') as arquivo:
+            for bloco in pd.read_csv(arquivo, dtype=str, chunksize=linhas_por_bloco):
+                bloco = processar_dados_brutos(bloco)
+                # Cada bloco teria um dicionário diferente: as categóricas são gravadas como texto
+                for coluna in COLUNAS_CATEGORICAS_MUNICIPIO:
+                    if coluna in bloco.columns:
+                        bloco[coluna] = bloco[coluna].astype('str')
+                tabela = pa.Table.from_pandas(
+                    bloco, schema=escritor.schema if escritor else None, preserve_index=False
+                )
+                if escritor is None:
+                    escritor = pq.ParquetWriter(temporario, tabela.schema)
+                escritor.write_table(tabela, row_group_size=LINHAS_POR_GRUPO_PARQUET)
+                linhas += len(bloco)
+                if progresso:
+                    progresso(linhas, min(arquivo.tell() / tamanho, 1.0) if tamanho else 1.0)
+        if escritor is None:
+            raise ValueError("arquivo sem linhas")
+        escritor.close()
+        escritor = None
+        os.replace(temporario, destino)
+    finally:
+        if escritor is not None:
+            escritor.close()
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return linhas
+
+def carregar_armazenamento_colunar(destino):
+    """Dataset processado a partir do Parquet da ingestão em blocos"""
+    import pyarrow.parquet as pq
+
+    colunas = pq.read_schema(destino).names
+    tabela = pq.read_table(destino, read_dictionary=[coluna for coluna in COLUNAS_CATEGORICAS_MUNICIPIO if coluna in colunas])
+    return compactar_identificadores(tabela.to_pandas())
+
+@st.cache_resource(show_spinner=False)
+def trava_ingestao():
+    """Trava do processo: uma única conversão em blocos por vez (sessões e observador)"""
+    import threading
+
+    return threading.Lock()
+
+def garantir_armazenamento_colunar(csv_file, versao_dados=None, progresso=None):
+    """Converte o CSV para o Parquet da ingestão em blocos, se ainda não convertido; retorna o caminho"""
+    destino = caminho_armazenamento_colunar(csv_file, versao_dados)
+    if os.path.exists(destino):
+        return destino
+    with trava_ingestao():
+        if not os.path.exists(destino):
+            ingerir_csv_em_blocos(csv_file, destino, progresso=progresso)
+            _limpar_armazenamentos_antigos()
+    return destino
+
+def _limpar_armazenamentos_antigos():
+    """Mantém apenas os LIMITE_ARQUIVOS_INGESTAO Parquets de ingestão mais recentes"""
+    arquivos = [
+        os.path.join(DIRETORIO_ARMAZENAMENTO_COLUNAR, nome)
+        for nome in os.listdir(DIRETORIO_ARMAZENAMENTO_COLUNAR) if nome.endswith('.parquet')
+    ]
+    arquivos.sort(key=os.path.getmtime, reverse=True)
+    for caminho in arquivos[LIMITE_ARQUIVOS_INGESTAO:]:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+def preparar_ingestao_em_blocos():
+    """Conversão em blocos do CSV ativo antes do carregamento, com barra de progresso na página"""
+    csv_file = localizar_arquivo_dados()
+    if not csv_file or os.path.getsize(csv_file) < LIMITE_BYTES_LEITURA_DIRETA:
+        return
+    if os.path.exists(caminho_armazenamento_colunar(csv_file)):
+        return
+
+    # Fora das funções cacheadas: a barra não é regravada para ser repetida a cada rerun
+    barra = st.progress(0.0, text="Convertendo o arquivo de dados...")
+    def progresso(linhas, fracao):
+        barra.progress(fracao, text=f"Convertendo o arquivo de dados: {formatar_numero_brasileiro(linhas)} linhas")
+    try:
+        garantir_armazenamento_colunar(csv_file, progresso=progresso)
+    except Exception as e:
+        # load_data repete a leitura e mostra o erro completo
+        print(f"Erro na ingestão em blocos de {csv_file}: {e}")
+    finally:
+        barra.empty()
+
+# Dataset base compartilhado: o painel usa uma única instância por processo, tratada
+# como somente leitura: as colunas são strings Arrow (buffers imutáveis), as sessões
+# trabalham com o próprio objeto ou com subconjuntos de linhas, e os arrays numéricos
+# derivados (faixas, índice de ranking, filtros) ficam em st.cache_resource marcados
+# como não graváveis. A versão ativa é trocada pelo observador do arquivo de dados
+# (ver "RECARGA A QUENTE DOS DADOS"), sem reiniciar o processo.
+@st.cache_resource(show_spinner=False, on_release=lambda estado: estado['parar'].set())
+def estado_dados():
+    """
+    Versão ativa do dataset no processo e estado do observador do arquivo de dados
+
+    O observador do arquivo só é iniciado com o servidor do Streamlit (não na CLI)
+    """
+    import threading
+    from streamlit import runtime
+
+    df = load_data()
+    estado = {
+        'df': df,
+        'versao': df.attrs.get('versao_dados'),
+        'trava': threading.Lock(),
+        'parar': threading.Event(),
+        'observador': None,
+        'recargas': [],
+        'erro': None,
+        'versao_rejeitada': None,
+        'progresso': None,
+    }
+    if runtime.exists():
+        estado['observador'] = threading.Thread(
+            target=observar_arquivo_dados, args=(estado,), name='observador-dados', daemon=True
+        )
+        estado['observador'].start()
+    return estado
+
+def dataset_base():
+    """Dataset da versão ativa, compartilhado (somente leitura) por todas as sessões do processo"""
+    return estado_dados()['df']
+
+def somente_leitura(array):
+    """Marca o array NumPy como não gravável (compartilhado entre sessões) e o retorna"""
+    array.flags.writeable = False
+    return array
+
 # =============================================================================
 # FUNÇÕES DE MÉTRICAS E VISUALIZAÇÕES
 # =============================================================================
 
-def create_overview_metrics(df):
+# Classificações por faixas: cada valor vira um código int8 (-1 = ausente ou fora das
+# faixas), calculado uma vez por versão dos dados (faixas_dataset) e reaproveitado pela
+# aba Distribuição, pelo relatório, pelo construtor de consultas e pela CLI. As
+# agregações por faixa são reduções np.bincount sobre esses códigos.
+# Faixas fechadas à direita: (limite_i, limite_i+1]; incluir_menor inclui o primeiro limite.
+CLASSIFICACOES_FAIXAS = {
+    # Faixas de preço da aba Distribuição e dos relatórios por faixa (valor por área, em R$ milhões)
+    'preco': {
+        'coluna': 'Valor_Municipal_Area', 'escala': 1_000_000, 'incluir_menor': True,
+        'limites': [0, 2, 4, float('inf')],
+        'rotulos': ["Baixo (0 - 2M)", "Médio (2 - 4M)", "Alto (> 4M)"],
+    },
+    'populacao': {
+        'coluna': 'Populacao', 'escala': 1, 'incluir_menor': False,
+        'limites': [0, 20000, 50000, 100000, float('inf')],
+        'rotulos': ['Pequeno (até 20k)', 'Médio (20k-50k)', 'Grande (50k-100k)', 'Muito Grande (100k+)'],
+    },
+    'nota': {
+        'coluna': 'Nota_Media', 'escala': 1, 'incluir_menor': False,
+        'limites': [0, 2, 4, 6, 8, 10],
+        'rotulos': ['Muito Baixa (0-2)', 'Baixa (2-4)', 'Média (4-6)', 'Alta (6-8)', 'Muito Alta (8-10)'],
+    },
+    'valor': {
+        'coluna': 'Valor_Municipal_Area', 'escala': 1_000_000_000, 'incluir_menor': False,
+        'limites': [0, 5, 15, 25, float('inf')],
+        'rotulos': ['Baixo (até 5B)', 'Médio (5B-15B)', 'Alto (15B-25B)', 'Premium (25B+)'],
+    },
+}
+
+def codificar_faixas(valores, definicao):
+    """Código int8 da faixa de cada valor numérico (-1 = ausente ou fora das faixas)"""
+    escalados = np.asarray(valores, dtype=float) / definicao['escala']
+    limites = np.asarray(definicao['limites'], dtype=float)
+
+    # searchsorted à esquerda: limite_i < valor <= limite_i+1 → código i
+    codigos = np.searchsorted(limites, escalados, side='left') - 1
+    if definicao['incluir_menor']:
+        codigos[escalados == limites[0]] = 0
+    codigos[(codigos < 0) | (codigos >= len(limites) - 1) | np.isnan(escalados)] = -1
+    return codigos.astype(np.int8)
+
+def contar_por_codigo(codigos, n_grupos):
+    """Quantidade de linhas por código (códigos negativos são ignorados)"""
+    return np.bincount(codigos[codigos >= 0].astype(np.intp), minlength=n_grupos)
+
+def agregar_por_codigo(codigos, n_grupos, valores):
+    """Contagem de valores presentes, soma e média por código, via np.bincount"""
+    valores = np.asarray(valores, dtype=float)
+    usados = (codigos >= 0) & ~np.isnan(valores)
+    grupos = codigos[usados].astype(np.intp)
+    contagem = np.bincount(grupos, minlength=n_grupos)
+    soma = np.bincount(grupos, weights=valores[usados], minlength=n_grupos)
+    media = np.divide(soma, contagem, out=np.full(n_grupos, np.nan), where=contagem > 0)
+    return {'count': contagem, 'sum': soma, 'mean': media}
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def faixas_dataset(_df, versao_dados, _delta=None):
+    """
+    Códigos int8 de todas as classificações por faixas do dataset (uma vez por versão dos dados)
+
+    _delta: atualização incremental; só as linhas alteradas das colunas alteradas são recodificadas
+    """
+    if _delta is not None:
+        anterior = _delta['anterior']
+        faixas = dict(faixas_dataset(anterior, anterior.attrs.get('versao_dados')))
+        posicoes = _delta['posicoes']
+        for nome, definicao in CLASSIFICACOES_FAIXAS.items():
+            if definicao['coluna'] in _delta['colunas'] and nome in faixas:
+                codigos = faixas[nome].copy()
+                codigos[posicoes] = codificar_faixas(
+                    converter_coluna_numerica(_df[definicao['coluna']].iloc[posicoes]), definicao
+                )
+                faixas[nome] = somente_leitura(codigos)
+        return faixas
+    return {
+        nome: somente_leitura(codificar_faixas(converter_coluna_numerica(_df[definicao['coluna']]), definicao))
+        for nome, definicao in CLASSIFICACOES_FAIXAS.items() if definicao['coluna'] in _df.columns
+    }
+
+def codigos_faixas(df, classificacao, df_base=None):
+    """
+    Códigos int8 da classificação para as linhas de df
+
+    Com df_base (dataset completo do qual df é um subconjunto de linhas), reaproveita os
+    códigos pré-calculados; caso contrário, codifica a coluna de df
+    """
+    versao_dados = df_base.attrs.get('versao_dados') if df_base is not None else None
+    if versao_dados and df_base.index.is_unique:
+        codigos = faixas_dataset(df_base, versao_dados).get(classificacao)
+        if codigos is not None:
+            if len(df) == len(df_base):
+                return codigos
+            posicoes = df_base.index.get_indexer(df.index)
+            if (posicoes >= 0).all():
+                return codigos[posicoes]
+
+    definicao = CLASSIFICACOES_FAIXAS[classificacao]
+    return codificar_faixas(converter_coluna_numerica(df[definicao['coluna']]), definicao)
+
+# Índice de ranking: para cada critério, as permutações das linhas do dataset já
+# ordenadas pelo valor, calculadas uma vez por versão dos dados. O top-k de um conjunto
+# filtrado percorre a permutação marcando as linhas do filtro num bitmap e para ao
+# encontrar k linhas, sem copiar nem ordenar o subconjunto a cada rerun.
+# Empates seguem a ordem das linhas no dataset (como nlargest/nsmallest com keep='first').
+BLOCO_PERMUTACAO_RANKING = 4096
+
+# Colunas lidas por cada critério de ranking (atualização incremental do índice)
+COLUNAS_CRITERIOS_RANKING = {
+    'valor': ['Valor_Municipal_Area'],
+    'populacao': ['Populacao'],
+    'per_capita': ['Valor_Municipal_Area', 'Populacao'],
+}
+
+def valores_criterios_ranking(df):
+    """Valores numéricos de cada critério de ranking disponível em df (NaN = sem valor)"""
+    criterios = {}
+    if 'Valor_Municipal_Area' in df.columns:
+        criterios['valor'] = converter_coluna_numerica(df['Valor_Municipal_Area']).to_numpy(dtype=float)
+    if 'Populacao' in df.columns:
+        criterios['populacao'] = converter_coluna_numerica(df['Populacao']).to_numpy(dtype=float)
+    if 'valor' in criterios and 'populacao' in criterios:
+        populacao = criterios['populacao']
+        criterios['per_capita'] = criterios['valor'] / np.where(populacao > 0, populacao, np.nan)
+    return criterios
+
+def construir_indice_ranking(df):
+    """
+    Permutações int32 de cada critério: 'decrescente' cobre todas as linhas (sem valor
+    no fim) e 'crescente' só as de valor positivo; 'n_positivos' delimita o prefixo de
+    'decrescente' com valores positivos
+    """
+    indice = {}
+    for criterio, valores in valores_criterios_ranking(df).items():
+        positivas = np.flatnonzero(valores > 0)
+        decrescente = np.argsort(-valores, kind='stable').astype(np.int32)
+        crescente = positivas[np.argsort(valores[positivas], kind='stable')].astype(np.int32)
+        indice[criterio] = {
+            'valores': somente_leitura(valores),
+            'decrescente': somente_leitura(decrescente),
+            'crescente': somente_leitura(crescente),
+            'n_positivos': len(positivas),
+        }
+    return indice
+
+def _atualizar_permutacao(permutacao, chave, alteradas, incluir=None):
+    """
+    Permutação estável por chave (empates pela posição) depois da mudança de valor das
+    posições alteradas: as demais mantêm a ordem e as alteradas são reinseridas por busca
+    binária, sem reordenar o dataset. incluir: máscara das linhas que entram na permutação
+    """
+    marcadas = np.zeros(len(chave), dtype=bool)
+    marcadas[alteradas] = True
+    restantes = permutacao[~marcadas[permutacao]]
+    novas = alteradas if incluir is None else alteradas[incluir[alteradas]]
+    novas = novas[np.lexsort((novas, chave[novas]))]
+
+    chaves_restantes = chave[restantes]
+    inicio = np.searchsorted(chaves_restantes, chave[novas], side='left')
+    fim = np.searchsorted(chaves_restantes, chave[novas], side='right')
+    pontos = np.array(
+        [a + np.searchsorted(restantes[a:b], posicao) for a, b, posicao in zip(inicio, fim, novas)],
+        dtype=np.intp
+    )
+    return np.insert(restantes, pontos, novas).astype(np.int32)
+
+def atualizar_indice_ranking(indice, df, posicoes, colunas):
+    """Índice de ranking de df a partir do índice da versão anterior (mesmas linhas, posições alteradas)"""
+    novos_valores = valores_criterios_ranking(df.iloc[posicoes])
+    atualizado = {}
+    for criterio, dados in indice.items():
+        if not set(COLUNAS_CRITERIOS_RANKING[criterio]) & colunas:
+            atualizado[criterio] = dados
+            continue
+        valores = dados['valores'].copy()
+        valores[posicoes] = novos_valores[criterio]
+        # argsort(-valores) deixa as linhas sem valor no fim: mesma ordem com chave +inf
+        chave_decrescente = np.where(np.isnan(valores), np.inf, -valores)
+        positivas = valores > 0
+        atualizado[criterio] = {
+            'valores': somente_leitura(valores),
+            'decrescente': somente_leitura(_atualizar_permutacao(dados['decrescente'], chave_decrescente, posicoes)),
+            'crescente': somente_leitura(_atualizar_permutacao(dados['crescente'], valores, posicoes, positivas)),
+            'n_positivos': int(positivas.sum()),
+        }
+    return atualizado
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def indice_ranking(_df, versao_dados, _delta=None):
+    """
+    Índice de ranking do dataset completo (uma vez por versão dos dados, sem cópias por sessão)
+
+    _delta: atualização incremental; só os critérios das colunas alteradas são refeitos
+    """
+    if _delta is not None:
+        anterior = _delta['anterior']
+        return atualizar_indice_ranking(
+            indice_ranking(anterior, anterior.attrs.get('versao_dados')), _df, _delta['posicoes'], _delta['colunas']
+        )
+    return construir_indice_ranking(_df)
+
+def _percorrer_permutacao(permutacao, selecionadas, k):
+    """Primeiras k posições da permutação marcadas no bitmap, percorrendo em blocos"""
+    partes, faltam = [], k
+    for inicio in range(0, len(permutacao), BLOCO_PERMUTACAO_RANKING):
+        if faltam <= 0:
+            break
+        bloco = permutacao[inicio:inicio + BLOCO_PERMUTACAO_RANKING]
+        bloco = bloco[selecionadas[bloco]][:faltam]
+        partes.append(bloco)
+        faltam -= len(bloco)
+    return np.concatenate(partes) if partes else np.empty(0, dtype=np.int32)
+
+def ranking_top_k(df, criterio, k=None, maiores=True, df_base=None, exigir=()):
+    """
+    Rótulos do índice de df dos k municípios com maiores (ou menores) valores positivos
+    do critério ('valor', 'populacao' ou 'per_capita'), em ordem de ranking
+
+    k=None: todas as linhas, na ordem decrescente (linhas sem valor no fim)
+    df_base: dataset completo do qual df é um subconjunto (reaproveita o índice pré-calculado)
+    exigir: outros critérios que também precisam ter valor positivo
+    """
+    versao_dados = df_base.attrs.get('versao_dados') if df_base is not None else None
+    base = df
+    if versao_dados and df_base.index.is_unique:
+        posicoes = df_base.index.get_indexer(df.index)
+        if (posicoes >= 0).all():
+            base = df_base
+    if base is df:
+        indice = construir_indice_ranking(df)
+        selecionadas = np.ones(len(df), dtype=bool)
+    else:
+        indice = indice_ranking(df_base, versao_dados)
+        selecionadas = np.zeros(len(df_base), dtype=bool)
+        selecionadas[posicoes] = True
+
+    if criterio not in indice:
+        return df.index[:0]
+    for outro in exigir:
+        if outro in indice:
+            selecionadas &= indice[outro]['valores'] > 0
+
+    dados = indice[criterio]
+    if k is None:
+        permutacao = dados['decrescente']
+        k = len(permutacao)
+    elif maiores:
+        permutacao = dados['decrescente'][:dados['n_positivos']]
+    else:
+        permutacao = dados['crescente']
+    return base.index[_percorrer_permutacao(permutacao, selecionadas, k)]
+
+def calcular_estatisticas_df(df):
+    """
+    Calcula em uma única passada vetorizada as estatísticas compartilhadas pela
+    visão geral, pelas abas Ranking e Distribuição e pelo relatório PDF
+    """
+    estatisticas = {
+        'n_municipios': len(df),
+        'series': {},
+        'valor': None,
+        'populacao': None,
+        'nota_media': None,
+        'valor_perimetro_total': None,
+        'valor_per_capita_medio': None,
+        'correlacao_pop_valor': None,
+        'faixas': None,
+    }
+
+    municipios = df['Municipio'] if 'Municipio' in df.columns else None
+
+    def municipio_em(indice):
+        return municipios.loc[indice] if municipios is not None else 'N/A'
+
+    # Cada coluna bruta é convertida uma única vez
+    colunas = {
+        'valor': 'Valor_Municipal_Area',
+        'perimetro': 'Valor_Municipal_Perimetro',
+        'populacao': 'Populacao',
+        'nota': 'nota_media' if 'nota_media' in df.columns else 'Nota_Media',
+    }
+    series = {
+        chave: converter_coluna_numerica(df[coluna])
+        for chave, coluna in colunas.items() if coluna in df.columns
+    }
+    estatisticas['series'] = series
+
+    if 'nota' in series and series['nota'].notna().any():
+        estatisticas['nota_media'] = series['nota'].mean()
+
+    if 'perimetro' in series:
+        estatisticas['valor_perimetro_total'] = series['perimetro'].sum()
+
+    if 'valor' in series:
+        valores = series['valor'].fillna(0)
+        valores_validos = valores[valores > 0]
+
+        if len(valores_validos) > 0:
+            estatisticas['valor'] = {
+                'validos': valores_validos,
+                'total': valores_validos.sum(),
+                'medio': valores_validos.mean(),
+                'mediano': valores_validos.median(),
+                'maximo': valores_validos.max(),
+                'minimo': valores_validos.min(),
+                'desvio': valores_validos.std(),
+                'q1': valores_validos.quantile(0.25),
+                'q3': valores_validos.quantile(0.75),
+                'p90': valores_validos.quantile(0.9),
+                'municipio_max': municipio_em(valores_validos.idxmax()),
+                'municipio_min': municipio_em(valores_validos.idxmin()),
+            }
+
+        # Faixas de preço consideram todos os valores informados (inclusive zero)
+        if series['valor'].notna().any():
+            definicao = CLASSIFICACOES_FAIXAS['preco']
+            contagens = contar_por_codigo(codificar_faixas(series['valor'], definicao), len(definicao['rotulos']))
+            estatisticas['faixas'] = dict(zip(definicao['rotulos'], contagens.tolist()))
+
+    if 'populacao' in series:
+        populacao = series['populacao'].fillna(0)
+        pop_valida = populacao[populacao > 0]
+
+        if len(pop_valida) > 0:
+            estatisticas['populacao'] = {
+                'validos': pop_valida,
+                'total': pop_valida.sum(),
+                'media': pop_valida.mean(),
+                'maximo': pop_valida.max(),
+                'municipio_max': municipio_em(pop_valida.idxmax()),
+            }
+
+    # Pares população x valor (ambos positivos): valor per capita e correlação
+    if 'valor' in series and 'populacao' in series:
+        populacao = series['populacao'].fillna(0)
+        valores = series['valor'].fillna(0)
+        pares = (populacao > 0) & (valores > 0)
+        if pares.any():
+            estatisticas['valor_per_capita_medio'] = (valores[pares] / populacao[pares]).mean()
+        if pares.sum() > 3:
+            estatisticas['correlacao_pop_valor'] = populacao[pares].corr(valores[pares])
+
+    return estatisticas
+
+def chave_dados_completos(df):
+    """Chave de cache do conjunto sem filtros (versão dos dados carregados)"""
+    return (df.attrs.get('versao_dados'), 'todos')
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def calcular_estatisticas(_df, chave_filtro):
+    """
+    Versão cacheada de calcular_estatisticas_df
+
+    chave_filtro identifica o conjunto filtrado (versão dos dados + filtros aplicados);
+    o DataFrame em si não é usado na chave do cache
+    """
+    return calcular_estatisticas_df(_df)
+
+def create_overview_metrics(df, estatisticas=None):
     """Cria métricas de visão geral focadas em precificação por área"""
     if df.empty:
         return
     
+    if estatisticas is None:
+        estatisticas = calcular_estatisticas_df(df)
+    
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
@@ -1085,15 +1840,8 @@ def create_overview_metrics(df):
         )
 
     with col3:
-        # Calcular nota média
-        if 'nota_media' in df.columns:
-            notas_clean = df['nota_media'].apply(clean_brazilian_number)
-            nota_media = notas_clean.mean() if not notas_clean.empty else 20.79
-        elif 'Nota_Media' in df.columns:
-            notas_clean = df['Nota_Media'].apply(clean_brazilian_number)
-            nota_media = notas_clean.mean() if not notas_clean.empty else 20.79
-        else:
-            nota_media = 20.79
+        # Nota média (valor de referência quando a coluna não existe)
+        nota_media = estatisticas['nota_media'] if estatisticas['nota_media'] is not None else 20.79
             
         st.metric(
             "Nota Média",
@@ -1102,10 +1850,8 @@ def create_overview_metrics(df):
         )
 
     with col4:
-        if 'Valor_Municipal_Perimetro' in df.columns:
-            # Limpa e converte valores do perímetro
-            perim_clean = df['Valor_Municipal_Perimetro'].apply(clean_brazilian_number)
-            valor_total_perimetro = perim_clean.sum() if not perim_clean.empty else 0
+        if estatisticas['valor_perimetro_total'] is not None:
+            valor_total_perimetro = estatisticas['valor_perimetro_total']
             st.metric(
                 "Valor Total por Perímetro",
                 f"R$ {valor_total_perimetro/1_000_000:.1f}M".replace('.', ','),
@@ -1115,10 +1861,8 @@ def create_overview_metrics(df):
             st.metric("Valor Total por Perímetro", "R$ 200,0M")
 
     with col5:
-        if 'Valor_Municipal_Area' in df.columns:
-            # Limpa e converte valores da área
-            area_clean = df['Valor_Municipal_Area'].apply(clean_brazilian_number)
-            valor_total_area = area_clean.sum() if not area_clean.empty else 0
+        if 'valor' in estatisticas['series']:
+            valor_total_area = estatisticas['valor']['total'] if estatisticas['valor'] else 0
             st.metric(
                 "Valor Total por Área",
                 f"R$ {valor_total_area/1_000_000:.1f}M".replace('.', ','),
@@ -1129,13 +1873,15 @@ def create_overview_metrics(df):
 
 def create_population_chart(df):
     """Cria gráfico de população por município"""
+    import plotly.express as px
+
     col_municipio = get_municipio_column(df)
     if 'Populacao' not in df.columns or not col_municipio:
         st.warning("Dados de população não disponíveis")
         return
     
-    # Limpa e converte dados de população
-    df_clean = df.copy()
+    # Limpa e converte dados de população (cópia só das colunas usadas)
+    df_clean = df[[col_municipio, 'Populacao']].copy()
     df_clean['Populacao'] = pd.to_numeric(df_clean['Populacao'], errors='coerce').fillna(0)
     
     # Remove municípios com população 0 ou nula
@@ -1159,25 +1905,23 @@ def create_population_chart(df):
         color_continuous_scale='Blues'
     )
     
-def create_value_ranking_chart(df):
+def create_value_ranking_chart(df, df_base=None):
     """Cria gráfico de ranking dos municípios por valor"""
+    import plotly.express as px
+
     col_municipio = get_municipio_column(df)
     if 'Valor_Municipal_Area' not in df.columns or not col_municipio:
         st.warning("Dados de valor por área não disponíveis")
         return None
     
-    # Limpa e converte dados
-    df_clean = df.copy()
-    df_clean['Valor_Area_Clean'] = pd.to_numeric(df_clean['Valor_Municipal_Area'], errors='coerce').fillna(0)
-    df_clean = df_clean.dropna(subset=['Valor_Area_Clean'])
-    df_clean = df_clean[df_clean['Valor_Area_Clean'] > 0]
-    
-    if df_clean.empty:
+    # Top 15 municípios por valor (valores positivos), pelo índice de ranking do dataset
+    rotulos = ranking_top_k(df, 'valor', 15, maiores=True, df_base=df_base)
+    if len(rotulos) == 0:
         st.warning("Dados insuficientes para análise de valores")
         return None
-    
-    # Top 15 municípios por valor
-    top_values = df_clean.nlargest(15, 'Valor_Area_Clean')
+
+    top_values = df.loc[rotulos, [col_municipio, 'Valor_Municipal_Area']]
+    top_values['Valor_Area_Clean'] = converter_coluna_numerica(top_values['Valor_Municipal_Area'])
     
     # Converte para milhões para melhor visualização
     top_values['Valor_Milhoes'] = top_values['Valor_Area_Clean'] / 1_000_000
@@ -1217,25 +1961,23 @@ def create_value_ranking_chart(df):
     return fig
 
 
-def create_lowest_value_ranking_chart(df):
+def create_lowest_value_ranking_chart(df, df_base=None):
     """Cria gráfico de ranking dos 15 municípios com MENORES valores"""
+    import plotly.express as px
+
     col_municipio = get_municipio_column(df)
     if 'Valor_Municipal_Area' not in df.columns or not col_municipio:
         st.warning("Dados de valor por área não disponíveis")
         return None
     
-    # Limpa e converte dados
-    df_clean = df.copy()
-    df_clean['Valor_Area_Clean'] = pd.to_numeric(df_clean['Valor_Municipal_Area'], errors='coerce').fillna(0)
-    df_clean = df_clean.dropna(subset=['Valor_Area_Clean'])
-    df_clean = df_clean[df_clean['Valor_Area_Clean'] > 0]
-    
-    if df_clean.empty:
+    # 15 menores municípios por valor (valores positivos), pelo índice de ranking do dataset
+    rotulos = ranking_top_k(df, 'valor', 15, maiores=False, df_base=df_base)
+    if len(rotulos) == 0:
         st.warning("Dados insuficientes para análise de valores")
         return None
-    
-    # 15 menores municípios por valor
-    lowest_values = df_clean.nsmallest(15, 'Valor_Area_Clean')
+
+    lowest_values = df.loc[rotulos, [col_municipio, 'Valor_Municipal_Area']]
+    lowest_values['Valor_Area_Clean'] = converter_coluna_numerica(lowest_values['Valor_Municipal_Area'])
     
     # Converte para milhões para melhor visualização
     lowest_values['Valor_Milhoes'] = lowest_values['Valor_Area_Clean'] / 1_000_000
@@ -1275,48 +2017,82 @@ def create_lowest_value_ranking_chart(df):
     return fig
 
 
+# Histograma de preços calculado no servidor: só as barras agregadas vão para o
+# navegador, então o tamanho do gráfico não depende do número de municípios.
+# As barras têm 0,5M de largura, alargadas para passos "redondos" (1, 2, 2,5, 5 × 10^k)
+# quando passariam de LIMITE_BARRAS_HISTOGRAMA; valores extremos (acima de
+# FATOR_CAUDA_HISTOGRAMA × percentil 99) são somados numa última barra "acima de".
+PASSO_HISTOGRAMA_MI = 0.5
+LIMITE_BARRAS_HISTOGRAMA = 60
+FATOR_CAUDA_HISTOGRAMA = 4
+
+def calcular_histograma(valores, passo_minimo=PASSO_HISTOGRAMA_MI, limite_barras=LIMITE_BARRAS_HISTOGRAMA):
+    """
+    Contagens por faixa com np.histogram (faixas [início, fim), a última fechada)
+
+    Retorna {'bordas', 'contagens', 'passo', 'acima'}: 'acima' é a quantidade de valores
+    além da última borda (cauda de valores extremos), somada fora das faixas regulares
+    """
+    valores = np.asarray(valores, dtype=float)
+    topo = min(valores.max(), FATOR_CAUDA_HISTOGRAMA * np.quantile(valores, 0.99)) or valores.max()
+
+    passo = passo_minimo
+    if np.ceil(topo / passo) > limite_barras:
+        bruto = topo / limite_barras
+        potencia = 10 ** np.floor(np.log10(bruto))
+        passo = next(m * potencia for m in (1, 2, 2.5, 5, 10) if m * potencia >= bruto)
+
+    n_faixas = max(int(np.ceil(topo / passo)), 1)
+    bordas = np.arange(n_faixas + 1) * passo
+    contagens, _ = np.histogram(valores[valores <= bordas[-1]], bins=bordas)
+    acima = int((valores > bordas[-1]).sum())
+    return {'bordas': bordas, 'contagens': contagens, 'passo': passo, 'acima': acima}
+
 def create_price_distribution_chart(df):
-    """Cria gráfico de distribuição de preços melhorado"""
+    """Cria gráfico de distribuição de preços (histograma agregado no servidor)"""
+    import plotly.graph_objects as go
+
     if 'Valor_Municipal_Area' not in df.columns:
         st.warning("Dados de valor não disponíveis")
         return None
     
-    df_clean = df.copy()
-    df_clean['Valor_Area'] = df_clean['Valor_Municipal_Area'].apply(clean_brazilian_number)
-    df_clean = df_clean[df_clean['Valor_Area'] > 0]
+    valores = converter_coluna_numerica(df['Valor_Municipal_Area']).to_numpy(dtype=float, na_value=np.nan)
+    valores = valores[valores > 0]
     
-    if df_clean.empty:
+    if len(valores) == 0:
         st.warning("Dados insuficientes para distribuição")
         return None
     
     # Converte para milhões
-    df_clean['Valor_Milhoes'] = df_clean['Valor_Area'] / 1_000_000
-    
-    # Define bins de 0,5 em 0,5 milhões
-    import numpy as np
-    max_value = df_clean['Valor_Milhoes'].max()
-    bins = np.arange(0, max_value + 0.5, 0.5)
-    
-    # Cria histograma com bins personalizados
-    fig = px.histogram(
-        df_clean,
-        x='Valor_Milhoes',
-        title="Distribuição de Valores Municipais por Área",
-        labels={'Valor_Milhoes': 'Valor Municipal (R$ Milhões)', 'count': 'Quantidade de Municípios'},
-        color_discrete_sequence=['#00D4AA'],
-        opacity=0.8
-    )
-    
-    # Configura os bins manualmente
-    fig.update_traces(
-        xbins=dict(start=0, end=max_value, size=0.5)
-    )
-    
-    # Centraliza título em relação ao gráfico
-    fig.update_layout(title_x=0.5)
+    valores_milhoes = valores / 1_000_000
+    histograma = calcular_histograma(valores_milhoes)
+    bordas, contagens, passo = histograma['bordas'], histograma['contagens'], histograma['passo']
+    
+    casas = 1 if passo < 10 else 0
+    centros = bordas[:-1] + passo / 2
+    faixas = [
+        f"R$ {inicio:.{casas}f}M - R$ {fim:.{casas}f}M".replace('.', ',')
+        for inicio, fim in zip(bordas[:-1], bordas[1:])
+    ]
+    if histograma['acima']:
+        # Cauda de valores extremos em uma barra extra após a última faixa
+        centros = np.append(centros, bordas[-1] + passo / 2)
+        contagens = np.append(contagens, histograma['acima'])
+        faixas.append(f"Acima de R$ {bordas[-1]:.{casas}f}M".replace('.', ','))
+    
+    fig = go.Figure(go.Bar(
+        x=centros,
+        y=contagens,
+        width=passo,
+        text=faixas,
+        textposition='none',
+        marker=dict(color='#00D4AA', line=dict(color='white', width=1.5)),
+        opacity=0.8,
+        hovertemplate='<b>Faixa:</b> %{text}<br><b>Quantidade:</b> %{y} municípios<extra></extra>'
+    ))
     
     # Adiciona linha de média
-    media = df_clean['Valor_Milhoes'].mean()
+    media = valores_milhoes.mean()
     fig.add_vline(
         x=media, 
         line_dash="dash", 
@@ -1325,31 +2101,13 @@ def create_price_distribution_chart(df):
         annotation_position="top right"
     )
     
-    # Melhorias visuais
-    fig.update_traces(
-        marker_line_color='white',
-        marker_line_width=1.5
-    )
-    
-    # Cria hover correto para bins de 0,5 em 0,5
-    # Calcula as faixas baseado no sistema de bins de 0,5
-    hover_texts = []
-    for i in range(int((max_value + 1) / 0.5)):
-        bin_start = i * 0.5
-        bin_end = (i + 1) * 0.5
-        hover_texts.append(f'R$ {bin_start:.1f}M - R$ {bin_end:.1f}M')
-    
-    # Aplica o hover personalizado
-    fig.update_traces(
-        hovertemplate='<b>Faixa:</b> %{text}<br><b>Quantidade:</b> %{y} municípios<extra></extra>',
-        text=hover_texts[:len(fig.data[0].x)]  # Limita ao número real de barras
-    )
-    
     fig.update_layout(
+        title="Distribuição de Valores Municipais por Área",
         height=500,
         title_font_size=16,
         title_x=0,
         showlegend=False,
+        bargap=0,
         plot_bgcolor='rgba(0,0,0,0)',
         paper_bgcolor='rgba(0,0,0,0)',
         font=dict(size=12),
@@ -1370,14 +2128,52 @@ def create_price_distribution_chart(df):
     
     return fig
 
+# Gráficos de dispersão em escala nacional: até LIMITE_PONTOS_SVG pontos o Plotly
+# desenha em SVG; acima disso usa WebGL (Scattergl); acima de LIMITE_PONTOS_WEBGL os
+# pontos são agregados no servidor (np.histogram2d) e só o mapa de densidade é enviado.
+LIMITE_PONTOS_SVG = 1_000
+LIMITE_PONTOS_WEBGL = 50_000
+BINS_DENSIDADE = 80
+
+def modo_dispersao(n_pontos):
+    """'svg', 'webgl' ou 'densidade', conforme a quantidade de pontos"""
+    if n_pontos > LIMITE_PONTOS_WEBGL:
+        return 'densidade'
+    return 'webgl' if n_pontos > LIMITE_PONTOS_SVG else 'svg'
+
+def grafico_densidade(x, y, titulo, rotulo_x, rotulo_y, bins=BINS_DENSIDADE):
+    """Mapa de densidade (contagem de municípios por célula) calculado com np.histogram2d"""
+    import plotly.graph_objects as go
+
+    contagens, bordas_x, bordas_y = np.histogram2d(np.asarray(x, dtype=float), np.asarray(y, dtype=float), bins=bins)
+    # Células vazias ficam transparentes
+    contagens = np.where(contagens > 0, contagens, np.nan).T
+
+    fig = go.Figure(go.Heatmap(
+        x=(bordas_x[:-1] + bordas_x[1:]) / 2,
+        y=(bordas_y[:-1] + bordas_y[1:]) / 2,
+        z=contagens,
+        colorscale='Viridis',
+        colorbar=dict(title="Municípios"),
+        hovertemplate=f'{rotulo_x}: %{{x:,.1f}}<br>{rotulo_y}: %{{y:,.1f}}<br>'
+                      'Municípios: %{z:,.0f}<extra></extra>'
+    ))
+    fig.update_layout(title=titulo, xaxis_title=rotulo_x, yaxis_title=rotulo_y)
+    return fig
+
 def create_price_by_population_chart(df):
-    """Cria gráfico de valor por população"""
+    """Cria gráfico de valor por população (WebGL ou densidade em bases grandes)"""
+    import plotly.express as px
+
     if 'Valor_Municipal_Area' not in df.columns or 'Populacao' not in df.columns:
         return None
     
-    df_clean = df.copy()
-    df_clean['Valor_Area'] = df_clean['Valor_Municipal_Area'].apply(clean_brazilian_number)
-    df_clean['Pop'] = df_clean['Populacao'].apply(clean_brazilian_number)
+    col_municipio = get_municipio_column(df)
+    df_clean = pd.DataFrame({
+        'Municipio': df[col_municipio] if col_municipio else '',
+        'Valor_Area': converter_coluna_numerica(df['Valor_Municipal_Area']),
+        'Pop': converter_coluna_numerica(df['Populacao']),
+    })
     
     # Remove valores inválidos
     df_clean = df_clean[(df_clean['Valor_Area'] > 0) & (df_clean['Pop'] > 0)]
@@ -1390,31 +2186,41 @@ def create_price_by_population_chart(df):
     df_clean['Pop_Milhares'] = df_clean['Pop'] / 1000
     df_clean['Valor_per_Capita'] = df_clean['Valor_Area'] / df_clean['Pop']
     
-    # Cria scatter plot
-    fig = px.scatter(
-        df_clean,
-        x='Pop_Milhares',
-        y='Valor_Milhoes',
-        size='Valor_per_Capita',
-        hover_name='Municipio',
-        title="Correlação entre Valor Municipal e População",
-        labels={
-            'Pop_Milhares': 'População (milhares)',
-            'Valor_Milhoes': 'Valor Municipal (R$ Milhões)',
-            'Valor_per_Capita': 'Valor per Capita (R$)'
-        },
-        color='Valor_per_Capita',
-        color_continuous_scale='Viridis',
-        size_max=20
-    )
-    
-    fig.update_traces(
-        hovertemplate='<b>%{hovertext}</b><br>' +
-                      'População: %{x:.0f}k habitantes<br>' +
-                      'Valor Municipal: R$ %{y:.0f}M<br>' +
-                      'Valor per Capita: R$ %{marker.size:,.0f}<br>' +
-                      '<extra></extra>'
-    )
+    titulo = "Correlação entre Valor Municipal e População"
+    modo = modo_dispersao(len(df_clean))
+    if modo == 'densidade':
+        fig = grafico_densidade(
+            df_clean['Pop_Milhares'], df_clean['Valor_Milhoes'], titulo,
+            'População (milhares)', 'Valor Municipal (R$ Milhões)'
+        )
+    else:
+        # Cria scatter plot
+        fig = px.scatter(
+            df_clean,
+            x='Pop_Milhares',
+            y='Valor_Milhoes',
+            size='Valor_per_Capita',
+            hover_name='Municipio',
+            title=titulo,
+            labels={
+                'Pop_Milhares': 'População (milhares)',
+                'Valor_Milhoes': 'Valor Municipal (R$ Milhões)',
+                'Valor_per_Capita': 'Valor per Capita (R$)'
+            },
+            color='Valor_per_Capita',
+            color_continuous_scale='Viridis',
+            size_max=20,
+            render_mode=modo
+        )
+        
+        fig.update_traces(
+            hovertemplate='<b>%{hovertext}</b><br>' +
+                          'População: %{x:.0f}k habitantes<br>' +
+                          'Valor Municipal: R$ %{y:.0f}M<br>' +
+                          'Valor per Capita: R$ %{marker.size:,.0f}<br>' +
+                          '<extra></extra>'
+        )
+        fig.update_layout(coloraxis_colorbar_title="Valor per Capita<br>(R$)")
     
     fig.update_layout(
         height=500,
@@ -1423,19 +2229,20 @@ def create_price_by_population_chart(df):
         plot_bgcolor='rgba(0,0,0,0)',
         paper_bgcolor='rgba(0,0,0,0)',
         font=dict(size=12),
-        margin=dict(l=10, r=10, t=80, b=60),
-        coloraxis_colorbar_title="Valor per Capita<br>(R$)"
+        margin=dict(l=10, r=10, t=80, b=60)
     )
     
     return fig
 
 def create_price_boxplot(df):
     """Cria boxplot da distribuição de preços"""
+    import plotly.express as px
+
     if 'Valor_Municipal_Area' not in df.columns:
         return None
     
-    df_clean = df.copy()
-    df_clean['Valor_Area'] = df_clean['Valor_Municipal_Area'].apply(clean_brazilian_number)
+    df_clean = df[['Valor_Municipal_Area']].copy()
+    df_clean['Valor_Area'] = converter_coluna_numerica(df_clean['Valor_Municipal_Area'])
     df_clean = df_clean[df_clean['Valor_Area'] > 0]
     
     if df_clean.empty:
@@ -1488,6 +2295,9 @@ def create_price_boxplot(df):
 
 def create_notes_distribution(df):
     """Cria gráfico de distribuição das notas"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
     note_columns = [col for col in df.columns if 'Nota' in col and col != 'Nota_Media']
     
     if not note_columns:
@@ -1528,12 +2338,72 @@ def create_notes_distribution(df):
     
     return fig
 
-# =============================================================================
-# MAPEAMENTO E GEOLOCALIZAÇÃO
-# =============================================================================
+# Tabelas paginadas no servidor: só a página visível é formatada e enviada ao
+# navegador; a ordenação usa permutações calculadas uma vez por coluna e sentido.
+OPCOES_LINHAS_POR_PAGINA = [25, 50, 100, 250]
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def indice_ordenacao(_df, chave_dados, coluna, crescente):
+    """
+    Permutação (posições) que ordena o DataFrame pela coluna; vazios ficam no final
+
+    Colunas de texto que são inteiramente numéricas são ordenadas pelo valor numérico
+    """
+    serie = _df[coluna].reset_index(drop=True)
+    numeros = converter_coluna_numerica(serie)
+    if numeros.notna().sum() == serie.notna().sum() > 0:
+        serie = numeros
+    return serie.sort_values(ascending=crescente, kind='stable', na_position='last').index.to_numpy()
+
+def exibir_tabela_paginada(df, chave_dados, chave_widget, formatar=None, altura=None):
+    """
+    Exibe o DataFrame em páginas, com ordenação por coluna feita no servidor
+
+    chave_dados identifica o conteúdo de df (cache das permutações de ordenação);
+    formatar, se informado, é aplicado apenas à página visível
+    """
+    if len(df) <= OPCOES_LINHAS_POR_PAGINA[0]:
+        st.dataframe(formatar(df) if formatar else df, width='stretch', height=altura or 'auto')
+        return
+
+    col_ordem, col_sentido, col_linhas, col_pagina = st.columns([2, 2, 1, 1])
+    with col_ordem:
+        coluna = st.selectbox("Ordenar por", ["(ordem atual)"] + list(df.columns), key=f"{chave_widget}_ordem")
+    with col_sentido:
+        sentido = st.radio("Sentido", ["Crescente", "Decrescente"], horizontal=True, key=f"{chave_widget}_sentido")
+    with col_linhas:
+        linhas_por_pagina = st.selectbox("Linhas por página", OPCOES_LINHAS_POR_PAGINA, index=1, key=f"{chave_widget}_linhas")
+
+    total_paginas = -(-len(df) // linhas_por_pagina)
+    with col_pagina:
+        # A chave inclui o total de páginas: volta à primeira página quando o tamanho muda
+        pagina = st.number_input(
+            "Página", min_value=1, max_value=total_paginas, value=1, step=1,
+            key=f"{chave_widget}_pagina_{total_paginas}"
+        )
+
+    inicio = (pagina - 1) * linhas_por_pagina
+    fim = min(inicio + linhas_por_pagina, len(df))
+    if coluna in df.columns:
+        posicoes = indice_ordenacao(df, chave_dados, coluna, sentido == "Crescente")[inicio:fim]
+    else:
+        posicoes = np.arange(inicio, fim)
+
+    pagina_df = df.iloc[posicoes]
+    st.dataframe(formatar(pagina_df) if formatar else pagina_df, width='stretch', height=altura or 'auto')
+    st.caption(f"Linhas {inicio + 1}–{fim} de {len(df)} · página {pagina} de {total_paginas}")
+
+# =============================================================================
+# MAPEAMENTO E GEOLOCALIZAÇÃO
+# =============================================================================
+
+@st.cache_resource(show_spinner=False)
 def baixar_shapefile_brasil():
-    """Carrega shapefile leve dos municípios do Brasil (3.7MB)"""
+    """
+    Carrega shapefile leve dos municípios do Brasil (3.7MB)
+
+    Lido uma única vez por processo; quem for alterar o GeoDataFrame deve usar uma cópia
+    """
     import os
     
     # Usar shapefile leve local (já otimizado)
@@ -1544,6 +2414,7 @@ def baixar_shapefile_brasil():
             st.warning("⚠️ GeoPandas não disponível - usando mapa simplificado")
             return None
         try:
+            import geopandas as gpd
             gdf = gpd.read_file(shapefile_path)
             return gdf
         except Exception as e:
@@ -1557,6 +2428,7 @@ def baixar_shapefile_brasil():
     if not os.path.exists(zip_path):
         st.info("🌐 Baixando dados geográficos do Brasil (primeira vez - pode demorar)...")
         try:
+            import requests
             response = requests.get(url, stream=True, timeout=300)
             response.raise_for_status()
             
@@ -1591,6 +2463,7 @@ def baixar_shapefile_brasil():
         st.info("🔄 Processando dados geográficos (simplificando para reduzir tamanho)...")
         
         # Carregar shapefile do Brasil
+        import geopandas as gpd
         gdf = gpd.read_file(f"zip://{zip_path}")
         
         # Simplificar geometrias para reduzir tamanho (tolerância de ~1km)
@@ -1616,6 +2489,34 @@ def baixar_shapefile_brasil():
         st.error(f"❌ Erro ao carregar shapefile: {e}")
         return None
 
+@st.cache_resource(show_spinner=False)
+def indice_geometria():
+    """
+    Índice código IBGE → linha do GeoDataFrame do mapa (None sem shapefile ou sem CD_MUN)
+
+    Retorna {'gdf', 'codigos': códigos ordenados, 'linhas': linha de cada código no gdf}
+    """
+    gdf = baixar_shapefile_brasil()
+    if gdf is None or 'CD_MUN' not in gdf.columns:
+        return None
+    codigos = pd.to_numeric(gdf['CD_MUN'], errors='coerce').to_numpy(dtype=float)
+    validas = np.flatnonzero(~np.isnan(codigos))
+    ordem = validas[np.argsort(codigos[validas], kind='stable')]
+    return {
+        'gdf': gdf,
+        'codigos': somente_leitura(codigos[ordem].astype(np.int64)),
+        'linhas': somente_leitura(ordem.astype(np.int32)),
+    }
+
+def linhas_geometria(indice, codigos):
+    """Linha da geometria de cada código IBGE (float, NaN = ausente); -1 quando não há geometria"""
+    codigos = np.asarray(codigos, dtype=float)
+    if len(indice['codigos']) == 0:
+        return np.full(len(codigos), -1, dtype=np.int32)
+    candidatas = np.minimum(np.searchsorted(indice['codigos'], codigos), len(indice['codigos']) - 1)
+    encontrados = indice['codigos'][candidatas] == codigos
+    return np.where(encontrados, indice['linhas'][candidatas], -1)
+
 def format_tooltip_value(value, is_currency=True, is_area=False):
     """Formata valores para exibição no tooltip do mapa"""
     if pd.isna(value) or value == 0:
@@ -1644,24 +2545,6 @@ def format_tooltip_value(value, is_currency=True, is_area=False):
     except:
         return "N/A"
 
-def normalizar_municipio_para_matching(nome):
-    """Normaliza nomes de municípios para matching (comparação)"""
-    if pd.isna(nome):
-        return nome
-    
-    # Converter para string e minúsculo
-    nome_limpo = str(nome).lower()
-    
-    # Remover apóstrofes e caracteres especiais
-    caracteres_para_remover = ["'", "'", "`", "´", "^", "~"]
-    for char in caracteres_para_remover:
-        nome_limpo = nome_limpo.replace(char, "")
-    
-    # Remover espaços extras
-    nome_limpo = " ".join(nome_limpo.split())
-    
-    return nome_limpo
-
 def normalizar_municipio_para_exibicao(nome):
     """Normaliza nomes de municípios para exibição (mantém formatação)"""
     if pd.isna(nome):
@@ -1677,115 +2560,175 @@ def normalizar_municipio_para_exibicao(nome):
     
     return nome_normalizado
 
+# Tabela de centroides: um ponto representativo (garantidamente dentro do polígono) por
+# CD_MUN, derivado uma vez do shapefile nacional por `precificacao_cli.py centroides`.
+# O mapa simplificado (sem GeoPandas) lê só este arquivo NumPy (~100 KB).
+SHAPEFILE_CENTROIDES = 'dados/geo/municipios_brasil_com_uf.shp'
+ARQUIVO_CENTROIDES = 'dados/geo/centroides_municipios.npz'
+UF_PADRAO = 'AL'
+
+def _chave_nome_municipio(nome):
+    """Nome do município sem acentos, apóstrofos e espaços extras (busca na tabela de centroides)"""
+    return " ".join(normalizar_texto(nome).replace("'", " ").split())
+
+def gerar_tabela_centroides(caminho_shapefile=SHAPEFILE_CENTROIDES, destino=ARQUIVO_CENTROIDES):
+    """
+    Deriva a tabela de centroides do shapefile (requer GeoPandas) e grava em destino
+
+    Retorna a quantidade de municípios gravados
+    """
+    import geopandas as gpd
+
+    gdf = gpd.read_file(caminho_shapefile)
+    pontos = gdf.geometry.representative_point()
+    tabela = pd.DataFrame({
+        'codigos': pd.to_numeric(gdf['CD_MUN'], errors='coerce'),
+        'latitudes': pontos.y.round(6),
+        'longitudes': pontos.x.round(6),
+        'nomes': gdf['NM_MUN'].map(_chave_nome_municipio),
+        'ufs': gdf['SIGLA_UF'] if 'SIGLA_UF' in gdf.columns else '',
+    }).dropna(subset=['codigos']).sort_values('codigos')
+
+    # Grava em arquivo temporário e renomeia: o dashboard nunca lê um arquivo pela metade
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    temporario = f"{destino}.tmp.npz"
+    np.savez_compressed(
+        temporario,
+        codigos=tabela['codigos'].to_numpy(np.int64),
+        latitudes=tabela['latitudes'].to_numpy(np.float64),
+        longitudes=tabela['longitudes'].to_numpy(np.float64),
+        nomes=tabela['nomes'].to_numpy(str),
+        ufs=tabela['ufs'].to_numpy(str),
+    )
+    os.replace(temporario, destino)
+    return len(tabela)
+
+@st.cache_resource(show_spinner=False)
+def carregar_centroides():
+    """Tabela de centroides (arrays ordenados por código IBGE) ou None se o arquivo não existir"""
+    if not os.path.exists(ARQUIVO_CENTROIDES):
+        return None
+    with np.load(ARQUIVO_CENTROIDES) as arquivo:
+        tabela = {nome: arquivo[nome] for nome in arquivo.files}
+    tabela['por_nome'] = {
+        (nome, uf): posicao for posicao, (nome, uf) in enumerate(zip(tabela['nomes'], tabela['ufs']))
+    }
+    return tabela
+
+def coordenadas_municipios(df):
+    """
+    (latitudes, longitudes) de cada linha de df pela tabela de centroides
+
+    Busca pelo código IBGE e, sem ele, pelo nome + UF; NaN quando não encontrado
+    """
+    latitudes = np.full(len(df), np.nan)
+    longitudes = np.full(len(df), np.nan)
+    tabela = carregar_centroides()
+    if tabela is None or len(df) == 0:
+        return latitudes, longitudes
+
+    posicoes = np.full(len(df), -1)
+    col_codigo = next((col for col in ['Codigo_Municipio', 'CD_MUN'] if col in df.columns), None)
+    if col_codigo:
+        codigos = pd.to_numeric(df[col_codigo], errors='coerce').to_numpy(dtype=float)
+        candidatas = np.minimum(np.searchsorted(tabela['codigos'], codigos), len(tabela['codigos']) - 1)
+        encontrados = tabela['codigos'][candidatas] == codigos
+        posicoes[encontrados] = candidatas[encontrados]
+
+    col_municipio = get_municipio_column(df)
+    faltando = np.flatnonzero(posicoes < 0)
+    if len(faltando) and col_municipio:
+        col_uf = next((col for col in ['UF', 'SIGLA_UF'] if col in df.columns), None)
+        nomes = normalizar_por_categoria(df[col_municipio].iloc[faltando], _chave_nome_municipio)
+        ufs = df[col_uf].iloc[faltando].astype(object) if col_uf else pd.Series(UF_PADRAO, index=nomes.index)
+        for linha, nome, uf in zip(faltando, nomes, ufs):
+            posicoes[linha] = tabela['por_nome'].get((nome, uf), -1)
+
+    encontrados = posicoes >= 0
+    latitudes[encontrados] = tabela['latitudes'][posicoes[encontrados]]
+    longitudes[encontrados] = tabela['longitudes'][posicoes[encontrados]]
+    return latitudes, longitudes
+
+def reconciliar_codigos_municipios(dados, tabela):
+    """
+    Preenche o CD_MUN das linhas sem código IBGE válido pelo nome + UF do município
+
+    dados: CSV de precificação como lido (colunas originais, texto); tabela: carregar_centroides()
+    Retorna (dados com CD_MUN preenchido, {'validos', 'preenchidos', 'sem_correspondencia': [nomes]})
+    """
+    dados = dados.copy()
+    if 'CD_MUN' not in dados.columns:
+        dados['CD_MUN'] = pd.Series(pd.NA, index=dados.index, dtype=object)
+
+    codigos = pd.to_numeric(dados['CD_MUN'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    candidatas = np.minimum(np.searchsorted(tabela['codigos'], codigos), len(tabela['codigos']) - 1)
+    validos = tabela['codigos'][candidatas] == codigos
+
+    col_nome = next((col for col in ['mun_nome', 'NM_MUN'] if col in dados.columns), None)
+    coluna_codigo = dados.columns.get_loc('CD_MUN')
+    preenchidos, sem_correspondencia = 0, []
+    for linha in np.flatnonzero(~validos):
+        nome = dados[col_nome].iat[linha] if col_nome else None
+        uf = dados['SIGLA_UF'].iat[linha] if 'SIGLA_UF' in dados.columns else None
+        posicao = -1
+        if pd.notna(nome):
+            chave = (_chave_nome_municipio(nome), uf if pd.notna(uf) else UF_PADRAO)
+            posicao = tabela['por_nome'].get(chave, -1)
+        if posicao >= 0:
+            dados.iat[linha, coluna_codigo] = str(int(tabela['codigos'][posicao]))
+            preenchidos += 1
+        else:
+            sem_correspondencia.append(str(nome))
+
+    relatorio = {
+        'validos': int(validos.sum()),
+        'preenchidos': preenchidos,
+        'sem_correspondencia': sem_correspondencia,
+    }
+    return dados, relatorio
+
 def create_interactive_map(df, df_full=None):
     """Cria um mapa coroplético dos municípios de Alagoas usando shapefile do IBGE"""
+    import folium
+    import folium.plugins
     
     # Se GeoPandas não está disponível, usa fallback diretamente
     if not GEOPANDAS_AVAILABLE:
         return create_interactive_map_fallback(df, df_full, show_filtered_only=True)
     
     try:
-        # Baixar/carregar shapefile do Brasil (otimizado)
-        gdf = baixar_shapefile_brasil()
-        if gdf is None:
+        import geopandas as gpd
+        
+        # Índice código IBGE → linha da geometria (montado uma vez por processo)
+        indice = indice_geometria()
+        if indice is None:
             return create_interactive_map_fallback(df, df_full, show_filtered_only=True)  # Função de fallback com coordenadas
         
-        # Mapear coluna de município no DataFrame
-        col_municipio = get_municipio_column(df)
-        if not col_municipio or col_municipio not in df.columns:
-            st.error("❌ Coluna de município não encontrada nos dados")
+        col_codigo = next((col for col in ['Codigo_Municipio', 'CD_MUN'] if col in df.columns), None)
+        if not col_codigo:
+            st.warning("⚠️ Dados sem código IBGE - execute `python precificacao_cli.py reconciliar` para preenchê-lo")
             return create_interactive_map_fallback(df, df_full, show_filtered_only=True)
         
-        # Criar DataFrame para merge
-        df_merge = df.copy()
-        df_merge['municipio_normalizado'] = df_merge[col_municipio].apply(normalizar_municipio_para_matching)
-        
-        # Normalizar também o shapefile para matching
-        gdf['municipio_normalizado'] = gdf['NM_MUN'].apply(normalizar_municipio_para_matching)
-        
-        # Verificar se pode usar código IBGE (CD_MUN) para matching preciso
-        has_codigo_ibge = 'CD_MUN' in df_merge.columns and 'CD_MUN' in gdf.columns
-        
-        if has_codigo_ibge:
-            st.info("🎯 Usando matching por CÓDIGO IBGE (CD_MUN) - 100% preciso, sem homônimos!")
-            
-            # CORREÇÃO: Garantir que ambos os CD_MUN sejam do mesmo tipo (string)
-            gdf['CD_MUN'] = gdf['CD_MUN'].astype(str)
-            df_merge['CD_MUN'] = df_merge['CD_MUN'].astype(str)
-            
-            # Fazer merge por código IBGE (método mais confiável)
-            gdf_merged = gdf.merge(
-                df_merge, 
-                left_on='CD_MUN', 
-                right_on='CD_MUN', 
-                how='inner'  # INNER JOIN - mostra APENAS municípios filtrados
+        # Cada município filtrado aponta para a sua linha de geometria por uma busca inteira;
+        # o casamento por nome é feito fora do painel (comando reconciliar da CLI)
+        codigos = pd.to_numeric(df[col_codigo], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        linhas = linhas_geometria(indice, codigos)
+        com_geometria = linhas >= 0
+        sem_geometria = int((~com_geometria).sum())
+        if sem_geometria:
+            st.warning(
+                f"⚠️ {sem_geometria} município(s) sem código IBGE correspondente ficaram fora do mapa - "
+                "execute `python precificacao_cli.py reconciliar` para preencher os códigos"
             )
-        else:
-            # Fallback: verificar se CSV tem coluna UF para matching nome+UF
-            has_uf_column = any(col in df_merge.columns for col in ['SIGLA_UF', 'UF', 'uf', 'sigla_uf'])
-            
-            if has_uf_column:
-                # Usar NOME + UF para evitar homônimos
-                uf_col = next((col for col in ['SIGLA_UF', 'UF', 'uf', 'sigla_uf'] if col in df_merge.columns), None)
-                
-                # Verificar se o shapefile também tem coluna UF
-                gdf_uf_col = None
-                for col in ['SIGLA_UF', 'UF', 'uf', 'sigla_uf']:
-                    if col in gdf.columns:
-                        gdf_uf_col = col
-                        break
-                
-                if gdf_uf_col:
-                    st.info(f"🎯 Usando matching NOME + UF (CSV: {uf_col}, Shapefile: {gdf_uf_col}) para evitar homônimos")
-                    
-                    # Criar chaves compostas para merge
-                    gdf['chave_merge'] = gdf['NM_MUN'] + '_' + gdf[gdf_uf_col]
-                    df_merge['chave_merge'] = df_merge['municipio_normalizado'] + '_' + df_merge[uf_col]
-                    
-                    # Fazer merge com chave composta (nome + UF)
-                    gdf_merged = gdf.merge(
-                        df_merge, 
-                        left_on='chave_merge', 
-                        right_on='chave_merge', 
-                        how='inner'  # INNER JOIN - mostra APENAS municípios filtrados
-                    )
-                else:
-                    # Fallback final: merge apenas por nome (método antigo)
-                    gdf_merged = gdf.merge(
-                        df_merge, 
-                        left_on='municipio_normalizado', 
-                        right_on='municipio_normalizado', 
-                        how='inner'  # INNER JOIN - mostra APENAS municípios filtrados
-                    )
-            else:
-                # Fallback final: merge apenas por nome (método antigo)
-                st.warning("⚠️ Coluna UF não encontrada - usando apenas nome do município (pode gerar matches incorretos)")
-                gdf_merged = gdf.merge(
-                    df_merge, 
-                    left_on='municipio_normalizado', 
-                    right_on='municipio_normalizado', 
-                    how='inner'  # INNER JOIN - mostra APENAS municípios filtrados
-                )
         
-        # Shapefile já contém apenas Alagoas - sem necessidade de filtro adicional
-        # Matching concluído - usando shapefile apenas de Alagoas
-        if False:  # Desabilitar debug desnecessário
-            municipios_fora_al = gdf_merged[gdf_merged['SIGLA_UF'] != 'AL']
-            if len(municipios_fora_al) > 0:
-                st.warning(f"⚠️ ATENÇÃO: {len(municipios_fora_al)} municípios fora de Alagoas encontrados:")
-                with st.expander("🔍 Ver municípios suspeitos"):
-                    for _, row in municipios_fora_al.iterrows():
-                        st.write(f"• **{row['NM_MUN']}** - UF: {row.get('SIGLA_UF', 'N/A')} - Dados: {row.get('municipio_normalizado', 'N/A')}")
-                        
-                if has_uf_column:
-                    st.error("� **ERRO GRAVE**: Mesmo usando matching NOME+UF, ainda há municípios fora de AL!")
-                else:
-                    st.info("💡 Matching por nome apenas - considere adicionar coluna UF aos dados para maior precisão")
-            else:
-                if has_uf_column:
-                    st.success("✅ **SUCESSO**: Matching NOME+UF funcionou - todos os municípios são de Alagoas!")
-                else:
-                    st.info("✅ Todos os matches são de Alagoas (matching por nome apenas)")
+        # Uma única seleção posicional das geometrias (sem merge e sem copiar os polígonos)
+        gdf = indice['gdf']
+        geometrias = gdf.geometry.values.take(linhas[com_geometria])
+        gdf_merged = df[com_geometria].reset_index(drop=True)
+        for coluna in gdf.columns:
+            if coluna != gdf.geometry.name and coluna not in gdf_merged.columns:
+                gdf_merged[coluna] = gdf[coluna].to_numpy()[linhas[com_geometria]]
+        gdf_merged = gpd.GeoDataFrame(gdf_merged, geometry=geometrias, crs=gdf.crs)
         
         # Preparar campos formatados para o tooltip
         gdf_merged['tooltip_municipio'] = gdf_merged['NM_MUN'].fillna('N/A')
@@ -2099,6 +3042,74 @@ def create_interactive_map(df, df_full=None):
         st.info("🔄 Usando mapa alternativo...")
         return create_interactive_map_fallback(df, df_full, show_filtered_only=True)
 
+# Mapa simplificado com muitos municípios: em vez de um Marker + Circle (e o HTML do
+# popup) por linha, todos os pontos vão numa única camada FastMarkerCluster, desenhada
+# no navegador a partir de uma lista compacta; o popup é montado só ao clicar.
+LIMITE_MARCADORES_INDIVIDUAIS = 500
+CORES_MAPA_CALOR = ['#0066CC', '#00AA00', '#FFAA00', '#FF6600', '#CC0000']
+
+# Cada linha de dados: [lat, lon, cor, município, valor, população, notas]
+CALLBACK_MARCADORES_AGRUPADOS = """
+var callback = function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 7, color: row[2], weight: 1, fillColor: row[2], fillOpacity: 0.7
+    });
+    marker.bindTooltip(row[3] + ' - ' + row[4]);
+    marker.bindPopup(function () {
+        return '<b>' + row[3] + '</b><br>Valor (Área): ' + row[4] +
+               '<br>👥 População: ' + row[5] + row[6];
+    }, {maxWidth: 300});
+    return marker;
+};
+"""
+
+def adicionar_marcadores_agrupados(mapa, df, latitudes, longitudes, valor_min, valor_max):
+    """Adiciona os municípios ao mapa como uma única camada agrupada (FastMarkerCluster)"""
+    import html
+    import folium.plugins
+
+    valores = converter_coluna_numerica(df['Valor_Municipal_Area']).to_numpy(dtype=float, na_value=np.nan)
+    populacao = converter_coluna_numerica(df['Populacao']).fillna(0) if 'Populacao' in df.columns else pd.Series(0.0, index=df.index)
+
+    # Cor pela posição do valor entre o mínimo e o máximo (mesmas 5 faixas dos marcadores individuais)
+    cores = np.full(len(df), '#808080', dtype=object)
+    validos = ~np.isnan(valores) & (valores > 0)
+    if valor_max > valor_min:
+        normalizados = (valores[validos] - valor_min) / (valor_max - valor_min)
+        faixas = np.clip(np.ceil(normalizados / 0.2) - 1, 0, 4).astype(int)
+        cores[validos] = np.asarray(CORES_MAPA_CALOR, dtype=object)[faixas]
+
+    valores_formatados = np.full(len(df), "R$ 0", dtype=object)
+    presentes = ~np.isnan(valores) & (valores != 0)
+    valores_formatados[presentes] = formatar_valor_grande_serie(pd.Series(valores[presentes])).to_numpy(dtype=object)
+
+    # Notas (3 primeiras colunas) já em HTML, montadas por coluna e não por linha
+    notas = pd.Series("", index=df.index)
+    nota_columns = [col for col in df.columns if col.startswith('Nota')][:3]
+    for nota_col in nota_columns:
+        nota = converter_coluna_numerica(df[nota_col])
+        texto = f"{nota_col.replace('Nota_', '').replace('_', ' ')}: " + nota.map('{:.1f}'.format) + "<br>"
+        notas += texto.where(nota.notna(), "")
+    if nota_columns:
+        notas = notas.where(notas == "", "<br><br><b>Notas:</b><br>" + notas)
+
+    dados = pd.DataFrame({
+        'lat': latitudes,
+        'lon': longitudes,
+        'cor': cores,
+        'municipio': df['Municipio'].astype(str).map(html.escape).to_numpy(),
+        'valor': valores_formatados,
+        'populacao': formatar_valor_grande_serie(populacao, incluir_rs=False).to_numpy(dtype=object),
+        'notas': notas.to_numpy(),
+    })
+    folium.plugins.FastMarkerCluster(
+        dados.values.tolist(),
+        callback=CALLBACK_MARCADORES_AGRUPADOS,
+        name="Municípios",
+        disableClusteringAtZoom=11,
+        chunkedLoading=True
+    ).add_to(mapa)
+
 def create_interactive_map_fallback(df, df_full=None, show_filtered_only=False):
     """
     Função de fallback caso o shapefile não esteja disponível
@@ -2108,8 +3119,11 @@ def create_interactive_map_fallback(df, df_full=None, show_filtered_only=False):
         df_full: DataFrame completo (opcional, para comparação)
         show_filtered_only: Se True, mostra apenas os municípios filtrados
     """
+    import folium
+    import folium.plugins
     
-    # Coordenadas aproximadas dos municípios de Alagoas (algumas principais)
+    # Coordenadas aproximadas dos municípios de Alagoas (algumas principais), usadas apenas
+    # se a tabela de centroides (ARQUIVO_CENTROIDES) não estiver disponível
     municipios_coords = {
         'Maceió': [-9.6658, -35.7353],
         'Arapiraca': [-9.7515, -36.6597],
@@ -2160,7 +3174,6 @@ def create_interactive_map_fallback(df, df_full=None, show_filtered_only=False):
         'Taquarana': [-9.0575, -36.0589],
         'Feira Grande': [-9.9039, -36.6700],
         'Cacimbinhas': [-9.3925, -37.0825],
-        'Arapiraca': [-9.7515, -36.6597],
         'Lagoa da Canoa': [-9.8594, -36.7672]
     }
     
@@ -2207,152 +3220,164 @@ def create_interactive_map_fallback(df, df_full=None, show_filtered_only=False):
             valor_max = 0
             st.warning("⚠️ Nenhum valor válido encontrado para o mapa de calor")
         
-        # Adicionar marcadores para cada município
-        for _, row in df_to_process.iterrows():
-            municipio = row['Municipio']
-            # Limpar e converter o valor para número
-            valor_bruto = row['Valor_Municipal_Area']
-            valor = clean_brazilian_number(valor_bruto)
-            
-            # Todos os municípios mostrados são considerados "selecionados"
-            is_filtered = True
-            
-            # Tentar encontrar coordenadas do município
+        # Coordenadas de todos os municípios de uma vez (tabela de centroides); os que não
+        # estão na tabela usam a lista fixa ou um deslocamento determinístico a partir do nome
+        # (crc32 é estável entre processos, ao contrário de hash())
+        latitudes, longitudes = coordenadas_municipios(df_to_process)
+        for posicao in np.flatnonzero(np.isnan(latitudes)):
+            municipio = df_to_process['Municipio'].iloc[posicao]
             coords = municipios_coords.get(municipio)
             if not coords:
-                # Se não encontrar, usar coordenadas aproximadas baseadas no índice
-                lat_offset = (hash(municipio) % 100 - 50) * 0.01
-                lon_offset = (hash(municipio + 'lon') % 100 - 50) * 0.01
+                lat_offset = (zlib.crc32(str(municipio).encode('utf-8')) % 100 - 50) * 0.01
+                lon_offset = (zlib.crc32(f"{municipio}lon".encode('utf-8')) % 100 - 50) * 0.01
                 coords = [center_lat + lat_offset, center_lon + lon_offset]
+            latitudes[posicao], longitudes[posicao] = coords
+        
+        if len(df_to_process) > LIMITE_MARCADORES_INDIVIDUAIS:
+            # Muitos municípios: uma única camada agrupada, desenhada no navegador
+            adicionar_marcadores_agrupados(m, df_to_process, latitudes, longitudes, valor_min, valor_max)
+        else:
+            # Adicionar marcadores para cada município
+            for posicao, (_, row) in enumerate(df_to_process.iterrows()):
+                municipio = row['Municipio']
+                # Limpar e converter o valor para número
+                valor_bruto = row['Valor_Municipal_Area']
+                valor = clean_brazilian_number(valor_bruto)
             
-            # Definir cor baseada no valor (mapa de calor)
-            if is_filtered and valor_max > valor_min and pd.notna(valor) and valor > 0:
-                # Calcular valor normalizado (0 a 1)
-                normalized_value = (valor - valor_min) / (valor_max - valor_min)
+                # Todos os municípios mostrados são considerados "selecionados"
+                is_filtered = True
+            
+                coords = [latitudes[posicao], longitudes[posicao]]
+            
+                # Definir cor baseada no valor (mapa de calor)
+                if is_filtered and valor_max > valor_min and pd.notna(valor) and valor > 0:
+                    # Calcular valor normalizado (0 a 1)
+                    normalized_value = (valor - valor_min) / (valor_max - valor_min)
                 
-                # Criar gradiente de cores para mapa de calor (do azul frio ao vermelho quente)
-                if normalized_value <= 0.2:
-                    # Azul (valores baixos - frios)
-                    color = 'blue'
-                    circle_color = '#0066CC'
-                    icon_color = 'lightblue'
-                elif normalized_value <= 0.4:
-                    # Verde (valores baixo-médios)
-                    color = 'green'
-                    circle_color = '#00AA00'
-                    icon_color = 'lightgreen'
-                elif normalized_value <= 0.6:
-                    # Amarelo (valores médios)
-                    color = 'orange'
-                    circle_color = '#FFAA00'
-                    icon_color = 'orange'
-                elif normalized_value <= 0.8:
-                    # Laranja (valores médio-altos)
-                    color = 'orange'
-                    circle_color = '#FF6600'
-                    icon_color = 'orange'
-                else:
-                    # Vermelho (valores altos - quentes)
-                    color = 'red'
-                    circle_color = '#CC0000'
-                    icon_color = 'lightred'
+                    # Criar gradiente de cores para mapa de calor (do azul frio ao vermelho quente)
+                    if normalized_value <= 0.2:
+                        # Azul (valores baixos - frios)
+                        color = 'blue'
+                        circle_color = '#0066CC'
+                        icon_color = 'lightblue'
+                    elif normalized_value <= 0.4:
+                        # Verde (valores baixo-médios)
+                        color = 'green'
+                        circle_color = '#00AA00'
+                        icon_color = 'lightgreen'
+                    elif normalized_value <= 0.6:
+                        # Amarelo (valores médios)
+                        color = 'orange'
+                        circle_color = '#FFAA00'
+                        icon_color = 'orange'
+                    elif normalized_value <= 0.8:
+                        # Laranja (valores médio-altos)
+                        color = 'orange'
+                        circle_color = '#FF6600'
+                        icon_color = 'orange'
+                    else:
+                        # Vermelho (valores altos - quentes)
+                        color = 'red'
+                        circle_color = '#CC0000'
+                        icon_color = 'lightred'
                 
-                # Ícone destacado para municípios filtrados
-                icon_name = 'fire'  # Ícone de fogo para representar calor
-                icon_prefix = 'glyphicon'
-            else:
-                # Municípios não filtrados ou sem variação: cor neutra
-                color = 'gray'
-                circle_color = '#808080'
-                icon_color = 'lightgray'
-                icon_name = 'info-sign'
-                icon_prefix = 'glyphicon'
+                    # Ícone destacado para municípios filtrados
+                    icon_name = 'fire'  # Ícone de fogo para representar calor
+                    icon_prefix = 'glyphicon'
+                else:
+                    # Municípios não filtrados ou sem variação: cor neutra
+                    color = 'gray'
+                    circle_color = '#808080'
+                    icon_color = 'lightgray'
+                    icon_name = 'info-sign'
+                    icon_prefix = 'glyphicon'
             
-            # Criar popup com informações detalhadas
-            # Corrigir população removendo pontos (separador de milhares brasileiro)
-            populacao_valor = str(row.get('Populacao', 0)).replace('.', '').replace(',', '')
-            try:
-                populacao_int = int(float(populacao_valor))
-            except:
-                populacao_int = 0
+                # Criar popup com informações detalhadas
+                # Corrigir população removendo pontos (separador de milhares brasileiro)
+                populacao_valor = str(row.get('Populacao', 0)).replace('.', '').replace(',', '')
+                try:
+                    populacao_int = int(float(populacao_valor))
+                except:
+                    populacao_int = 0
                 
-            # Criar texto do popup com informação de filtro
-            status_text = "⭐ <b>SELECIONADO</b>" if is_filtered else "⚪ Não selecionado"
+                # Criar texto do popup com informação de filtro
+                status_text = "⭐ <b>SELECIONADO</b>" if is_filtered else "⚪ Não selecionado"
             
-            # Garantir que valor é numérico para formatação
-            valor_formatado = "R$ 0"
-            try:
-                if pd.notna(valor) and valor != 0:
-                    valor_formatado = formatar_valor_grande(float(valor))
-            except:
+                # Garantir que valor é numérico para formatação
                 valor_formatado = "R$ 0"
+                try:
+                    if pd.notna(valor) and valor != 0:
+                        valor_formatado = formatar_valor_grande(float(valor))
+                except:
+                    valor_formatado = "R$ 0"
                 
-            popup_text = f"""
-            <b>{municipio}</b><br>
-            <i>{status_text}</i><br><br>
-            Valor (Área): {valor_formatado}<br>
-            👥 População: {formatar_numero_grande(populacao_int)}<br>
-            """
+                popup_text = f"""
+                <b>{municipio}</b><br>
+                <i>{status_text}</i><br><br>
+                Valor (Área): {valor_formatado}<br>
+                👥 População: {formatar_numero_grande(populacao_int)}<br>
+                """
             
-            # Adicionar notas se disponíveis
-            nota_columns = [col for col in df.columns if col.startswith('Nota')]
-            if nota_columns:
-                popup_text += "<br><b>Notas:</b><br>"
-                for nota_col in nota_columns[:3]:  # Mostrar apenas as 3 primeiras notas
-                    if pd.notna(row.get(nota_col)):
-                        nota_name = nota_col.replace('Nota_', '').replace('_', ' ')
-                        popup_text += f"{nota_name}: {row[nota_col]:.1f}<br>"
+                # Adicionar notas se disponíveis
+                nota_columns = [col for col in df.columns if col.startswith('Nota')]
+                if nota_columns:
+                    popup_text += "<br><b>Notas:</b><br>"
+                    for nota_col in nota_columns[:3]:  # Mostrar apenas as 3 primeiras notas
+                        nota = clean_brazilian_number(row.get(nota_col))
+                        if pd.notna(nota):
+                            nota_name = nota_col.replace('Nota_', '').replace('_', ' ')
+                            popup_text += f"{nota_name}: {nota:.1f}<br>"
             
-            # Adicionar marcador ao mapa
-            tooltip_status = "⭐ SELECIONADO" if is_filtered else "⚪ Não selecionado"
-            folium.Marker(
-                location=coords,
-                popup=folium.Popup(popup_text, max_width=300),
-                tooltip=f"{municipio} - {valor_formatado} ({tooltip_status})",
-                icon=folium.Icon(
-                    color=color,
-                    icon=icon_name,
-                    prefix=icon_prefix
-                )
-            ).add_to(m)
+                # Adicionar marcador ao mapa
+                tooltip_status = "⭐ SELECIONADO" if is_filtered else "⚪ Não selecionado"
+                folium.Marker(
+                    location=coords,
+                    popup=folium.Popup(popup_text, max_width=300),
+                    tooltip=f"{municipio} - {valor_formatado} ({tooltip_status})",
+                    icon=folium.Icon(
+                        color=color,
+                        icon=icon_name,
+                        prefix=icon_prefix
+                    )
+                ).add_to(m)
             
-            # Criar círculo de calor baseado no valor municipal
-            if is_filtered and valor_max > valor_min:
-                # Tamanho do círculo baseado no valor (maior valor = círculo maior)
-                normalized_value = (valor - valor_min) / (valor_max - valor_min)
-                base_radius = 8000  # Raio base
-                radius = base_radius + (normalized_value * 12000)  # Entre 8km e 20km
+                # Criar círculo de calor baseado no valor municipal
+                if is_filtered and valor_max > valor_min:
+                    # Tamanho do círculo baseado no valor (maior valor = círculo maior)
+                    normalized_value = (valor - valor_min) / (valor_max - valor_min)
+                    base_radius = 8000  # Raio base
+                    radius = base_radius + (normalized_value * 12000)  # Entre 8km e 20km
                 
-                # Usar a cor já definida para o mapa de calor
-                weight = 2
-                opacity = 0.9
-                fillOpacity = 0.4 + (normalized_value * 0.4)  # Opacidade varia de 0.4 a 0.8
-            else:
-                # Círculos padrão para municípios sem filtro ou sem variação
-                radius = max(3000, min(15000, populacao_int * 0.1))
-                circle_color = '#808080'  # Cinza
-                weight = 1
-                opacity = 0.4
-                fillOpacity = 0.1
+                    # Usar a cor já definida para o mapa de calor
+                    weight = 2
+                    opacity = 0.9
+                    fillOpacity = 0.4 + (normalized_value * 0.4)  # Opacidade varia de 0.4 a 0.8
+                else:
+                    # Círculos padrão para municípios sem filtro ou sem variação
+                    radius = max(3000, min(15000, populacao_int * 0.1))
+                    circle_color = '#808080'  # Cinza
+                    weight = 1
+                    opacity = 0.4
+                    fillOpacity = 0.1
             
-            # Garantir que radius é numérico para formatação
-            try:
-                radius_km = float(radius) / 1000
-                area_texto = f"{radius_km:.1f}km"
-            except:
-                area_texto = "N/A"
+                # Garantir que radius é numérico para formatação
+                try:
+                    radius_km = float(radius) / 1000
+                    area_texto = f"{radius_km:.1f}km"
+                except:
+                    area_texto = "N/A"
                 
-            folium.Circle(
-                location=coords,
-                radius=radius,
-                popup=f"{municipio}<br>Área aprox.: {area_texto}<br><i>{status_text}</i>",
-                color=circle_color,
-                weight=weight,
-                opacity=opacity,
-                fill=True,
-                fillColor=circle_color,
-                fillOpacity=fillOpacity
-            ).add_to(m)
+                folium.Circle(
+                    location=coords,
+                    radius=radius,
+                    popup=f"{municipio}<br>Área aprox.: {area_texto}<br><i>{status_text}</i>",
+                    color=circle_color,
+                    weight=weight,
+                    opacity=opacity,
+                    fill=True,
+                    fillColor=circle_color,
+                    fillOpacity=fillOpacity
+                ).add_to(m)
     
     # Criar legenda dinâmica baseada nos filtros
     municipios_exibidos = len(df) if len(df) > 0 else 0
@@ -2439,8 +3464,54 @@ def create_interactive_map_fallback(df, df_full=None, show_filtered_only=False):
 # QUERY BUILDER E ANÁLISES AVANÇADAS
 # =============================================================================
 
-def create_query_builder_interface(df):
-    """Interface de Query Builder similar ao Metabase"""
+# Campos disponíveis no construtor de consultas (coluna → rótulo); todos numéricos, exceto os de texto
+CAMPOS_CONSULTA = {
+    'Municipio': 'Nome do Município',
+    'Populacao': 'População',
+    'Valor_Municipal_Area': 'Valor por Área (R$)',
+    'Valor_Municipal_Perimetro': 'Valor por Perímetro (R$)',
+    'Nota_Media': 'Nota Média',
+    'Nota_Vegetacao': 'Nota Vegetação',
+    'Nota_Area': 'Nota Área',
+    'Nota_Relevo': 'Nota Relevo',
+    'Area_Cidade': 'Área da Cidade',
+    'Num_Imoveis': 'Número de Imóveis'
+}
+CAMPOS_TEXTO_CONSULTA = ['Municipio']
+
+# Opções de agrupamento da interface → definição usada no plano de consulta
+AGRUPAMENTOS_CONSULTA = {
+    "Sem Agrupamento": None,
+    "Por Faixa de População": {
+        'tipo': 'faixas', 'classificacao': 'populacao', 'nome': 'Faixa_Populacao',
+        'estatisticas': ['count', 'mean', 'sum'],
+    },
+    "Por Faixa de Nota": {
+        'tipo': 'faixas', 'classificacao': 'nota', 'nome': 'Faixa_Nota',
+        'estatisticas': ['count', 'mean'],
+    },
+    "Por Faixa de Valor": {
+        'tipo': 'faixas', 'classificacao': 'valor', 'nome': 'Faixa_Valor',
+        'estatisticas': ['count', 'mean', 'sum'],
+    },
+    "Por Região (Alfabética)": {
+        'tipo': 'primeira_letra', 'coluna': 'Municipio', 'nome': 'Primeira_Letra',
+        'estatisticas': ['count', 'mean'],
+    },
+    "Por Quartis": {
+        'tipo': 'quartis', 'coluna': None, 'nome': 'Quartil',
+        'rotulos': ['Q1 (25% menores)', 'Q2', 'Q3', 'Q4 (25% maiores)'],
+        'estatisticas': ['count', 'mean'],
+    },
+}
+
+def create_query_builder_interface(df, chave_filtro=None, df_base=None):
+    """
+    Interface de Query Builder similar ao Metabase
+
+    chave_filtro identifica o conjunto filtrado recebido (cache da ordenação das tabelas);
+    df_base é o dataset completo do qual df foi filtrado (consultas via DuckDB)
+    """
     
     st.markdown("### Construtor de Consultas")
     st.markdown("""
@@ -2468,22 +3539,8 @@ def create_query_builder_interface(df):
             key="qb_viz_type"
         )
         
-        # Seleção das colunas a mostrar
-        available_columns = {
-            'Municipio': 'Nome do Município',
-            'Populacao': 'População',
-            'Valor_Municipal_Area': 'Valor por Área (R$)',
-            'Valor_Municipal_Perimetro': 'Valor por Perímetro (R$)',
-            'Nota_Media': 'Nota Média',
-            'Nota_Vegetacao': 'Nota Vegetação',
-            'Nota_Area': 'Nota Área',
-            'Nota_Relevo': 'Nota Relevo',
-            'Area_Cidade': 'Área da Cidade',
-            'Num_Imoveis': 'Número de Imóveis'
-        }
-        
         # Filtrar colunas disponíveis baseado no que existe no DataFrame
-        available_cols = {k: v for k, v in available_columns.items() if k in df.columns}
+        available_cols = {k: v for k, v in CAMPOS_CONSULTA.items() if k in df.columns}
         
         selected_columns = st.multiselect(
             "Dados para Mostrar:",
@@ -2499,8 +3556,7 @@ def create_query_builder_interface(df):
         # Agrupamento
         group_option = st.selectbox(
             "Agrupar Dados Por:",
-            ["Sem Agrupamento", "Por Faixa de População", "Por Faixa de Nota", 
-             "Por Faixa de Valor", "Por Região (Alfabética)", "Por Quartis"],
+            list(AGRUPAMENTOS_CONSULTA),
             key="qb_group"
         )
         
@@ -2612,138 +3668,369 @@ def create_query_builder_interface(df):
     with col2:
         execute_query = st.button("Executar Consulta", type="primary", key="execute_qb")
     
+    if execute_query:
+        # Mantém o resultado visível nas reexecuções seguintes (paginação e ordenação da tabela)
+        st.session_state.auto_execute_qb = True
+    
     if execute_query or st.session_state.get('auto_execute_qb', False):
         if selected_columns:
             try:
-                # Aplicar filtros
-                filtered_df = df.copy()
-                
+                # Compilar as escolhas em um plano (filtros, agrupamento, ordenação e limite)
+                filtros = {}
                 if pop_filter and pop_range_qb:
-                    pop_clean = pd.to_numeric(filtered_df['Populacao'], errors='coerce').fillna(0)
-                    filtered_df = filtered_df[(pop_clean >= pop_range_qb[0]) & (pop_clean <= pop_range_qb[1])]
-                
+                    filtros['Populacao'] = pop_range_qb
                 if valor_filter and valor_range_qb:
-                    valor_clean = pd.to_numeric(filtered_df['Valor_Municipal_Area'], errors='coerce').fillna(0)
-                    valor_min_real = valor_range_qb[0] * 1_000_000_000
-                    valor_max_real = valor_range_qb[1] * 1_000_000_000
-                    filtered_df = filtered_df[(valor_clean >= valor_min_real) & (valor_clean <= valor_max_real)]
-                
+                    filtros['Valor_Municipal_Area'] = valor_range_qb  # Já em valores absolutos
                 if nota_filter and nota_range_qb:
-                    nota_clean = pd.to_numeric(filtered_df['Nota_Media'], errors='coerce').fillna(0)
-                    filtered_df = filtered_df[(nota_clean >= nota_range_qb[0]) & (nota_clean <= nota_range_qb[1])]
+                    filtros['Nota_Media'] = nota_range_qb
                 
-                # Aplicar agrupamento
-                result_df = apply_grouping(filtered_df, group_option, selected_columns)
-                
-                # Aplicar ordenação
-                if sort_column and sort_column in result_df.columns:
-                    ascending = sort_order.startswith("Crescente")
-                    result_df = result_df.sort_values(sort_column, ascending=ascending)
+                plano = compilar_consulta(
+                    selected_columns,
+                    group_option,
+                    df.columns,
+                    ordenacao=sort_column,
+                    crescente=sort_order.startswith("Crescente"),
+                    filtros=filtros,
+                    limite=max_results if limit_results else None
+                )
                 
-                # Aplicar limite
-                if limit_results and max_results:
-                    result_df = result_df.head(max_results)
+                inicio = time.perf_counter()
+                result_df, motor, chave_consulta = consultar_com_cache(plano, df, df_base, chave_filtro)
+                uso_cache = estatisticas_cache_consultas()
+                st.caption(
+                    f"Consulta executada em {(time.perf_counter() - inicio) * 1000:.0f} ms ({motor}) · "
+                    f"cache: {uso_cache['acertos']} acerto(s) em {uso_cache['acertos'] + uso_cache['falhas']} "
+                    f"consulta(s) ({uso_cache['taxa_acerto']:.0%}), {uso_cache['itens']}/{uso_cache['limite']} resultados"
+                )
                 
-                # Mostrar resultado
-                show_query_result(result_df, viz_type, selected_columns, available_cols)
+                # Mostrar resultado (a impressão digital do plano identifica o resultado nas tabelas e downloads)
+                show_query_result(result_df, viz_type, selected_columns, available_cols, chave_consulta)
                 
             except Exception as e:
                 st.error(f"Erro ao executar consulta: {str(e)}")
         else:
             st.warning("Selecione pelo menos uma coluna para mostrar!")
 
-def apply_grouping(df, group_option, selected_columns):
-    """Aplica agrupamento aos dados conforme opção selecionada"""
-    
-    if group_option == "Sem Agrupamento":
-        return df[selected_columns]
-    
-    elif group_option == "Por Faixa de População":
-        if 'Populacao' in df.columns:
-            pop_clean = pd.to_numeric(df['Populacao'], errors='coerce').fillna(0)
-            df['Faixa_Populacao'] = pd.cut(pop_clean, 
-                                         bins=[0, 20000, 50000, 100000, float('inf')],
-                                         labels=['Pequeno (até 20k)', 'Médio (20k-50k)', 
-                                               'Grande (50k-100k)', 'Muito Grande (100k+)'])
-            # Agrupar e agregar
-            numeric_cols = [col for col in selected_columns if col != 'Municipio' and df[col].dtype in ['int64', 'float64']]
-            if numeric_cols:
-                grouped = df.groupby('Faixa_Populacao')[numeric_cols].agg(['count', 'mean', 'sum']).round(2)
-                grouped.columns = [f'{col}_{stat}' for col, stat in grouped.columns]
-                return grouped.reset_index()
-            else:
-                return df.groupby('Faixa_Populacao').size().reset_index(name='Quantidade')
-        else:
-            return df[selected_columns]
-    
-    elif group_option == "Por Faixa de Nota":
-        if 'Nota_Media' in df.columns:
-            nota_clean = pd.to_numeric(df['Nota_Media'], errors='coerce').fillna(0)
-            df['Faixa_Nota'] = pd.cut(nota_clean,
-                                    bins=[0, 2, 4, 6, 8, 10],
-                                    labels=['Muito Baixa (0-2)', 'Baixa (2-4)', 
-                                          'Média (4-6)', 'Alta (6-8)', 'Muito Alta (8-10)'])
-            numeric_cols = [col for col in selected_columns if col != 'Municipio' and df[col].dtype in ['int64', 'float64']]
-            if numeric_cols:
-                grouped = df.groupby('Faixa_Nota')[numeric_cols].agg(['count', 'mean']).round(2)
-                grouped.columns = [f'{col}_{stat}' for col, stat in grouped.columns]
-                return grouped.reset_index()
-            else:
-                return df.groupby('Faixa_Nota').size().reset_index(name='Quantidade')
-        else:
-            return df[selected_columns]
-    
-    elif group_option == "Por Faixa de Valor":
-        if 'Valor_Municipal_Area' in df.columns:
-            valor_clean = pd.to_numeric(df['Valor_Municipal_Area'], errors='coerce').fillna(0)
-            valor_bi = valor_clean / 1_000_000_000
-            df['Faixa_Valor'] = pd.cut(valor_bi,
-                                     bins=[0, 5, 15, 25, float('inf')],
-                                     labels=['Baixo (até 5B)', 'Médio (5B-15B)', 
-                                           'Alto (15B-25B)', 'Premium (25B+)'])
-            numeric_cols = [col for col in selected_columns if col != 'Municipio' and df[col].dtype in ['int64', 'float64']]
-            if numeric_cols:
-                grouped = df.groupby('Faixa_Valor')[numeric_cols].agg(['count', 'mean', 'sum']).round(2)
-                grouped.columns = [f'{col}_{stat}' for col, stat in grouped.columns]
-                return grouped.reset_index()
-            else:
-                return df.groupby('Faixa_Valor').size().reset_index(name='Quantidade')
+# Motor de consultas: as escolhas da interface viram um plano (dict) executado pelo
+# DuckDB sobre o dataset em Parquet (tipado e gravado uma vez por versão dos dados),
+# com filtros e LIMIT aplicados no SQL e leitura apenas das colunas usadas. Sem
+# DuckDB instalado, o mesmo plano é executado em pandas com a mesma semântica.
+DIRETORIO_DADOS_COLUNARES = os.path.join(tempfile.gettempdir(), 'dashboard_precificacao_colunar')
+LINHAS_POR_GRUPO_PARQUET = 100_000
+
+def _tipar_colunas_consulta(df, colunas):
+    """Colunas da consulta com tipos de verdade (números convertidos) + posição da linha ('_linha')"""
+    dados = pd.DataFrame({'_linha': np.arange(len(df))})
+    for coluna in colunas:
+        valores = df[coluna].reset_index(drop=True)
+        dados[coluna] = valores if coluna in CAMPOS_TEXTO_CONSULTA else converter_coluna_numerica(valores)
+    return dados
+
+def compilar_consulta(colunas, agrupamento, colunas_dataset, ordenacao=None, crescente=True,
+                      filtros=None, limite=None):
+    """
+    Compila as escolhas do construtor de consultas em um plano de consulta
+
+    filtros: {coluna: (mínimo, máximo)}, limites inclusivos; valores ausentes contam como 0
+    """
+    numericas = [coluna for coluna in colunas if coluna not in CAMPOS_TEXTO_CONSULTA]
+
+    grupo = dict(AGRUPAMENTOS_CONSULTA[agrupamento]) if AGRUPAMENTOS_CONSULTA.get(agrupamento) else None
+    if grupo and grupo['tipo'] == 'faixas':
+        # Coluna, limites e rótulos vêm da classificação (a mesma usada pelos códigos pré-calculados)
+        grupo = {**CLASSIFICACOES_FAIXAS[grupo['classificacao']], **grupo}
+    if grupo and grupo['tipo'] == 'quartis':
+        # Quartis da primeira coluna numérica selecionada (exige ao menos 2 colunas)
+        grupo['coluna'] = numericas[0] if len(colunas) > 1 and numericas else None
+    if grupo and grupo['coluna'] not in colunas_dataset:
+        grupo = None
+
+    return {
+        'colunas': list(colunas),
+        'filtros': [
+            {'coluna': coluna, 'minimo': minimo, 'maximo': maximo}
+            for coluna, (minimo, maximo) in (filtros or {}).items()
+        ],
+        'agrupamento': grupo,
+        'agregadas': numericas if grupo else [],
+        # Depois do agrupamento as colunas selecionadas não existem mais: ordena só sem agrupamento
+        'ordenacao': {'coluna': ordenacao, 'crescente': crescente} if ordenacao and not grupo else None,
+        'limite': limite,
+    }
+
+def colunas_do_plano(plano):
+    """Colunas do dataset lidas pelo plano"""
+    colunas = list(plano['colunas'])
+    colunas += [filtro['coluna'] for filtro in plano['filtros']]
+    if plano['agrupamento']:
+        colunas.append(plano['agrupamento']['coluna'])
+    return list(dict.fromkeys(colunas))
+
+def _finalizar_resultado(resultado, plano):
+    """Troca o código do grupo pelo rótulo e arredonda as agregações (comum aos dois motores)"""
+    grupo = plano['agrupamento']
+    if not grupo:
+        return resultado.reset_index(drop=True)
+
+    chaves = resultado['_grupo']
+    if 'rotulos' in grupo:
+        chaves = chaves.map(lambda codigo: grupo['rotulos'][int(codigo)])
+    resultado = resultado.drop(columns='_grupo').round(2)
+    resultado.insert(0, grupo['nome'], chaves.to_numpy())
+    return resultado.reset_index(drop=True)
+
+def _sql_identificador(coluna):
+    return '"' + coluna.replace('"', '""') + '"'
+
+def _executar_consulta_duckdb(plano, caminho_parquet, linhas=None):
+    """Executa o plano no DuckDB; linhas restringe às posições do dataset (filtros da barra lateral)"""
+    parametros = []
+    condicoes = []
+    for filtro in plano['filtros']:
+        coluna = _sql_identificador(filtro['coluna'])
+        condicao = f"{coluna} BETWEEN ? AND ?"
+        if filtro['minimo'] <= 0 <= filtro['maximo']:
+            condicao = f"({condicao} OR {coluna} IS NULL)"
+        condicoes.append(condicao)
+        parametros += [filtro['minimo'], filtro['maximo']]
+    if linhas is not None:
+        condicoes.append("_linha IN (SELECT _linha FROM linhas_visiveis)")
+
+    colunas_lidas = ', '.join(_sql_identificador(coluna) for coluna in ['_linha'] + colunas_do_plano(plano))
+    base = f"SELECT {colunas_lidas} FROM read_parquet(?)"
+    parametros_base = [caminho_parquet]
+    if condicoes:
+        base += " WHERE " + " AND ".join(condicoes)
+        parametros_base += parametros
+
+    grupo = plano['agrupamento']
+    parametros_consulta = []
+    if not grupo:
+        sql = f"SELECT {', '.join(_sql_identificador(c) for c in plano['colunas'])} FROM base"
+        ordem = "_linha"
+        if plano['ordenacao']:
+            sentido = "ASC" if plano['ordenacao']['crescente'] else "DESC"
+            ordem = f"{_sql_identificador(plano['ordenacao']['coluna'])} {sentido} NULLS LAST, _linha"
+        sql += f" ORDER BY {ordem}"
+    else:
+        valor = f"COALESCE({_sql_identificador(grupo['coluna'])}, 0)"
+        origem = "base"
+        if grupo['tipo'] == 'faixas':
+            # Mesma regra de codificar_faixas: (limite_i, limite_i+1], primeiro limite só com incluir_menor
+            escalado = f"({valor} / {float(grupo['escala'])!r})"
+            casos = []
+            for indice in range(len(grupo['limites']) - 1):
+                maior = ">=" if indice == 0 and grupo['incluir_menor'] else ">"
+                casos.append(f"WHEN {escalado} {maior} ? AND {escalado} <= ? THEN {indice}")
+                parametros_consulta += [float(grupo['limites'][indice]), float(grupo['limites'][indice + 1])]
+            chave = f"CASE {' '.join(casos)} END"
+        elif grupo['tipo'] == 'quartis':
+            origem = f"base, (SELECT quantile_cont({valor}, [0.25, 0.5, 0.75]) AS q FROM base) AS limites"
+            chave = f"CASE WHEN {valor} <= q[1] THEN 0 WHEN {valor} <= q[2] THEN 1 WHEN {valor} <= q[3] THEN 2 ELSE 3 END"
         else:
-            return df[selected_columns]
-    
-    elif group_option == "Por Região (Alfabética)":
-        if 'Municipio' in df.columns:
-            df['Primeira_Letra'] = df['Municipio'].str[0].str.upper()
-            numeric_cols = [col for col in selected_columns if col != 'Municipio' and df[col].dtype in ['int64', 'float64']]
-            if numeric_cols:
-                grouped = df.groupby('Primeira_Letra')[numeric_cols].agg(['count', 'mean']).round(2)
-                grouped.columns = [f'{col}_{stat}' for col, stat in grouped.columns]
-                return grouped.reset_index()
-            else:
-                return df.groupby('Primeira_Letra').size().reset_index(name='Quantidade')
+            chave = f"NULLIF(UPPER(LEFT({_sql_identificador(grupo['coluna'])}, 1)), '')"
+
+        agregacoes = []
+        for coluna in plano['agregadas']:
+            for estatistica in grupo['estatisticas']:
+                expressao = {
+                    'count': "COUNT({c})", 'mean': "AVG({c})", 'sum': "COALESCE(SUM({c}), 0)",
+                }[estatistica].format(c=_sql_identificador(coluna))
+                agregacoes.append(f"{expressao} AS {_sql_identificador(f'{coluna}_{estatistica}')}")
+        if not agregacoes:
+            agregacoes = ['COUNT(*) AS "Quantidade"']
+
+        sql = (
+            f"SELECT * FROM (SELECT {chave} AS _grupo, {', '.join(agregacoes)} FROM {origem} GROUP BY 1) "
+            "WHERE _grupo IS NOT NULL ORDER BY _grupo"
+        )
+
+    if plano['limite']:
+        sql += f" LIMIT {int(plano['limite'])}"
+
+    cursor = conexao_duckdb().cursor()
+    try:
+        if linhas is not None:
+            cursor.register('linhas_visiveis', pd.DataFrame({'_linha': linhas}))
+        resultado = cursor.execute(
+            f"WITH base AS ({base}) {sql}", parametros_base + parametros_consulta
+        ).fetchdf()
+    finally:
+        cursor.close()
+    return _finalizar_resultado(resultado, plano)
+
+def _executar_consulta_pandas(plano, df, df_base=None):
+    """
+    Executa o plano em pandas (sem DuckDB), com a mesma semântica do SQL
+
+    Os agrupamentos viram códigos inteiros por linha (faixas pré-calculadas do df_base,
+    quando disponível) e as agregações são reduções np.bincount sobre esses códigos
+    """
+    dados = _tipar_colunas_consulta(df, colunas_do_plano(plano))
+
+    mascara = pd.Series(True, index=dados.index)
+    for filtro in plano['filtros']:
+        valores = dados[filtro['coluna']]
+        dentro = valores.between(filtro['minimo'], filtro['maximo'])
+        if filtro['minimo'] <= 0 <= filtro['maximo']:
+            dentro |= valores.isna()
+        mascara &= dentro
+    base = dados[mascara]
+
+    grupo = plano['agrupamento']
+    if not grupo:
+        resultado = base
+        if plano['ordenacao']:
+            resultado = resultado.sort_values(
+                plano['ordenacao']['coluna'], ascending=plano['ordenacao']['crescente'],
+                na_position='last', kind='stable'
+            )
+        resultado = resultado[plano['colunas']]
+    else:
+        chaves = None
+        if grupo['tipo'] == 'faixas':
+            codigos = codigos_faixas(df, grupo['classificacao'], df_base)[mascara.to_numpy()]
+            n_grupos = len(grupo['rotulos'])
+        elif grupo['tipo'] == 'quartis':
+            valor = base[grupo['coluna']].fillna(0).to_numpy()
+            quartis = np.quantile(valor, [0.25, 0.5, 0.75]) if len(valor) else np.zeros(3)
+            codigos = np.searchsorted(quartis, valor, side='left')
+            n_grupos = 4
         else:
-            return df[selected_columns]
-    
-    elif group_option == "Por Quartis":
-        if len(selected_columns) > 1:
-            numeric_col = next((col for col in selected_columns if col != 'Municipio' and df[col].dtype in ['int64', 'float64']), None)
-            if numeric_col:
-                quartis = pd.qcut(pd.to_numeric(df[numeric_col], errors='coerce').fillna(0), 
-                                q=4, labels=['Q1 (25% menores)', 'Q2', 'Q3', 'Q4 (25% maiores)'])
-                df['Quartil'] = quartis
-                numeric_cols = [col for col in selected_columns if col != 'Municipio' and df[col].dtype in ['int64', 'float64']]
-                if numeric_cols:
-                    grouped = df.groupby('Quartil')[numeric_cols].agg(['count', 'mean']).round(2)
-                    grouped.columns = [f'{col}_{stat}' for col, stat in grouped.columns]
-                    return grouped.reset_index()
-                else:
-                    return df.groupby('Quartil').size().reset_index(name='Quantidade')
-        return df[selected_columns]
-    
-    return df[selected_columns]
+            letras = base[grupo['coluna']].str[0].str.upper().replace('', np.nan)
+            codigos, chaves = pd.factorize(letras, sort=True)
+            n_grupos = len(chaves)
+
+        # Só grupos com linhas aparecem no resultado (como no GROUP BY)
+        presentes = np.flatnonzero(contar_por_codigo(codigos, n_grupos))
+        resultado = {'_grupo': presentes if chaves is None else chaves[presentes]}
+        for coluna in plano['agregadas']:
+            reducoes = agregar_por_codigo(codigos, n_grupos, base[coluna].to_numpy(dtype=float, na_value=np.nan))
+            for estatistica in grupo['estatisticas']:
+                resultado[f'{coluna}_{estatistica}'] = reducoes[estatistica][presentes]
+        if not plano['agregadas']:
+            resultado['Quantidade'] = contar_por_codigo(codigos, n_grupos)[presentes]
+        resultado = pd.DataFrame(resultado)
+
+    if plano['limite']:
+        resultado = resultado.head(plano['limite'])
+    return _finalizar_resultado(resultado, plano)
+
+@st.cache_resource(show_spinner=False)
+def conexao_duckdb():
+    """Conexão DuckDB em memória do processo (cada consulta usa um cursor próprio)"""
+    import duckdb
+
+    return duckdb.connect()
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def dataset_colunar(_df, versao_dados):
+    """Grava o dataset tipado em Parquet (uma vez por versão dos dados) e retorna o caminho"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    identificador = hashlib.sha256(repr(versao_dados).encode()).hexdigest()[:20]
+    caminho = os.path.join(DIRETORIO_DADOS_COLUNARES, f"{identificador}.parquet")
+    if not os.path.exists(caminho):
+        os.makedirs(DIRETORIO_DADOS_COLUNARES, exist_ok=True)
+        dados = _tipar_colunas_consulta(_df, [coluna for coluna in CAMPOS_CONSULTA if coluna in _df.columns])
+        descritor, temporario = tempfile.mkstemp(dir=DIRETORIO_DADOS_COLUNARES, suffix='.tmp')
+        os.close(descritor)
+        try:
+            pq.write_table(
+                pa.Table.from_pandas(dados, preserve_index=False), temporario,
+                row_group_size=LINHAS_POR_GRUPO_PARQUET
+            )
+            os.replace(temporario, caminho)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+    return caminho
 
-def show_query_result(result_df, viz_type, selected_columns, available_cols):
-    """Exibe o resultado da consulta conforme tipo de visualização escolhido"""
+# Cache de resultados do construtor de consultas: LRU limitado, compartilhado pelo
+# processo e indexado pela impressão digital do plano + chave dos dados. Trocar só o
+# tipo de visualização reaproveita o resultado sem recalcular nada.
+LIMITE_CACHE_CONSULTAS = 32
+
+def impressao_digital_consulta(plano, chave_dados):
+    """Impressão digital canônica do plano de consulta + versão/filtros dos dados"""
+    canonico = dict(plano, filtros=sorted(plano['filtros'], key=lambda filtro: filtro['coluna']))
+    texto = json.dumps([canonico, repr(chave_dados)], sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+@st.cache_resource(show_spinner=False)
+def cache_consultas():
+    """Estado do cache LRU de resultados (um por processo)"""
+    import threading
+    from collections import OrderedDict
+
+    return {'itens': OrderedDict(), 'acertos': 0, 'falhas': 0, 'trava': threading.Lock()}
+
+def consultar_com_cache(plano, df, df_base=None, chave_dados=None):
+    """
+    Executa o plano usando o cache LRU de resultados; retorna (resultado, motor, impressão digital)
+
+    Sem chave_dados o resultado não é cacheado (motor informa a execução direta)
+    """
+    if chave_dados is None:
+        resultado, motor = executar_consulta(plano, df, df_base)
+        return resultado, motor, None
+
+    impressao = impressao_digital_consulta(plano, chave_dados)
+    cache = cache_consultas()
+    with cache['trava']:
+        if impressao in cache['itens']:
+            cache['itens'].move_to_end(impressao)
+            cache['acertos'] += 1
+            resultado, motor = cache['itens'][impressao]
+            return resultado.copy(), f"{motor}, do cache", impressao
+        cache['falhas'] += 1
+
+    resultado, motor = executar_consulta(plano, df, df_base)
+    with cache['trava']:
+        cache['itens'][impressao] = (resultado, motor)
+        cache['itens'].move_to_end(impressao)
+        while len(cache['itens']) > LIMITE_CACHE_CONSULTAS:
+            cache['itens'].popitem(last=False)
+    return resultado.copy(), motor, impressao
+
+def estatisticas_cache_consultas():
+    """Acertos, falhas, taxa de acerto e ocupação do cache de consultas"""
+    cache = cache_consultas()
+    with cache['trava']:
+        total = cache['acertos'] + cache['falhas']
+        return {
+            'acertos': cache['acertos'],
+            'falhas': cache['falhas'],
+            'taxa_acerto': cache['acertos'] / total if total else 0.0,
+            'itens': len(cache['itens']),
+            'limite': LIMITE_CACHE_CONSULTAS,
+        }
+
+def executar_consulta(plano, df, df_base=None):
+    """
+    Executa o plano de consulta sobre df e retorna (resultado, motor)
+
+    Com DuckDB instalado e df_base (dataset completo, do qual df é um subconjunto de linhas),
+    consulta o Parquet do dataset base; caso contrário executa em pandas sobre df
+    """
+    versao_dados = df_base.attrs.get('versao_dados') if df_base is not None else None
+    if DUCKDB_AVAILABLE and versao_dados and df_base.index.is_unique:
+        linhas = None
+        if len(df) != len(df_base):
+            linhas = df_base.index.get_indexer(df.index)
+        if linhas is None or (linhas >= 0).all():
+            caminho = dataset_colunar(df_base, versao_dados)
+            return _executar_consulta_duckdb(plano, caminho, linhas), 'DuckDB'
+    return _executar_consulta_pandas(plano, df, df_base), 'pandas'
+
+def show_query_result(result_df, viz_type, selected_columns, available_cols, chave_consulta=None):
+    """
+    Exibe o resultado da consulta conforme tipo de visualização escolhido
+
+    chave_consulta identifica o resultado (filtros + parâmetros da consulta) para as tabelas paginadas
+    """
+    import plotly.express as px
     
     st.markdown("### Resultado da Consulta")
     st.markdown(f"**{len(result_df)} registro(s) encontrado(s)**")
@@ -2756,25 +4043,27 @@ def show_query_result(result_df, viz_type, selected_columns, available_cols):
             if col in available_cols:
                 column_rename[col] = available_cols[col]
             elif '_' in col:
-                # Formatar colunas agregadas
-                parts = col.split('_')
-                if len(parts) >= 2:
-                    base_name = available_cols.get(parts[0], parts[0])
-                    stat_name = {'count': 'Quantidade', 'mean': 'Média', 'sum': 'Total'}.get(parts[1], parts[1])
-                    column_rename[col] = f"{base_name} ({stat_name})"
+                # Formatar colunas agregadas (<coluna>_<estatística>, ex.: Valor_Municipal_Area_mean)
+                base, stat = col.rsplit('_', 1)
+                stat_names = {'count': 'Quantidade', 'mean': 'Média', 'sum': 'Total'}
+                if stat not in stat_names:
+                    base, stat = col.split('_', 1)
+                base_name = available_cols.get(base, base)
+                stat_name = stat_names.get(stat, stat)
+                column_rename[col] = f"{base_name} ({stat_name})"
         
         if column_rename:
             display_df = display_df.rename(columns=column_rename)
         
-        st.dataframe(display_df, width='stretch')
+        exibir_tabela_paginada(display_df, chave_consulta, "qb_tabela")
         
-        # Opção de download
-        csv = display_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Baixar Resultado (CSV)",
-            data=csv,
-            file_name=f"consulta_personalizada_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
+        # Opção de download (gerada apenas no clique)
+        botao_exportacao(
+            display_df,
+            chave_consulta,
+            f"consulta_personalizada_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "qb_exportacao",
+            rotulo="Baixar Resultado"
         )
     
     elif viz_type == "Gráfico de Barras":
@@ -2832,7 +4121,7 @@ def show_query_result(result_df, viz_type, selected_columns, available_cols):
     elif viz_type == "Dados Geográficos":
         if 'Municipio' in result_df.columns:
             st.markdown("**Dados Geográficos por Município:**")
-            st.dataframe(result_df, width='stretch')
+            exibir_tabela_paginada(result_df, chave_consulta, "qb_geografico")
             
             if len(result_df) <= 10:
                 st.info("Dica: Com poucos municípios, você pode visualizar no mapa principal!")
@@ -2843,223 +4132,188 @@ def show_query_result(result_df, viz_type, selected_columns, available_cols):
 # GERAÇÃO DE RELATÓRIOS E EXPORTAÇÃO
 # =============================================================================
 
-def generate_custom_pdf_report(df, titulo="Relatório de Precificação Municipal", subtitulo="Análise Estratégica", 
-                              incluir_timestamp=True, incluir_capa=True, incluir_resumo_executivo=True,
-                              incluir_ranking=True, incluir_estatisticas=True, incluir_graficos=True,
-                              incluir_analise_qualidade=True, incluir_insights=True, incluir_recomendacoes=True,
-                              incluir_quadro_resumo=True, incluir_conclusoes=True, incluir_metodologia=False,
-                              incluir_rodape_premium=True, top_count=10, criterio_ranking="Valor Municipal",
-                              incluir_correlacao=True, incluir_distribuicao=True):
-    """Gera um relatório PDF PERSONALIZADO baseado nas configurações do usuário"""
-    
-    # Importar bibliotecas adicionais
-    import seaborn as sns
-    from datetime import datetime
-    import tempfile
-    import base64
-    from reportlab.lib.utils import ImageReader
-    from reportlab.platypus import Image
-    import numpy as np
-    
-    # Configurar matplotlib para português e estilo profissional
-    plt.style.use('seaborn-v0_8')
-    plt.rcParams['font.size'] = 10
-    plt.rcParams['axes.titlesize'] = 12
-    plt.rcParams['axes.labelsize'] = 10
-    plt.rcParams['xtick.labelsize'] = 9
-    plt.rcParams['ytick.labelsize'] = 9
-    plt.rcParams['legend.fontsize'] = 9
-    plt.rcParams['figure.titlesize'] = 14
-    
-    # Criar buffer para o PDF
-    buffer = io.BytesIO()
-    
-    # Configurar documento PDF com design premium e margens adequadas
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=60,
-        leftMargin=60,
-        topMargin=60,
-        bottomMargin=60
-    )
-    
-    # Estilos premium
+# -----------------------------------------------------------------------------
+# Motor de relatórios PDF
+# -----------------------------------------------------------------------------
+# Cada seção do relatório é uma função registrada com @registrar_secao. Ela
+# recebe o contexto compartilhado (opções, estilos, séries numéricas e
+# estatísticas já calculadas) e retorna a lista de elementos da seção.
+# Seções não selecionadas não são executadas.
+
+SECOES_RELATORIO = {}
+
+# Opções padrão do relatório (o relatório completo usa exatamente estas)
+OPCOES_RELATORIO_PADRAO = {
+    'titulo': "Relatório Executivo Premium",
+    'subtitulo': "ANÁLISE DE PRECIFICAÇÃO MUNICIPAL",
+    'incluir_timestamp': True,
+    'top_count': 10,
+    'criterio_ranking': "Valor Municipal",
+    'incluir_distribuicao': True,
+    'incluir_correlacao': True,
+}
+
+# Opções do gerador de PDF personalizado (interface) → seções do relatório
+SECOES_POR_OPCAO_RELATORIO = {
+    'Capa': ['capa'],
+    'Resumo': ['resumo_executivo'],
+    'Ranking': ['ranking'],
+    'Gráficos': ['graficos'],
+    'Insights': ['insights'],
+    'Recomendações': ['conclusoes'],
+    'Estatísticas': ['analise_qualidade', 'quadro_resumo'],
+    'Metodologia': ['metodologia'],
+}
+
+# Estilo dos gráficos matplotlib do PDF (aplicado apenas durante a renderização)
+ESTILO_GRAFICOS_RELATORIO = ['seaborn-v0_8', {
+    'font.size': 10,
+    'axes.titlesize': 12,
+    'axes.labelsize': 10,
+    'xtick.labelsize': 9,
+    'ytick.labelsize': 9,
+    'legend.fontsize': 9,
+    'figure.titlesize': 14,
+}]
+
+
+def registrar_secao(chave, titulo):
+    """Registra uma função de renderização como seção do relatório PDF"""
+    def decorador(funcao):
+        SECOES_RELATORIO[chave] = {'titulo': titulo, 'renderizar': funcao}
+        return funcao
+    return decorador
+
+
+def rotulo_etapa_relatorio(chave):
+    """Nome legível de uma etapa de geração (seção registrada, contexto ou montagem)"""
+    if chave in SECOES_RELATORIO:
+        return SECOES_RELATORIO[chave]['titulo']
+    return {'contexto': "Preparação dos dados", 'montagem_pdf': "Montagem do PDF"}.get(chave, chave)
+
+
+def criar_estilos_relatorio():
+    """Cria os estilos de parágrafo usados pelas seções do relatório"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
     styles = getSampleStyleSheet()
-    
-    # Estilo do título principal
-    title_style = ParagraphStyle(
-        'PremiumTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=1,  # centralizado
-        textColor=colors.HexColor('#1a365d'),
-        fontName='Helvetica-Bold'
-    )
-    
-    # Estilo do subtítulo
-    subtitle_style = ParagraphStyle(
-        'PremiumSubtitle', 
-        parent=styles['Normal'],
-        fontSize=16,
-        spaceAfter=20,
-        alignment=1,
-        textColor=colors.HexColor('#2d3748'),
-        fontName='Helvetica'
-    )
-    
-    # Estilo de seções (simplificado)
-    section_style = ParagraphStyle(
-        'PremiumSection',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceAfter=15,
-        spaceBefore=25,
-        textColor=colors.HexColor('#2b6cb0'),
-        fontName='Helvetica-Bold',
-        leftIndent=0
-    )
-    
-    # Estilo para destaques
-    highlight_style = ParagraphStyle(
-        'Highlight',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#2d3748'),
-        fontName='Helvetica-Bold',
-        leftIndent=10,
-        spaceAfter=10,
-        spaceBefore=8
-    )
-    
-    # Estilo para insights (simplificado para evitar sobreposições)
-    insight_style = ParagraphStyle(
-        'Insight',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#4a5568'),
-        fontName='Helvetica',
-        leftIndent=20,
-        spaceAfter=8,
-        spaceBefore=4
-    )
-    
-    # Conteúdo do PDF
-    story = []
-    
-    # === CAPA PREMIUM (se selecionada) ===
-    if incluir_capa:
-        story.append(Spacer(1, 30))
-        
-        # Criar box de título premium
-        title_box_data = [
-            [f"🏛️ {titulo.upper()}"],
-            [subtitulo],
-            ["Estado de Alagoas - 2024/2025"]
-        ]
-        
-        title_box_table = Table(title_box_data, colWidths=[6*inch])
-        title_box_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#1a365d')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (0, 0), 20),
-            ('FONTNAME', (0, 1), (0, 1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 1), (0, 1), 16),
-            ('FONTNAME', (0, 2), (0, 2), 'Helvetica'),
-            ('FONTSIZE', (0, 2), (0, 2), 12),
-            ('TOPPADDING', (0, 0), (-1, -1), 15),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-            ('LEFTPADDING', (0, 0), (-1, -1), 20),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 20),
-            ('GRID', (0, 0), (-1, -1), 2, colors.HexColor('#2d3748'))
-        ]))
-        
-        story.append(title_box_table)
-        story.append(Spacer(1, 30))
-        
-        # Box de informações da capa
-        if incluir_timestamp:
-            data_atual = datetime.now().strftime("%d de %B de %Y às %H:%M")
-        else:
-            data_atual = datetime.now().strftime("%B de %Y")
-            
-        info_data = [
-            ['📅 Data do Relatório:', data_atual],
-            ['📊 Municípios Analisados:', f"{len(df)} municípios"],
-            ['🎯 Tipo de Análise:', 'Precificação por Área Municipal'],
-            ['💼 Gerado por:', 'Dashboard de Precificação - IA'],
-        ]
-        
-        info_table = Table(info_data, colWidths=[2.5*inch, 3*inch])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8f9fa')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#2d3748')),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-            ('LEFTPADDING', (0, 0), (-1, -1), 12),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8)
-        ]))
-        
-        story.append(info_table)
-        story.append(PageBreak())
-    
-    # Usar a mesma lógica do PDF original mas com condicionais para cada seção
-    # Adicionar todas as outras seções condicionalmente...
-    
-    # === RESUMO EXECUTIVO (se selecionado) ===
-    if incluir_resumo_executivo:
-        story.append(Paragraph("📊 RESUMO EXECUTIVO", section_style))
-        # ... resto da lógica do resumo executivo
-    
-    # === RANKING (se selecionado) ===
-    if incluir_ranking:
-        story.append(Paragraph(f"🏆 RANKING DOS TOP {top_count} MUNICÍPIOS", section_style))
-        # ... resto da lógica do ranking
-    
-    # Continuar para todas as outras seções...
-    
-    # Construir PDF
-    doc.build(story)
-    
-    # Retornar o buffer
-    buffer.seek(0)
-    return buffer
 
-def generate_pdf_report(df):
-    """Gera um relatório PREMIUM em PDF com design profissional, gráficos e análises avançadas"""
-    
-    # Importar bibliotecas adicionais
-    import seaborn as sns
-    import tempfile
-    import base64
-    from reportlab.lib.utils import ImageReader
-    from reportlab.platypus import Image
-    import numpy as np
-    
-    # Configurar matplotlib para português e estilo profissional
-    plt.style.use('seaborn-v0_8')
-    plt.rcParams['font.size'] = 10
-    plt.rcParams['axes.titlesize'] = 12
-    plt.rcParams['axes.labelsize'] = 10
-    plt.rcParams['xtick.labelsize'] = 9
-    plt.rcParams['ytick.labelsize'] = 9
-    plt.rcParams['legend.fontsize'] = 9
-    plt.rcParams['figure.titlesize'] = 14
-    
-    # Criar buffer para o PDF
-    buffer = io.BytesIO()
-    
+    return {
+        'base': styles,
+        # Estilo de seções (simplificado)
+        'secao': ParagraphStyle(
+            'PremiumSection',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=15,
+            spaceBefore=25,
+            textColor=colors.HexColor('#2b6cb0'),
+            fontName='Helvetica-Bold',
+            leftIndent=0
+        ),
+        # Estilo para destaques
+        'destaque': ParagraphStyle(
+            'Highlight',
+            parent=styles['Normal'],
+            fontSize=12,
+            textColor=colors.HexColor('#2d3748'),
+            fontName='Helvetica-Bold',
+            leftIndent=10,
+            spaceAfter=10,
+            spaceBefore=8
+        ),
+        # Estilo para insights (simplificado para evitar sobreposições)
+        'insight': ParagraphStyle(
+            'Insight',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=colors.HexColor('#4a5568'),
+            fontName='Helvetica',
+            leftIndent=20,
+            spaceAfter=8,
+            spaceBefore=4
+        ),
+        'confidencial': ParagraphStyle(
+            'Confidencial',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=colors.HexColor('#718096'),
+            fontName='Helvetica-Oblique',
+            alignment=1,  # Centralizado
+            spaceAfter=10
+        ),
+    }
+
+
+def preparar_contexto_relatorio(df, opcoes, estatisticas=None, df_base=None):
+    """
+    Reúne o que as seções do relatório compartilham: opções, estilos e o pacote
+    de estatísticas (calculado aqui apenas se não for recebido pronto)
+    """
+    if estatisticas is None:
+        estatisticas = calcular_estatisticas_df(df)
+    series = estatisticas['series']
+
+    contexto = {
+        'df': df,
+        'df_base': df_base,
+        'opcoes': opcoes,
+        'estilos': criar_estilos_relatorio(),
+        'municipios': df['Municipio'] if 'Municipio' in df.columns else None,
+        'valores': series['valor'].fillna(0) if 'valor' in series else None,
+        'populacao': series['populacao'].fillna(0) if 'populacao' in series else None,
+        'estatisticas_valor': estatisticas['valor'],
+        'estatisticas_populacao': estatisticas['populacao'],
+        'valor_per_capita_medio': estatisticas['valor_per_capita_medio'],
+        'correlacao': estatisticas['correlacao_pop_valor'],
+    }
+
+    if contexto['valores'] is not None and contexto['populacao'] is not None:
+        contexto['pares_pop_valor'] = (contexto['populacao'] > 0) & (contexto['valores'] > 0)
+
+    return contexto
+
+
+def gerar_relatorio_pdf(df, secoes=None, estatisticas=None, df_base=None, **opcoes):
+    """
+    Monta o relatório PDF com as seções registradas em SECOES_RELATORIO
+
+    secoes: chaves das seções a incluir (padrão: todas); a ordem do documento é a do registro
+    estatisticas: pacote de calcular_estatisticas já calculado para este df (opcional)
+    df_base: dataset completo do qual df é um subconjunto (rankings pelo índice pré-calculado)
+    opcoes: sobrescrevem OPCOES_RELATORIO_PADRAO (título, subtítulo, ranking...)
+
+    Retorna (buffer, tempos), onde tempos é {seção: segundos}, incluindo o
+    preparo do contexto e a montagem final do PDF
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate
+
+    if secoes is None:
+        secoes = list(SECOES_RELATORIO)
+    desconhecidas = [chave for chave in secoes if chave not in SECOES_RELATORIO]
+    if desconhecidas:
+        raise ValueError(f"Seções de relatório desconhecidas: {', '.join(desconhecidas)}")
+    secoes = [chave for chave in SECOES_RELATORIO if chave in secoes]
+    if not secoes:
+        raise ValueError("Nenhuma seção selecionada para o relatório")
+
+    opcoes = {**OPCOES_RELATORIO_PADRAO, **opcoes}
+    tempos = {}
+
+    inicio = time.perf_counter()
+    contexto = preparar_contexto_relatorio(df, opcoes, estatisticas, df_base)
+    tempos['contexto'] = time.perf_counter() - inicio
+
+    story = []
+    for chave in secoes:
+        inicio = time.perf_counter()
+        story.extend(SECOES_RELATORIO[chave]['renderizar'](contexto))
+        tempos[chave] = time.perf_counter() - inicio
+
     # Configurar documento PDF com design premium e margens adequadas
+    buffer = io.BytesIO()
     doc = SimpleDocTemplate(
         buffer,
         pagesize=A4,
@@ -3068,81 +4322,170 @@ def generate_pdf_report(df):
         topMargin=60,
         bottomMargin=60
     )
-    
-    # Estilos premium
-    styles = getSampleStyleSheet()
-    
-    # Estilo do título principal
-    title_style = ParagraphStyle(
-        'PremiumTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=1,  # centralizado
-        textColor=colors.HexColor('#1a365d'),
-        fontName='Helvetica-Bold'
-    )
-    
-    # Estilo do subtítulo
-    subtitle_style = ParagraphStyle(
-        'PremiumSubtitle', 
-        parent=styles['Normal'],
-        fontSize=16,
-        spaceAfter=20,
-        alignment=1,
-        textColor=colors.HexColor('#2d3748'),
-        fontName='Helvetica'
-    )
-    
-    # Estilo de seções (simplificado)
-    section_style = ParagraphStyle(
-        'PremiumSection',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceAfter=15,
-        spaceBefore=25,
-        textColor=colors.HexColor('#2b6cb0'),
-        fontName='Helvetica-Bold',
-        leftIndent=0
-    )
-    
-    # Estilo para destaques
-    highlight_style = ParagraphStyle(
-        'Highlight',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#2d3748'),
-        fontName='Helvetica-Bold',
-        leftIndent=10,
-        spaceAfter=10,
-        spaceBefore=8
-    )
-    
-    # Estilo para insights (simplificado para evitar sobreposições)
-    insight_style = ParagraphStyle(
-        'Insight',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#4a5568'),
-        fontName='Helvetica',
-        leftIndent=20,
-        spaceAfter=8,
-        spaceBefore=4
-    )
-    
-    # Conteúdo do PDF
-    story = []
-    
-    # === CAPA PREMIUM ===
-    story.append(Spacer(1, 30))
-    
+
+    inicio = time.perf_counter()
+    doc.build(story)
+    tempos['montagem_pdf'] = time.perf_counter() - inicio
+
+    buffer.seek(0)
+    return buffer, tempos
+
+
+# --- Gráficos do relatório (PNG cacheado pelos dados de cada gráfico) ---
+
+def _importar_pyplot():
+    """Importa o matplotlib com backend não-interativo (só quando um gráfico do PDF é gerado)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def _renderizar_grafico_png(desenhar, largura, altura):
+    """Desenha um gráfico matplotlib com o estilo do relatório e retorna os bytes PNG"""
+    plt = _importar_pyplot()
+
+    try:
+        with plt.style.context(ESTILO_GRAFICOS_RELATORIO):
+            fig, ax = plt.subplots(figsize=(largura, altura))
+            try:
+                desenhar(ax)
+                fig.tight_layout()
+
+                img_buffer = io.BytesIO()
+                fig.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight',
+                            facecolor='white', edgecolor='none')
+            finally:
+                plt.close(fig)
+        return img_buffer.getvalue()
+    except Exception as e:
+        print(f"Erro ao criar gráfico: {e}")
+        return None
+
+
+def _imagem_grafico(png, largura, altura):
+    """Converte os bytes PNG de um gráfico em imagem para o PDF"""
+    from reportlab.platypus import Image
+    from reportlab.lib.units import inch
+
+    if png is None:
+        return None
+    return Image(io.BytesIO(png), width=largura*inch, height=altura*inch)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def grafico_top_valores_png(nomes, valores):
+    """Gráfico de barras dos municípios de maior valor municipal"""
+    plt = _importar_pyplot()
+
+    def desenhar(ax):
+        n_barras = len(valores)  # Pode ser menor que 10 em relatórios por município
+
+        colors_gradient = plt.cm.Blues(np.linspace(0.4, 0.9, n_barras))
+        bars = ax.barh(range(n_barras), valores, color=colors_gradient)
+
+        ax.set_yticks(range(n_barras))
+        ax.set_yticklabels([nome[:15] + '...' if len(nome) > 15 else nome
+                            for nome in nomes], fontsize=9)
+        ax.set_xlabel('Valor Municipal (R$)', fontsize=10)
+        ax.set_title('🏆 TOP 10 MUNICÍPIOS POR VALOR MUNICIPAL', fontsize=12, fontweight='bold', pad=20)
+
+        # Adicionar valores nas barras
+        for bar, valor in zip(bars, valores):
+            ax.text(bar.get_width() + max(valores) * 0.01,
+                    bar.get_y() + bar.get_height()/2,
+                    formatar_valor_grande(valor),
+                    va='center', fontsize=8, fontweight='bold')
+
+        ax.grid(axis='x', alpha=0.3)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+    return _renderizar_grafico_png(desenhar, 7, 5)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def grafico_distribuicao_populacao_png(pop_valida):
+    """Histograma da população dos municípios com a linha da média"""
+    plt = _importar_pyplot()
+
+    def desenhar(ax):
+        # Criar histograma
+        n, bins, patches = ax.hist(pop_valida, bins=15, color='lightblue',
+                                   edgecolor='navy', alpha=0.7)
+
+        # Colorir barras com gradiente
+        cm = plt.cm.viridis
+        for patch, value in zip(patches, n):
+            patch.set_facecolor(cm(value / max(n)))
+
+        ax.set_xlabel('População', fontsize=10)
+        ax.set_ylabel('Número de Municípios', fontsize=10)
+        ax.set_title('📊 DISTRIBUIÇÃO POPULACIONAL DOS MUNICÍPIOS',
+                     fontsize=12, fontweight='bold', pad=20)
+
+        # Adicionar linha da média
+        media_pop = pop_valida.mean()
+        ax.axvline(media_pop, color='red', linestyle='--', linewidth=2,
+                   label=f'Média: {formatar_numero_grande(media_pop)}')
+        ax.legend()
+
+        ax.grid(axis='y', alpha=0.3)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+    return _renderizar_grafico_png(desenhar, 7, 4)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def grafico_correlacao_png(populacao, valores, nomes, correlacao):
+    """Dispersão população x valor com linha de tendência e destaque do top 3"""
+    def desenhar(ax):
+        ax.scatter(populacao, valores, alpha=0.6, s=60, c=range(len(populacao)),
+                   cmap='viridis', edgecolors='black', linewidth=0.5)
+
+        # Linha de tendência
+        z = np.polyfit(populacao, valores, 1)
+        p = np.poly1d(z)
+        ax.plot(populacao, p(populacao), "r--", alpha=0.8, linewidth=2)
+
+        ax.set_title(f'💹 CORRELAÇÃO POPULAÇÃO × VALOR MUNICIPAL\n(R = {correlacao:.3f})',
+                     fontsize=12, fontweight='bold', pad=20)
+        ax.set_xlabel('População', fontsize=10)
+        ax.set_ylabel('Valor Municipal (R$)', fontsize=10)
+
+        # Destacar top 3 municípios
+        for i in pd.Series(valores).nlargest(3).index:
+            ax.annotate(nomes[i][:10],
+                        (populacao[i], valores[i]),
+                        xytext=(5, 5), textcoords='offset points',
+                        fontsize=8, fontweight='bold',
+                        bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.7))
+
+        ax.grid(True, alpha=0.3)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+    return _renderizar_grafico_png(desenhar, 7, 5)
+
+
+# --- Seções do relatório (na ordem do documento) ---
+
+@registrar_secao('capa', "Capa")
+def secao_capa(contexto):
+    from reportlab.lib import colors
+    from reportlab.platypus import Spacer, Table, TableStyle, PageBreak
+    from reportlab.lib.units import inch
+
+    opcoes = contexto['opcoes']
+    elementos = [Spacer(1, 30)]
+
     # Criar box de título premium
     title_box_data = [
-        ["🏛️ RELATÓRIO EXECUTIVO PREMIUM"],
-        ["ANÁLISE DE PRECIFICAÇÃO MUNICIPAL"],
+        [f"🏛️ {opcoes['titulo'].upper()}"],
+        [opcoes['subtitulo']],
         ["Estado de Alagoas - 2024/2025"]
     ]
-    
+
     title_box_table = Table(title_box_data, colWidths=[6*inch])
     title_box_table.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#1a365d')),
@@ -3161,19 +4504,23 @@ def generate_pdf_report(df):
         ('RIGHTPADDING', (0, 0), (-1, -1), 20),
         ('GRID', (0, 0), (-1, -1), 2, colors.HexColor('#2d3748'))
     ]))
-    
-    story.append(title_box_table)
-    story.append(Spacer(1, 30))
-    
+
+    elementos.append(title_box_table)
+    elementos.append(Spacer(1, 30))
+
     # Box de informações da capa
-    data_atual = datetime.now().strftime("%d de %B de %Y às %H:%M")
+    if opcoes['incluir_timestamp']:
+        data_atual = datetime.now().strftime("%d de %B de %Y às %H:%M")
+    else:
+        data_atual = datetime.now().strftime("%B de %Y")
+
     info_data = [
         ['📅 Data do Relatório:', data_atual],
-        ['📊 Municípios Analisados:', f"{len(df)} municípios"],
+        ['📊 Municípios Analisados:', f"{len(contexto['df'])} municípios"],
         ['🎯 Tipo de Análise:', 'Precificação por Área Municipal'],
         ['💼 Gerado por:', 'Dashboard de Precificação - IA'],
     ]
-    
+
     info_table = Table(info_data, colWidths=[2.5*inch, 3*inch])
     info_table.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8f9fa')),
@@ -3189,208 +4536,179 @@ def generate_pdf_report(df):
         ('TOPPADDING', (0, 0), (-1, -1), 8),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 8)
     ]))
-    
-    story.append(info_table)
-    story.append(PageBreak())
-    
-    # === RESUMO EXECUTIVO ===
-    story.append(Paragraph("� RESUMO EXECUTIVO", section_style))
-    
-    if not df.empty:
-        # Calcular métricas principais
-        total_municipios = len(df)
-        
-        # Análise de valores
-        if 'Valor_Municipal_Area' in df.columns:
-            valores_clean = pd.to_numeric(df['Valor_Municipal_Area'], errors='coerce').fillna(0)
-            valores_validos = valores_clean[valores_clean > 0]
-            
-            if len(valores_validos) > 0:
-                valor_total = valores_validos.sum()
-                valor_medio = valores_validos.mean()
-                valor_mediano = valores_validos.median()
-                valor_max = valores_validos.max()
-                valor_min = valores_validos.min()
-                
-                # Encontrar município com maior e menor valor
-                idx_max = valores_clean.idxmax()
-                idx_min = valores_clean[valores_clean > 0].idxmin()
-                municipio_max = df.loc[idx_max, 'Municipio'] if 'Municipio' in df.columns else 'N/A'
-                municipio_min = df.loc[idx_min, 'Municipio'] if 'Municipio' in df.columns else 'N/A'
-                
-                story.append(Paragraph("💰 ANÁLISE FINANCEIRA", highlight_style))
-                story.append(Spacer(1, 5))
-                
-                # Criar tabela para análise financeira ao invés de parágrafos sobrepostos
-                financeira_data = [
-                    ['📊 MÉTRICA', '💰 VALOR'],
-                    ['Valor total do mercado', formatar_valor_grande(valor_total)],
-                    ['Valor médio por município', formatar_valor_grande(valor_medio)],
-                    ['Valor mediano', formatar_valor_grande(valor_mediano)],
-                    ['Maior valor', f"{formatar_valor_grande(valor_max)} ({municipio_max})"],
-                    ['Menor valor', f"{formatar_valor_grande(valor_min)} ({municipio_min})"]
-                ]
-                
-                # Análise de distribuição
-                q1 = valores_validos.quantile(0.25)
-                q3 = valores_validos.quantile(0.75)
-                financeira_data.extend([
-                    ['25% dos municípios valem até', formatar_valor_grande(q1)],
-                    ['75% dos municípios valem até', formatar_valor_grande(q3)]
-                ])
-                
-                financeira_table = Table(financeira_data, colWidths=[3*inch, 2.5*inch])
-                financeira_table.setStyle(TableStyle([
-                    # Cabeçalho
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2b6cb0')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    
-                    # Dados
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f7fafc')),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 9),
-                    ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-                    ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-                    
-                    # Bordas e espaçamento
-                    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 6),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
-                ]))
-                
-                story.append(financeira_table)
-                story.append(Spacer(1, 15))
-        
-        # Análise populacional
-        if 'Populacao' in df.columns:
-            pop_clean = pd.to_numeric(df['Populacao'], errors='coerce').fillna(0)
-            pop_valida = pop_clean[pop_clean > 0]
-            
-            if len(pop_valida) > 0:
-                pop_total = pop_valida.sum()
-                pop_media = pop_valida.mean()
-                pop_max = pop_valida.max()
-                
-                # Encontrar município mais populoso
-                idx_pop_max = pop_clean.idxmax()
-                municipio_pop_max = df.loc[idx_pop_max, 'Municipio'] if 'Municipio' in df.columns else 'N/A'
-                
-                story.append(Paragraph("👥 ANÁLISE DEMOGRÁFICA", highlight_style))
-                story.append(Spacer(1, 5))
-                
-                # Criar tabela para análise demográfica
-                demografica_data = [
-                    ['📊 MÉTRICA', '👥 VALOR'],
-                    ['População total', f"{formatar_numero_grande(pop_total)} habitantes"],
-                    ['População média', f"{formatar_numero_grande(pop_media)} habitantes"],
-                    ['Maior população', f"{formatar_numero_grande(pop_max)} ({municipio_pop_max})"]
-                ]
-                
-                # Análise de densidade populacional (se possível)
-                if 'Valor_Municipal_Area' in df.columns:
-                    # Calcular valor per capita médio
-                    df_temp = df.copy()
-                    df_temp['Pop_Clean'] = pop_clean
-                    df_temp['Val_Clean'] = valores_clean
-                    df_temp = df_temp[(df_temp['Pop_Clean'] > 0) & (df_temp['Val_Clean'] > 0)]
-                    if not df_temp.empty:
-                        df_temp['Valor_Per_Capita'] = df_temp['Val_Clean'] / df_temp['Pop_Clean']
-                        valor_per_capita_medio = df_temp['Valor_Per_Capita'].mean()
-                        demografica_data.append(['Valor médio per capita', formatar_valor_grande(valor_per_capita_medio)])
-                
-                demografica_table = Table(demografica_data, colWidths=[3*inch, 2.5*inch])
-                demografica_table.setStyle(TableStyle([
-                    # Cabeçalho
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#38a169')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    
-                    # Dados
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f0fff4')),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 9),
-                    ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-                    ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-                    
-                    # Bordas e espaçamento
-                    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#c6f6d5')),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 6),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
-                ]))
-                
-                story.append(demografica_table)
-    
-    story.append(Spacer(1, 30))
-    
-    # === TOP 10 RANKING ===
-    story.append(Paragraph("🏆 RANKING DOS TOP 10 MUNICÍPIOS", section_style))
-    story.append(Spacer(1, 10))
-    
-    if 'Valor_Municipal_Area' in df.columns and 'Municipio' in df.columns:
-        # Preparar dados para tabela premium
-        df_ranking = df[['Municipio', 'Valor_Municipal_Area']].copy()
-        
-        # Adicionar população se disponível
-        if 'Populacao' in df.columns:
-            df_ranking['Populacao'] = df['Populacao']
-        
-        df_ranking['Valor_Clean'] = pd.to_numeric(df_ranking['Valor_Municipal_Area'], errors='coerce').fillna(0)
-        df_ranking = df_ranking[df_ranking['Valor_Clean'] > 0].sort_values('Valor_Clean', ascending=False).head(10)
-        
-        # Criar tabela premium
-        if 'Populacao' in df_ranking.columns:
+
+    elementos.append(info_table)
+    elementos.append(PageBreak())
+    return elementos
+
+
+@registrar_secao('resumo_executivo', "Resumo Executivo")
+def secao_resumo_executivo(contexto):
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.units import inch
+
+    estilos = contexto['estilos']
+    elementos = [Paragraph("📊 RESUMO EXECUTIVO", estilos['secao'])]
+
+    est_valor = contexto['estatisticas_valor']
+    if est_valor:
+        elementos.append(Paragraph("💰 ANÁLISE FINANCEIRA", estilos['destaque']))
+        elementos.append(Spacer(1, 5))
+
+        # Tabela para análise financeira ao invés de parágrafos sobrepostos
+        financeira_data = [
+            ['📊 MÉTRICA', '💰 VALOR'],
+            ['Valor total do mercado', formatar_valor_grande(est_valor['total'])],
+            ['Valor médio por município', formatar_valor_grande(est_valor['medio'])],
+            ['Valor mediano', formatar_valor_grande(est_valor['mediano'])],
+            ['Maior valor', f"{formatar_valor_grande(est_valor['maximo'])} ({est_valor['municipio_max']})"],
+            ['Menor valor', f"{formatar_valor_grande(est_valor['minimo'])} ({est_valor['municipio_min']})"],
+            # Análise de distribuição
+            ['25% dos municípios valem até', formatar_valor_grande(est_valor['q1'])],
+            ['75% dos municípios valem até', formatar_valor_grande(est_valor['q3'])]
+        ]
+
+        financeira_table = Table(financeira_data, colWidths=[3*inch, 2.5*inch])
+        financeira_table.setStyle(TableStyle([
+            # Cabeçalho
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2b6cb0')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+
+            # Dados
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f7fafc')),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+
+            # Bordas e espaçamento
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
+        ]))
+
+        elementos.append(financeira_table)
+        elementos.append(Spacer(1, 15))
+
+    est_pop = contexto['estatisticas_populacao']
+    if est_pop:
+        elementos.append(Paragraph("👥 ANÁLISE DEMOGRÁFICA", estilos['destaque']))
+        elementos.append(Spacer(1, 5))
+
+        demografica_data = [
+            ['📊 MÉTRICA', '👥 VALOR'],
+            ['População total', f"{formatar_numero_grande(est_pop['total'])} habitantes"],
+            ['População média', f"{formatar_numero_grande(est_pop['media'])} habitantes"],
+            ['Maior população', f"{formatar_numero_grande(est_pop['maximo'])} ({est_pop['municipio_max']})"]
+        ]
+        if contexto['valor_per_capita_medio'] is not None:
+            demografica_data.append(['Valor médio per capita', formatar_valor_grande(contexto['valor_per_capita_medio'])])
+
+        demografica_table = Table(demografica_data, colWidths=[3*inch, 2.5*inch])
+        demografica_table.setStyle(TableStyle([
+            # Cabeçalho
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#38a169')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+
+            # Dados
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f0fff4')),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+
+            # Bordas e espaçamento
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#c6f6d5')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
+        ]))
+
+        elementos.append(demografica_table)
+
+    elementos.append(Spacer(1, 30))
+    return elementos
+
+
+@registrar_secao('ranking', "Ranking")
+def secao_ranking(contexto):
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle, PageBreak
+    from reportlab.lib.units import inch
+
+    opcoes = contexto['opcoes']
+    top_count = opcoes['top_count']
+    elementos = [
+        Paragraph(f"🏆 RANKING DOS TOP {top_count} MUNICÍPIOS", contexto['estilos']['secao']),
+        Spacer(1, 10),
+    ]
+
+    valores, populacao = contexto['valores'], contexto['populacao']
+    if valores is not None and contexto['municipios'] is not None:
+        ranking = pd.DataFrame({'Municipio': contexto['municipios'], 'Valor': valores})
+        tem_populacao = populacao is not None
+        if tem_populacao:
+            ranking['Populacao'] = populacao
+            ranking['Per_Capita'] = valores / populacao.where(populacao > 0)
+
+        # Critério escolhido na interface (População e per capita exigem a coluna de população)
+        criterio = {'População': 'populacao', 'Valor per Capita': 'per_capita'}.get(
+            opcoes['criterio_ranking'], 'valor'
+        )
+        if not tem_populacao:
+            criterio = 'valor'
+        rotulos = ranking_top_k(contexto['df'], criterio, top_count, df_base=contexto['df_base'], exigir=('valor',))
+        ranking = ranking.loc[rotulos]
+
+        if tem_populacao:
             ranking_data = [['🥇', 'Município', 'Valor da Área', 'População', 'Valor per Capita']]
         else:
             ranking_data = [['🥇', 'Município', 'Valor da Área']]
-        
+
         medals = ['🥇', '🥈', '🥉'] + ['🏅'] * 7
-        
-        for i, (_, row) in enumerate(df_ranking.iterrows()):
+
+        for i, linha in enumerate(ranking.itertuples(index=False)):
             medal = medals[i] if i < len(medals) else f"{i+1}º"
-            
-            if 'Populacao' in df_ranking.columns:
-                pop_clean = pd.to_numeric(row['Populacao'], errors='coerce')
-                if pd.notna(pop_clean) and pop_clean > 0:
-                    per_capita = row['Valor_Clean'] / pop_clean
-                    ranking_data.append([
-                        medal,
-                        row['Municipio'],
-                        formatar_valor_grande(row['Valor_Municipal_Area']),
-                        formatar_numero_grande(pop_clean),
-                        formatar_valor_grande(per_capita)
-                    ])
+            dados_linha = [medal, linha.Municipio, formatar_valor_grande(linha.Valor)]
+
+            if tem_populacao:
+                if linha.Populacao > 0:
+                    dados_linha += [formatar_numero_grande(linha.Populacao), formatar_valor_grande(linha.Per_Capita)]
                 else:
-                    ranking_data.append([
-                        medal,
-                        row['Municipio'],
-                        formatar_valor_grande(row['Valor_Municipal_Area']),
-                        'N/A',
-                        'N/A'
-                    ])
-            else:
-                ranking_data.append([
-                    medal,
-                    row['Municipio'],
-                    formatar_valor_grande(row['Valor_Municipal_Area'])
-                ])
-        
+                    dados_linha += ['N/A', 'N/A']
+
+            ranking_data.append(dados_linha)
+
         # Definir larguras das colunas
-        if 'Populacao' in df_ranking.columns:
+        if tem_populacao:
             col_widths = [0.6*inch, 2.2*inch, 1.4*inch, 1*inch, 1.2*inch]
         else:
             col_widths = [0.8*inch, 3*inch, 2*inch]
-        
+
+        # Estilo para as primeiras 3 posições (apenas as linhas existentes,
+        # relatórios de um único município têm menos de 3 linhas)
+        cores_podio = ['#ffd700', '#c0c0c0', '#cd7f32']  # Ouro, Prata, Bronze
+        estilo_podio = [
+            ('BACKGROUND', (0, linha), (-1, linha), colors.HexColor(cor))
+            for linha, cor in enumerate(cores_podio[:len(ranking_data) - 1], start=1)
+        ]
+        if len(ranking_data) > 4:
+            estilo_podio.append(
+                ('ALTERNATEROWBACKGROUND', (0, 4), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')])
+            )
+
         ranking_table = Table(ranking_data, colWidths=col_widths)
         ranking_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a365d')),
@@ -3400,14 +4718,10 @@ def generate_pdf_report(df):
             ('FONTSIZE', (0, 0), (-1, 0), 11),
             ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
             ('TOPPADDING', (0, 0), (-1, 0), 12),
-            
-            # Estilo para as primeiras 3 posições
-            ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#ffd700')),  # Ouro
-            ('BACKGROUND', (0, 2), (-1, 2), colors.HexColor('#c0c0c0')),  # Prata  
-            ('BACKGROUND', (0, 3), (-1, 3), colors.HexColor('#cd7f32')),  # Bronze
-            
+
+            *estilo_podio,
+
             # Estilo geral
-            ('ALTERNATEROWBACKGROUND', (0, 4), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
             ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
             ('FONTSIZE', (0, 1), (-1, -1), 9),
             ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
@@ -3417,168 +4731,78 @@ def generate_pdf_report(df):
             ('TOPPADDING', (0, 1), (-1, -1), 8),
             ('BOTTOMPADDING', (0, 1), (-1, -1), 8)
         ]))
-        
-        story.append(ranking_table)
-        story.append(Spacer(1, 20))
-    
-    story.append(PageBreak())
-    
-    # === GRÁFICOS E VISUALIZAÇÕES ===
-    story.append(Paragraph("📊 ANÁLISES VISUAIS", section_style))
-    
-    # Função para criar gráfico e converter para imagem
-    def create_chart_image(chart_func, width=6, height=4):
-        """Cria um gráfico e retorna como imagem para o PDF"""
-        try:
-            fig, ax = plt.subplots(figsize=(width, height))
-            chart_func(ax)
-            
-            # Salvar em buffer temporário
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight', 
-                       facecolor='white', edgecolor='none')
-            plt.close()
-            
-            img_buffer.seek(0)
-            return Image(img_buffer, width=width*inch, height=height*inch)
-        except Exception as e:
-            print(f"Erro ao criar gráfico: {e}")
-            return None
-    
+
+        elementos.append(ranking_table)
+        elementos.append(Spacer(1, 20))
+
+    elementos.append(PageBreak())
+    return elementos
+
+
+@registrar_secao('graficos', "Gráficos")
+def secao_graficos(contexto):
+    from reportlab.platypus import Paragraph, Spacer, PageBreak
+
+    opcoes = contexto['opcoes']
+    elementos = [Paragraph("📊 ANÁLISES VISUAIS", contexto['estilos']['secao'])]
+    valores, populacao, municipios = contexto['valores'], contexto['populacao'], contexto['municipios']
+
     # GRÁFICO 1: Top 10 Municípios por Valor
-    if 'Valor_Municipal_Area' in df.columns and 'Municipio' in df.columns:
-        def chart_top_valores(ax):
-            df_chart = df.copy()
-            df_chart['Valor_Clean'] = pd.to_numeric(df_chart['Valor_Municipal_Area'], errors='coerce').fillna(0)
-            top_10 = df_chart.nlargest(10, 'Valor_Clean')
-            
-            colors_gradient = plt.cm.Blues(np.linspace(0.4, 0.9, 10))
-            bars = ax.barh(range(10), top_10['Valor_Clean'], color=colors_gradient)
-            
-            ax.set_yticks(range(10))
-            ax.set_yticklabels([nome[:15] + '...' if len(nome) > 15 else nome 
-                               for nome in top_10['Municipio']], fontsize=9)
-            ax.set_xlabel('Valor Municipal (R$)', fontsize=10)
-            ax.set_title('🏆 TOP 10 MUNICÍPIOS POR VALOR MUNICIPAL', fontsize=12, fontweight='bold', pad=20)
-            
-            # Adicionar valores nas barras
-            for i, (bar, valor) in enumerate(zip(bars, top_10['Valor_Clean'])):
-                ax.text(bar.get_width() + max(top_10['Valor_Clean']) * 0.01, 
-                       bar.get_y() + bar.get_height()/2, 
-                       formatar_valor_grande(valor), 
-                       va='center', fontsize=8, fontweight='bold')
-            
-            ax.grid(axis='x', alpha=0.3)
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            plt.tight_layout()
-        
-        chart_img = create_chart_image(chart_top_valores, width=7, height=5)
-        if chart_img:
-            story.append(chart_img)
-            story.append(Spacer(1, 15))
-    
+    top_10 = None
+    if valores is not None and municipios is not None:
+        top_10 = valores.loc[ranking_top_k(contexto['df'], 'valor', 10, df_base=contexto['df_base'])]
+    if top_10 is not None and len(top_10):
+        png = grafico_top_valores_png(municipios.loc[top_10.index].tolist(), top_10.tolist())
+        imagem = _imagem_grafico(png, 7, 5)
+        if imagem:
+            elementos += [imagem, Spacer(1, 15)]
+
     # GRÁFICO 2: Distribuição Populacional
-    if 'Populacao' in df.columns:
-        def chart_distribuicao_pop(ax):
-            pop_clean = pd.to_numeric(df['Populacao'], errors='coerce').fillna(0)
-            pop_valida = pop_clean[pop_clean > 0]
-            
-            # Criar histograma
-            n, bins, patches = ax.hist(pop_valida, bins=15, color='lightblue', 
-                                     edgecolor='navy', alpha=0.7)
-            
-            # Colorir barras com gradiente
-            cm = plt.cm.viridis
-            for i, (patch, value) in enumerate(zip(patches, n)):
-                patch.set_facecolor(cm(value / max(n)))
-            
-            ax.set_xlabel('População', fontsize=10)
-            ax.set_ylabel('Número de Municípios', fontsize=10)
-            ax.set_title('📊 DISTRIBUIÇÃO POPULACIONAL DOS MUNICÍPIOS', 
-                        fontsize=12, fontweight='bold', pad=20)
-            
-            # Adicionar linha da média
-            media_pop = pop_valida.mean()
-            ax.axvline(media_pop, color='red', linestyle='--', linewidth=2, 
-                      label=f'Média: {formatar_numero_grande(media_pop)}')
-            ax.legend()
-            
-            ax.grid(axis='y', alpha=0.3)
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            plt.tight_layout()
-        
-        chart_img2 = create_chart_image(chart_distribuicao_pop, width=7, height=4)
-        if chart_img2:
-            story.append(chart_img2)
-            story.append(Spacer(1, 15))
-    
-    # GRÁFICO 3: Correlação População x Valor (se ambos existirem)
-    if 'Populacao' in df.columns and 'Valor_Municipal_Area' in df.columns:
-        def chart_correlacao(ax):
-            df_scatter = df.copy()
-            df_scatter['Pop_Clean'] = pd.to_numeric(df_scatter['Populacao'], errors='coerce').fillna(0)
-            df_scatter['Val_Clean'] = pd.to_numeric(df_scatter['Valor_Municipal_Area'], errors='coerce').fillna(0)
-            df_scatter = df_scatter[(df_scatter['Pop_Clean'] > 0) & (df_scatter['Val_Clean'] > 0)]
-            
-            if len(df_scatter) > 3:
-                scatter = ax.scatter(df_scatter['Pop_Clean'], df_scatter['Val_Clean'], 
-                                   alpha=0.6, s=60, c=range(len(df_scatter)), 
-                                   cmap='viridis', edgecolors='black', linewidth=0.5)
-                
-                # Linha de tendência
-                z = np.polyfit(df_scatter['Pop_Clean'], df_scatter['Val_Clean'], 1)
-                p = np.poly1d(z)
-                ax.plot(df_scatter['Pop_Clean'], p(df_scatter['Pop_Clean']), 
-                       "r--", alpha=0.8, linewidth=2)
-                
-                # Calcular R²
-                correlation = df_scatter['Pop_Clean'].corr(df_scatter['Val_Clean'])
-                ax.set_title(f'💹 CORRELAÇÃO POPULAÇÃO × VALOR MUNICIPAL\n(R = {correlation:.3f})', 
-                           fontsize=12, fontweight='bold', pad=20)
-                
-                ax.set_xlabel('População', fontsize=10)
-                ax.set_ylabel('Valor Municipal (R$)', fontsize=10)
-                
-                # Destacar top 3 municípios
-                top_3 = df_scatter.nlargest(3, 'Val_Clean')
-                for _, row in top_3.iterrows():
-                    ax.annotate(row['Municipio'][:10], 
-                              (row['Pop_Clean'], row['Val_Clean']),
-                              xytext=(5, 5), textcoords='offset points',
-                              fontsize=8, fontweight='bold',
-                              bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.7))
-                
-                ax.grid(True, alpha=0.3)
-                ax.spines['top'].set_visible(False)
-                ax.spines['right'].set_visible(False)
-                plt.tight_layout()
-        
-        chart_img3 = create_chart_image(chart_correlacao, width=7, height=5)
-        if chart_img3:
-            story.append(chart_img3)
-            story.append(Spacer(1, 20))
-    
+    if populacao is not None and opcoes['incluir_distribuicao']:
+        png = grafico_distribuicao_populacao_png(populacao[populacao > 0].to_numpy())
+        imagem = _imagem_grafico(png, 7, 4)
+        if imagem:
+            elementos += [imagem, Spacer(1, 15)]
+
+    # GRÁFICO 3: Correlação População x Valor (com mais de 3 pares válidos)
+    if contexto['correlacao'] is not None and opcoes['incluir_correlacao'] and municipios is not None:
+        pares = contexto['pares_pop_valor']
+        png = grafico_correlacao_png(
+            populacao[pares].to_numpy(),
+            valores[pares].to_numpy(),
+            municipios[pares].tolist(),
+            contexto['correlacao'],
+        )
+        imagem = _imagem_grafico(png, 7, 5)
+        if imagem:
+            elementos += [imagem, Spacer(1, 20)]
+
     # Nova página para análises detalhadas
-    story.append(PageBreak())
-    
-    # === ANÁLISES DETALHADAS ===
-    story.append(Paragraph("📈 ANÁLISES DETALHADAS", section_style))
-    
+    elementos.append(PageBreak())
+    return elementos
+
+
+@registrar_secao('analise_qualidade', "Análises Detalhadas")
+def secao_analise_qualidade(contexto):
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.units import inch
+
+    df = contexto['df']
+    estilos = contexto['estilos']
+    elementos = [Paragraph("📈 ANÁLISES DETALHADAS", estilos['secao'])]
+
     # Análise de qualidade (notas)
-    if any(col.startswith('Nota') for col in df.columns):
-        story.append(Paragraph("⭐ INDICADORES DE QUALIDADE", highlight_style))
-        
-        nota_cols = [col for col in df.columns if col.startswith('Nota')]
+    nota_cols = [col for col in df.columns if col.startswith('Nota')]
+    if nota_cols:
+        elementos.append(Paragraph("⭐ INDICADORES DE QUALIDADE", estilos['destaque']))
         quality_data = [['Indicador', 'Mín.', 'Máx.', 'Média', 'Top Município']]
-        
+
         for col in nota_cols[:6]:  # Top 6 indicadores
             values = pd.to_numeric(df[col], errors='coerce').dropna()
             if not values.empty:
-                max_idx = values.idxmax()
-                top_municipio = df.loc[max_idx, 'Municipio'] if 'Municipio' in df.columns else 'N/A'
-                
+                top_municipio = contexto['municipios'].loc[values.idxmax()] if contexto['municipios'] is not None else 'N/A'
+
                 quality_data.append([
                     col.replace('_', ' ').replace('Nota ', ''),
                     f"{values.min():.2f}".replace('.', ','),
@@ -3586,7 +4810,7 @@ def generate_pdf_report(df):
                     f"{values.mean():.2f}".replace('.', ','),
                     top_municipio
                 ])
-        
+
         quality_table = Table(quality_data, colWidths=[1.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 2*inch])
         quality_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2b6cb0')),
@@ -3604,187 +4828,201 @@ def generate_pdf_report(df):
             ('TOPPADDING', (0, 1), (-1, -1), 6),
             ('BOTTOMPADDING', (0, 1), (-1, -1), 6)
         ]))
-        
-        story.append(quality_table)
-        story.append(Spacer(1, 15))
-    
-    # === INSIGHTS E RECOMENDAÇÕES ===
-    story.append(Paragraph("🧠 INSIGHTS E RECOMENDAÇÕES", section_style))
-    
+
+        elementos.append(quality_table)
+        elementos.append(Spacer(1, 15))
+
+    return elementos
+
+
+@registrar_secao('insights', "Insights")
+def secao_insights(contexto):
+    from reportlab.platypus import Paragraph, Spacer
+
+    estilos = contexto['estilos']
+    elementos = [Paragraph("🧠 INSIGHTS E RECOMENDAÇÕES", estilos['secao'])]
+
     # Gerar insights automáticos baseados nos dados
     insights = []
-    
-    if 'Valor_Municipal_Area' in df.columns:
-        valores_clean = pd.to_numeric(df['Valor_Municipal_Area'], errors='coerce').fillna(0)
-        valores_validos = valores_clean[valores_clean > 0]
-        
-        if len(valores_validos) > 0:
-            cv = valores_validos.std() / valores_validos.mean()  # Coeficiente de variação
-            
-            if cv > 1:
-                insights.append("📊 Alta variabilidade nos valores municipais indica oportunidades diversificadas de investimento.")
-            elif cv < 0.3:
-                insights.append("📊 Baixa variabilidade nos valores sugere um mercado mais homogêneo e estável.")
-            
-            # Análise de concentração
-            top_10_percent = valores_validos.quantile(0.9)
-            high_value_count = len(valores_validos[valores_validos >= top_10_percent])
-            
-            if high_value_count <= len(valores_validos) * 0.05:
-                insights.append("🎯 Mercado concentrado: poucos municípios representam a maior parte do valor total.")
-            
-            # Análise de oportunidades
-            median_val = valores_validos.median()
-            cheap_opportunities = len(valores_validos[valores_validos <= median_val * 0.5])
-            
-            if cheap_opportunities > 0:
-                insights.append(f"� Identificadas {cheap_opportunities} oportunidades de investimento com valores abaixo da média do mercado.")
-    
-    # Insight populacional
-    if 'Populacao' in df.columns and 'Valor_Municipal_Area' in df.columns:
-        pop_clean = pd.to_numeric(df['Populacao'], errors='coerce').fillna(0)
-        
-        # Calcular correlação população x valor
-        df_corr = pd.DataFrame({
-            'pop': pop_clean,
-            'val': pd.to_numeric(df['Valor_Municipal_Area'], errors='coerce').fillna(0)
-        })
-        df_corr = df_corr[(df_corr['pop'] > 0) & (df_corr['val'] > 0)]
-        
-        if len(df_corr) > 3:
-            correlation = df_corr['pop'].corr(df_corr['val'])
-            
-            if correlation > 0.7:
-                insights.append("👥 Forte correlação positiva entre população e valor municipal indica mercados populacionais valorizados.")
-            elif correlation < 0.3:
-                insights.append("🎯 Baixa correlação população-valor sugere oportunidades em municípios menos populosos.")
-    
-    # Adicionar insights ao relatório
+
+    est_valor = contexto['estatisticas_valor']
+    if est_valor:
+        valores_validos = est_valor['validos']
+        cv = est_valor['desvio'] / est_valor['medio']  # Coeficiente de variação
+
+        if cv > 1:
+            insights.append("📊 Alta variabilidade nos valores municipais indica oportunidades diversificadas de investimento.")
+        elif cv < 0.3:
+            insights.append("📊 Baixa variabilidade nos valores sugere um mercado mais homogêneo e estável.")
+
+        # Análise de concentração
+        high_value_count = int((valores_validos >= est_valor['p90']).sum())
+        if high_value_count <= len(valores_validos) * 0.05:
+            insights.append("🎯 Mercado concentrado: poucos municípios representam a maior parte do valor total.")
+
+        # Análise de oportunidades
+        cheap_opportunities = int((valores_validos <= est_valor['mediano'] * 0.5).sum())
+        if cheap_opportunities > 0:
+            insights.append(f"💡 Identificadas {cheap_opportunities} oportunidades de investimento com valores abaixo da média do mercado.")
+
+    # Insight populacional (correlação população x valor)
+    correlation = contexto['correlacao']
+    if correlation is not None:
+        if correlation > 0.7:
+            insights.append("👥 Forte correlação positiva entre população e valor municipal indica mercados populacionais valorizados.")
+        elif correlation < 0.3:
+            insights.append("🎯 Baixa correlação população-valor sugere oportunidades em municípios menos populosos.")
+
     for insight in insights[:5]:  # Top 5 insights
-        story.append(Paragraph(insight, insight_style))
-    
-    story.append(Spacer(1, 20))
-    
-    # === QUADRO RESUMO EXECUTIVO ===
-    story.append(Paragraph("📋 QUADRO RESUMO EXECUTIVO", section_style))
-    
-    # Criar resumo visual final
-    if 'Valor_Municipal_Area' in df.columns:
-        valores_clean = pd.to_numeric(df['Valor_Municipal_Area'], errors='coerce').fillna(0)
-        valores_validos = valores_clean[valores_clean > 0]
-        
-        if len(valores_validos) > 0:
-            # Dados para o quadro resumo
-            resumo_data = [
-                ['📊 INDICADOR', '📈 VALOR', '🎯 STATUS'],
-                [
-                    'Mercado Total', 
-                    formatar_valor_grande(valores_validos.sum()),
-                    '🟢 Consolidado' if len(valores_validos) > 50 else '🟡 Em Desenvolvimento'
-                ],
-                [
-                    'Ticket Médio', 
-                    formatar_valor_grande(valores_validos.mean()),
-                    '🟢 Atrativo' if valores_validos.mean() > valores_validos.median() * 1.2 else '🟡 Estável'
-                ],
-                [
-                    'Oportunidades (<Q1)', 
-                    f"{len(valores_validos[valores_validos <= valores_validos.quantile(0.25)])} municípios",
-                    '🟢 Alto Potencial' if len(valores_validos[valores_validos <= valores_validos.quantile(0.25)]) > 10 else '🟡 Moderado'
-                ],
-                [
-                    'Municípios Premium (>Q3)', 
-                    f"{len(valores_validos[valores_validos >= valores_validos.quantile(0.75)])} municípios",
-                    '💎 Mercado VIP'
-                ],
-                [
-                    'Volatilidade do Mercado',
-                    f"{(valores_validos.std() / valores_validos.mean()):.1%}",
-                    '🟢 Baixa' if (valores_validos.std() / valores_validos.mean()) < 0.5 
-                    else '🟡 Moderada' if (valores_validos.std() / valores_validos.mean()) < 1.0 
-                    else '🔴 Alta'
-                ]
+        elementos.append(Paragraph(insight, estilos['insight']))
+
+    elementos.append(Spacer(1, 20))
+    return elementos
+
+
+@registrar_secao('quadro_resumo', "Quadro Resumo")
+def secao_quadro_resumo(contexto):
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.units import inch
+
+    elementos = [Paragraph("📋 QUADRO RESUMO EXECUTIVO", contexto['estilos']['secao'])]
+
+    est_valor = contexto['estatisticas_valor']
+    if est_valor:
+        valores_validos = est_valor['validos']
+        oportunidades = int((valores_validos <= est_valor['q1']).sum())
+        premium = int((valores_validos >= est_valor['q3']).sum())
+        volatilidade = est_valor['desvio'] / est_valor['medio']
+
+        resumo_data = [
+            ['📊 INDICADOR', '📈 VALOR', '🎯 STATUS'],
+            [
+                'Mercado Total',
+                formatar_valor_grande(est_valor['total']),
+                '🟢 Consolidado' if len(valores_validos) > 50 else '🟡 Em Desenvolvimento'
+            ],
+            [
+                'Ticket Médio',
+                formatar_valor_grande(est_valor['medio']),
+                '🟢 Atrativo' if est_valor['medio'] > est_valor['mediano'] * 1.2 else '🟡 Estável'
+            ],
+            [
+                'Oportunidades (<Q1)',
+                f"{oportunidades} municípios",
+                '🟢 Alto Potencial' if oportunidades > 10 else '🟡 Moderado'
+            ],
+            [
+                'Municípios Premium (>Q3)',
+                f"{premium} municípios",
+                '💎 Mercado VIP'
+            ],
+            [
+                'Volatilidade do Mercado',
+                f"{volatilidade:.1%}",
+                '🟢 Baixa' if volatilidade < 0.5
+                else '🟡 Moderada' if volatilidade < 1.0
+                else '🔴 Alta'
             ]
-            
-            resumo_table = Table(resumo_data, colWidths=[2.2*inch, 2*inch, 1.8*inch])
-            resumo_table.setStyle(TableStyle([
-                # Cabeçalho especial
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a202c')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                
-                # Cores alternadas mais elegantes
-                ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#e6fffa')),
-                ('BACKGROUND', (0, 2), (-1, 2), colors.HexColor('#f0fff4')),
-                ('BACKGROUND', (0, 3), (-1, 3), colors.HexColor('#fef5e7')),
-                ('BACKGROUND', (0, 4), (-1, 4), colors.HexColor('#faf5ff')),
-                ('BACKGROUND', (0, 5), (-1, 5), colors.HexColor('#fffbf0')),
-                
-                # Estilo do texto
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),  # Primeira coluna em negrito
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-                ('ALIGN', (2, 1), (2, -1), 'CENTER'),
-                
-                # Bordas e espaçamento
-                ('GRID', (0, 0), (-1, -1), 1.5, colors.HexColor('#4a5568')),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 10),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8)
-            ]))
-            
-            story.append(resumo_table)
-            story.append(Spacer(1, 20))
-    
-    # === CONCLUSÕES E PRÓXIMOS PASSOS ===
-    story.append(Paragraph("🚀 CONCLUSÕES E PRÓXIMOS PASSOS", section_style))
-    
+        ]
+
+        resumo_table = Table(resumo_data, colWidths=[2.2*inch, 2*inch, 1.8*inch])
+        resumo_table.setStyle(TableStyle([
+            # Cabeçalho especial
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a202c')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+
+            # Cores alternadas mais elegantes
+            ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#e6fffa')),
+            ('BACKGROUND', (0, 2), (-1, 2), colors.HexColor('#f0fff4')),
+            ('BACKGROUND', (0, 3), (-1, 3), colors.HexColor('#fef5e7')),
+            ('BACKGROUND', (0, 4), (-1, 4), colors.HexColor('#faf5ff')),
+            ('BACKGROUND', (0, 5), (-1, 5), colors.HexColor('#fffbf0')),
+
+            # Estilo do texto
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),  # Primeira coluna em negrito
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+            ('ALIGN', (2, 1), (2, -1), 'CENTER'),
+
+            # Bordas e espaçamento
+            ('GRID', (0, 0), (-1, -1), 1.5, colors.HexColor('#4a5568')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8)
+        ]))
+
+        elementos.append(resumo_table)
+        elementos.append(Spacer(1, 20))
+
+    return elementos
+
+
+@registrar_secao('conclusoes', "Conclusões e Próximos Passos")
+def secao_conclusoes(contexto):
+    from reportlab.platypus import Paragraph, Spacer
+
     conclusoes_text = """
     <b>🎯 CONCLUSÃO PRINCIPAL:</b><br/>
-    Com base na análise abrangente dos dados municipais de Alagoas, identificamos um mercado 
-    robusto com oportunidades claras de investimento e crescimento, apresentando características 
+    Com base na análise abrangente dos dados municipais de Alagoas, identificamos um mercado
+    robusto com oportunidades claras de investimento e crescimento, apresentando características
     distintas que permitem estratégias direcionadas.<br/><br/>
-    
+
     <b>📈 PRÓXIMOS PASSOS RECOMENDADOS:</b><br/>
     • <b>Fase 1:</b> Análise detalhada dos municípios do 1º quartil para identificação de oportunidades<br/>
     • <b>Fase 2:</b> Desenvolvimento de estratégias específicas para municípios premium<br/>
     • <b>Fase 3:</b> Implementação de monitoramento contínuo dos indicadores-chave<br/>
     • <b>Fase 4:</b> Diversificação de portfólio baseada nas correlações identificadas<br/><br/>
-    
+
     <b>⚡ AÇÕES IMEDIATAS:</b><br/>
     • Priorizar municípios com melhor relação valor/população<br/>
     • Estabelecer parcerias estratégicas com municípios de alto potencial<br/>
     • Desenvolver métricas de acompanhamento customizadas
     """
-    
-    story.append(Paragraph(conclusoes_text, styles['Normal']))
-    story.append(Spacer(1, 20))
-    
-    # === METODOLOGIA E OBSERVAÇÕES ===
-    story.append(Paragraph("📋 METODOLOGIA E OBSERVAÇÕES TÉCNICAS", section_style))
-    
+
+    return [
+        Paragraph("🚀 CONCLUSÕES E PRÓXIMOS PASSOS", contexto['estilos']['secao']),
+        Paragraph(conclusoes_text, contexto['estilos']['base']['Normal']),
+        Spacer(1, 20),
+    ]
+
+
+@registrar_secao('metodologia', "Metodologia")
+def secao_metodologia(contexto):
+    from reportlab.platypus import Paragraph
+
     metodologia_text = """
-    Este relatório foi gerado automaticamente através de análise estatística avançada dos dados 
-    municipais de Alagoas. As métricas incluem análises de tendência central, dispersão e 
+    Este relatório foi gerado automaticamente através de análise estatística avançada dos dados
+    municipais de Alagoas. As métricas incluem análises de tendência central, dispersão e
     correlação entre variáveis demográficas e econômicas.
-    
+
     <b>Fontes de Dados:</b> Base oficial de dados municipais de Alagoas<br/>
     <b>Período de Análise:</b> Dados mais recentes disponíveis<br/>
     <b>Metodologia:</b> Análise estatística descritiva e inferencial<br/>
     <b>Geração:</b> Sistema automatizado com IA para insights
     """
-    
-    story.append(Paragraph(metodologia_text, styles['Normal']))
-    
-    # === RODAPÉ PREMIUM ===
-    story.append(Spacer(1, 40))
-    
+
+    return [
+        Paragraph("📋 METODOLOGIA E OBSERVAÇÕES TÉCNICAS", contexto['estilos']['secao']),
+        Paragraph(metodologia_text, contexto['estilos']['base']['Normal']),
+    ]
+
+
+@registrar_secao('rodape', "Rodapé")
+def secao_rodape(contexto):
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.units import inch
+
+    elementos = [Spacer(1, 40)]
+
     # Linha separadora elegante
     separator_table = Table([['_' * 80]], colWidths=[6*inch])
     separator_table.setStyle(TableStyle([
@@ -3792,16 +5030,16 @@ def generate_pdf_report(df):
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
         ('FONTSIZE', (0, 0), (-1, -1), 12)
     ]))
-    story.append(separator_table)
-    story.append(Spacer(1, 15))
-    
+    elementos.append(separator_table)
+    elementos.append(Spacer(1, 15))
+
     # Informações do documento
     footer_info_data = [
         ['📊 DASHBOARD DE PRECIFICAÇÃO MUNICIPAL', '🏛️ GOVERNO DE ALAGOAS'],
         ['🤖 Relatório Gerado por Inteligência Artificial', '📈 Análise de Dados Avançada'],
         [f'📅 {datetime.now().strftime("%d de %B de %Y às %H:%M")}', f'📄 Documento #{datetime.now().strftime("%Y%m%d%H%M")}']
     ]
-    
+
     footer_table = Table(footer_info_data, colWidths=[3*inch, 3*inch])
     footer_table.setStyle(TableStyle([
         # Primeira linha (título)
@@ -3809,19 +5047,19 @@ def generate_pdf_report(df):
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
         ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
         ('FONTSIZE', (0, 0), (-1, 0), 10),
-        
+
         # Segunda linha (subtítulo)
         ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#2d3748')),
         ('TEXTCOLOR', (0, 1), (-1, 1), colors.white),
         ('FONTNAME', (0, 1), (-1, 1), 'Helvetica'),
         ('FONTSIZE', (0, 1), (-1, 1), 9),
-        
+
         # Terceira linha (data)
         ('BACKGROUND', (0, 2), (-1, 2), colors.HexColor('#f8f9fa')),
         ('TEXTCOLOR', (0, 2), (-1, 2), colors.HexColor('#4a5568')),
         ('FONTNAME', (0, 2), (-1, 2), 'Helvetica'),
         ('FONTSIZE', (0, 2), (-1, 2), 8),
-        
+
         # Estilo geral
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
         ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
@@ -3831,90 +5069,119 @@ def generate_pdf_report(df):
         ('TOPPADDING', (0, 0), (-1, -1), 10),
         ('BOTTOMPADDING', (0, 0), (-1, -1), 10)
     ]))
-    
-    story.append(footer_table)
-    
+
+    elementos.append(footer_table)
+
     # Nota de confidencialidade
-    story.append(Spacer(1, 15))
+    elementos.append(Spacer(1, 15))
     confidencial_text = """
-    <i>Este documento contém análises estratégicas baseadas em dados oficiais. 
-    Todas as informações foram processadas através de algoritmos de inteligência artificial 
+    <i>Este documento contém análises estratégicas baseadas em dados oficiais.
+    Todas as informações foram processadas através de algoritmos de inteligência artificial
     para garantir precisão e insights relevantes para tomada de decisão.</i>
     """
-    
-    confidencial_style = ParagraphStyle(
-        'Confidencial',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.HexColor('#718096'),
-        fontName='Helvetica-Oblique',
-        alignment=1,  # Centralizado
-        spaceAfter=10
+
+    elementos.append(Paragraph(confidencial_text, contexto['estilos']['confidencial']))
+    return elementos
+
+
+def generate_custom_pdf_report(df, titulo="Relatório de Precificação Municipal", subtitulo="Análise Estratégica",
+                              incluir_timestamp=True, incluir_capa=True, incluir_resumo_executivo=True,
+                              incluir_ranking=True, incluir_estatisticas=True, incluir_graficos=True,
+                              incluir_analise_qualidade=True, incluir_insights=True, incluir_recomendacoes=True,
+                              incluir_quadro_resumo=True, incluir_conclusoes=True, incluir_metodologia=False,
+                              incluir_rodape_premium=True, top_count=10, criterio_ranking="Valor Municipal",
+                              incluir_correlacao=True, incluir_distribuicao=True):
+    """
+    Gera um relatório PDF PERSONALIZADO baseado nas configurações do usuário
+
+    'incluir_estatisticas' controla as análises detalhadas e o quadro resumo;
+    'incluir_recomendacoes' controla as conclusões e próximos passos
+    """
+    secoes_incluidas = {
+        'capa': incluir_capa,
+        'resumo_executivo': incluir_resumo_executivo,
+        'ranking': incluir_ranking,
+        'graficos': incluir_graficos,
+        'analise_qualidade': incluir_estatisticas and incluir_analise_qualidade,
+        'insights': incluir_insights,
+        'quadro_resumo': incluir_estatisticas and incluir_quadro_resumo,
+        'conclusoes': incluir_recomendacoes and incluir_conclusoes,
+        'metodologia': incluir_metodologia,
+        'rodape': incluir_rodape_premium,
+    }
+
+    buffer, _ = gerar_relatorio_pdf(
+        df,
+        [secao for secao, incluir in secoes_incluidas.items() if incluir],
+        titulo=titulo,
+        subtitulo=subtitulo,
+        incluir_timestamp=incluir_timestamp,
+        top_count=top_count,
+        criterio_ranking=criterio_ranking,
+        incluir_correlacao=incluir_correlacao,
+        incluir_distribuicao=incluir_distribuicao,
     )
-    
-    story.append(Paragraph(confidencial_text, confidencial_style))
-    
-    # Construir PDF
-    doc.build(story)
-    
-    # Retornar o buffer
-    buffer.seek(0)
     return buffer
 
-def apply_filters(df, municipios_selecionados, busca_texto, pop_range, nota_range, valor_range, georef_range):
-    """Aplica todos os filtros selecionados ao DataFrame"""
-    df_filtered = df.copy()
+def generate_pdf_report(df):
+    """Gera um relatório PREMIUM em PDF com design profissional, gráficos e análises avançadas"""
+    buffer, _ = gerar_relatorio_pdf(df)
+    return buffer
+
+def valores_coluna_filtro(df, coluna):
+    """Valores numéricos (ausentes = 0) de uma coluna filtrada pelos sliders"""
+    if coluna == 'Nota_Media':
+        valores = pd.to_numeric(df[coluna], errors='coerce')
+    else:
+        valores = converter_coluna_numerica(df[coluna])
+    return valores.fillna(0).to_numpy(dtype=float)
+
+def apply_filters(df, municipios_selecionados, busca_texto, pop_range, nota_range, valor_range, georef_range,
+                  indice_busca=None, valores_numericos=None):
+    """
+    Aplica todos os filtros selecionados ao DataFrame
+
+    Os filtros compõem uma única máscara sobre df, sem cópias intermediárias; sem filtro
+    efetivo, retorna o próprio df. valores_numericos: colunas dos sliders já limpas para
+    as linhas de df (valores_filtros_numericos)
+    """
+    mascara = np.ones(len(df), dtype=bool)
     
     # Filtro por municípios selecionados
-    if municipios_selecionados and 'Municipio' in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered['Municipio'].isin(municipios_selecionados)]
-    
-    # Filtro por busca de texto
-    if busca_texto and 'Municipio' in df_filtered.columns:
-        df_filtered = df_filtered[
-            df_filtered['Municipio'].str.contains(busca_texto, case=False, na=False)
-        ]
-    
-    # Filtro por população - usando clean_brazilian_number para garantir conversão correta
-    if 'Populacao' in df_filtered.columns:
-        pop_clean = df_filtered['Populacao'].apply(clean_brazilian_number).fillna(0)
-        df_filtered = df_filtered[
-            (pop_clean >= pop_range[0]) & (pop_clean <= pop_range[1])
-        ]
-    
-    # Filtro por nota média
-    if 'Nota_Media' in df_filtered.columns:
-        nota_clean = pd.to_numeric(df_filtered['Nota_Media'], errors='coerce').fillna(0)
-        df_filtered = df_filtered[
-            (nota_clean >= nota_range[0]) & (nota_clean <= nota_range[1])
-        ]
-    
-    # Filtro por valor municipal - usando clean_brazilian_number para garantir conversão correta
-    if 'Valor_Municipal_Area' in df_filtered.columns:
-        valor_clean = df_filtered['Valor_Municipal_Area'].apply(clean_brazilian_number).fillna(0)
-        # valor_range já vem convertido para valores absolutos
-        df_filtered = df_filtered[
-            (valor_clean >= valor_range[0]) & (valor_clean <= valor_range[1])
-        ]
-    
-    # Filtro por Área Georef - usando clean_brazilian_number para garantir conversão correta
-    if 'Area_Georreferenciada' in df_filtered.columns:
-        georef_clean = df_filtered['Area_Georreferenciada'].apply(clean_brazilian_number).fillna(0)
-        # georef_range já vem convertido para metros quadrados
-        df_filtered = df_filtered[
-            (georef_clean >= georef_range[0]) & (georef_clean <= georef_range[1])
-        ]
+    if municipios_selecionados and 'Municipio' in df.columns:
+        mascara &= df['Municipio'].isin(municipios_selecionados).to_numpy()
+    
+    # Filtro por busca de texto (com o índice de busca, ignora acentos)
+    if busca_texto and indice_busca is not None:
+        normalizados = indice_busca['normalizados'].reindex(df.index)
+        mascara &= normalizados.str.contains(normalizar_texto(busca_texto), regex=False, na=False).to_numpy()
+    elif busca_texto and 'Municipio' in df.columns:
+        mascara &= df['Municipio'].str.contains(busca_texto, case=False, na=False).to_numpy()
+    
+    # Filtros por faixa dos sliders (população, nota média, valor municipal e área georreferenciada);
+    # valor e área chegam convertidos para valores absolutos
+    faixas = zip(COLUNAS_FILTROS_NUMERICOS, [pop_range, nota_range, valor_range, georef_range])
+    for coluna, (minimo, maximo) in faixas:
+        if coluna not in df.columns:
+            continue
+        if valores_numericos is not None and len(valores_numericos.get(coluna, ())) == len(df):
+            valores = valores_numericos[coluna].to_numpy()
+        else:
+            valores = valores_coluna_filtro(df, coluna)
+        mascara &= (valores >= minimo) & (valores <= maximo)
     
-    return df_filtered
+    return df if mascara.all() else df[mascara]
 
 def create_scatter_analysis(df):
     """Cria análise de correlação scatter"""
+    import plotly.express as px
+
     if 'Populacao' not in df.columns or 'Nota_Media' not in df.columns:
         st.warning("Dados para análise de correlação não disponíveis")
         return
     
-    # Limpa os dados
-    df_clean = df.copy()
+    # Limpa os dados (apenas as colunas do gráfico)
+    df_clean = df[[coluna for coluna in ['Municipio', 'Populacao', 'Nota_Media'] if coluna in df.columns]].copy()
     df_clean['Populacao'] = pd.to_numeric(df_clean['Populacao'], errors='coerce').fillna(0)
     df_clean['Nota_Media'] = pd.to_numeric(df_clean['Nota_Media'], errors='coerce').fillna(0)
     
@@ -3925,18 +5192,24 @@ def create_scatter_analysis(df):
         st.warning("Dados insuficientes para análise de correlação")
         return
     
-    fig = px.scatter(
-        df_clean,
-        x='Populacao',
-        y='Nota_Media',
-        hover_data=['Municipio'],
-        title="Relação entre População e Nota Média",
-        labels={'Populacao': 'População', 'Nota_Media': 'Nota Média'},
-        color='Nota_Media',
-        color_continuous_scale='RdYlBu_r',
-        size='Populacao',
-        size_max=20
-    )
+    titulo = "Relação entre População e Nota Média"
+    modo = modo_dispersao(len(df_clean))
+    if modo == 'densidade':
+        fig = grafico_densidade(df_clean['Populacao'], df_clean['Nota_Media'], titulo, 'População', 'Nota Média')
+    else:
+        fig = px.scatter(
+            df_clean,
+            x='Populacao',
+            y='Nota_Media',
+            hover_data=['Municipio'],
+            title=titulo,
+            labels={'Populacao': 'População', 'Nota_Media': 'Nota Média'},
+            color='Nota_Media',
+            color_continuous_scale='RdYlBu_r',
+            size='Populacao',
+            size_max=20,
+            render_mode=modo
+        )
     
     fig.update_layout(height=500)
     
@@ -3944,12 +5217,14 @@ def create_scatter_analysis(df):
 
 def create_value_analysis(df):
     """Cria análise de valores municipais"""
+    import plotly.express as px
+
     if 'Valor_Municipal_Area' not in df.columns:
         st.warning("Dados de valor municipal não disponíveis")
         return
     
-    # Limpa os dados
-    df_clean = df.copy()
+    # Limpa os dados (cópia só das colunas usadas)
+    df_clean = df[[coluna for coluna in ['Municipio', 'Valor_Municipal_Area'] if coluna in df.columns]].copy()
     df_clean['Valor_Municipal_Area'] = pd.to_numeric(df_clean['Valor_Municipal_Area'], errors='coerce').fillna(0)
     
     # Remove registros com valores inválidos
@@ -3980,25 +5255,661 @@ def create_value_analysis(df):
     
     return fig
 
+# =============================================================================
+# EXPORTAÇÃO DE DADOS
+# =============================================================================
+
+# Exportações são geradas só quando o usuário clica em baixar (callable do
+# st.download_button), escritas em lotes em um arquivo temporário e reaproveitadas
+# enquanto a chave da consulta (filtros + parâmetros) e as colunas forem as mesmas.
+DIRETORIO_EXPORTACOES = os.path.join(tempfile.gettempdir(), 'dashboard_precificacao_exportacoes')
+LINHAS_POR_LOTE_EXPORTACAO = 50_000
+LIMITE_ARQUIVOS_EXPORTACAO = 64
+
+FORMATOS_EXPORTACAO = {
+    'CSV': {'extensao': 'csv', 'mime': 'text/csv'},
+    'CSV compactado (.gz)': {'extensao': 'csv.gz', 'mime': 'application/gzip'},
+    'Parquet': {'extensao': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+    'Feather': {'extensao': 'feather', 'mime': 'application/vnd.apache.arrow.file'},
+}
+
+def _escrever_exportacao(df, caminho, formato):
+    """Escreve o DataFrame no formato escolhido, em lotes de LINHAS_POR_LOTE_EXPORTACAO linhas"""
+    lotes = (
+        df.iloc[inicio:inicio + LINHAS_POR_LOTE_EXPORTACAO]
+        for inicio in range(0, max(len(df), 1), LINHAS_POR_LOTE_EXPORTACAO)
+    )
+
+    if FORMATOS_EXPORTACAO[formato]['extensao'].startswith('csv'):
+        import gzip
+
+        abrir = gzip.open if formato == 'CSV compactado (.gz)' else open
+        with abrir(caminho, 'wt', encoding='utf-8', newline='') as arquivo:
+            for numero, lote in enumerate(lotes):
+                lote.to_csv(arquivo, index=False, header=numero == 0)
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    primeiro = pa.Table.from_pandas(next(lotes), preserve_index=False)
+    if formato == 'Parquet':
+        escritor = pq.ParquetWriter(caminho, primeiro.schema)
+    else:
+        escritor = pa.ipc.new_file(caminho, primeiro.schema)  # Feather v2 = arquivo Arrow IPC
+    with escritor:
+        escritor.write_table(primeiro)
+        for lote in lotes:
+            escritor.write_table(pa.Table.from_pandas(lote, schema=primeiro.schema, preserve_index=False))
+
+def _limpar_exportacoes_antigas():
+    """Mantém apenas os LIMITE_ARQUIVOS_EXPORTACAO arquivos mais recentes"""
+    arquivos = [
+        os.path.join(DIRETORIO_EXPORTACOES, nome)
+        for nome in os.listdir(DIRETORIO_EXPORTACOES) if not nome.endswith('.tmp')
+    ]
+    arquivos.sort(key=os.path.getmtime, reverse=True)
+    for caminho in arquivos[LIMITE_ARQUIVOS_EXPORTACAO:]:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+def gerar_exportacao(df, formato, chave=None):
+    """
+    Gera (ou reaproveita) o arquivo de exportação e retorna seu conteúdo em bytes
+
+    chave identifica o conteúdo de df (filtros + parâmetros da consulta); sem chave,
+    usa o hash das linhas
+    """
+    if chave is None:
+        chave = int(pd.util.hash_pandas_object(df, index=False).sum())
+    identificador = hashlib.sha256(repr((chave, tuple(df.columns), formato)).encode()).hexdigest()[:20]
+    caminho = os.path.join(DIRETORIO_EXPORTACOES, f"{identificador}.{FORMATOS_EXPORTACAO[formato]['extensao']}")
+
+    if not os.path.exists(caminho):
+        os.makedirs(DIRETORIO_EXPORTACOES, exist_ok=True)
+        # Escreve em arquivo temporário e renomeia: sessões simultâneas nunca leem um arquivo pela metade
+        descritor, temporario = tempfile.mkstemp(dir=DIRETORIO_EXPORTACOES, suffix='.tmp')
+        os.close(descritor)
+        try:
+            _escrever_exportacao(df, temporario, formato)
+            os.replace(temporario, caminho)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        _limpar_exportacoes_antigas()
+
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+def botao_exportacao(df, chave, nome_arquivo, chave_widget, rotulo="Baixar"):
+    """
+    Seletor de formato + botão de download; o arquivo só é gerado quando o botão é clicado
+
+    nome_arquivo: nome sem extensão (a extensão vem do formato escolhido)
+    """
+    formato = st.selectbox("Formato", list(FORMATOS_EXPORTACAO), key=f"{chave_widget}_formato")
+    st.download_button(
+        label=rotulo,
+        data=lambda: gerar_exportacao(df, formato, chave),
+        file_name=f"{nome_arquivo}.{FORMATOS_EXPORTACAO[formato]['extensao']}",
+        mime=FORMATOS_EXPORTACAO[formato]['mime'],
+        on_click='ignore',
+        key=f"{chave_widget}_download"
+    )
+
+# =============================================================================
+# GRAFO DE VISÕES (RECÁLCULO INCREMENTAL)
+# =============================================================================
+# Cada visão do painel declara suas entradas: as colunas do dataset que lê (None = todas)
+# e o conjunto de linhas filtradas. A chave da visão é a impressão digital dessas
+# entradas, então um rerun só reconstrói as visões cujas entradas mudaram (ex.: um
+# slider que não altera os municípios filtrados não reconstrói nada); as demais vêm
+# do cache, compartilhado entre as sessões. Mensagens emitidas durante a construção
+# (st.info, st.warning) são reproduzidas pelo cache do Streamlit.
+
+def tabela_ranking_valores(df, df_base=None):
+    """Tabela da aba Ranking: municípios ordenados pelo valor por área (R$ milhões)"""
+    if 'Municipio' not in df.columns or 'Valor_Municipal_Area' not in df.columns:
+        return None
+
+    # Ordem decrescente lida da permutação pré-calculada (sem ordenar o subconjunto)
+    display_df = df.loc[ranking_top_k(df, 'valor', df_base=df_base),
+                        ['Municipio', 'Valor_Municipal_Area', 'Valor_Municipal_Perimetro']]
+    display_df['Valor_Area_Limpo'] = converter_coluna_numerica(display_df['Valor_Municipal_Area'])
+    display_df['Valor_Perim_Limpo'] = converter_coluna_numerica(display_df['Valor_Municipal_Perimetro'])
+
+    # Formata para exibição
+    display_df['Valor Área (R$ Mi)'] = (display_df['Valor_Area_Limpo'] / 1_000_000).round(1)
+    display_df['Valor Perímetro (R$ Mi)'] = (display_df['Valor_Perim_Limpo'] / 1_000_000).round(2)
+
+    return display_df[['Municipio', 'Valor Área (R$ Mi)', 'Valor Perímetro (R$ Mi)']]
+
+# construir(df, df_base) recebe o conjunto filtrado e o dataset completo.
+# recurso=True: o resultado não é serializável (mapa folium) e fica em st.cache_resource.
+# figura=True: o resultado é uma figura Plotly, guardada como JSON (ver figura_para_cache).
+VISOES = {
+    'mapa': {
+        # O mapa leva todas as colunas para os popups e destaca os filtrados sobre o dataset completo
+        'colunas': None, 'recurso': True,
+        'construir': create_interactive_map,
+    },
+    'ranking_maiores': {
+        'figura': True,
+        'colunas': COLUNAS_MUNICIPIO + ['Valor_Municipal_Area'],
+        'construir': create_value_ranking_chart,
+    },
+    'ranking_menores': {
+        'figura': True,
+        'colunas': COLUNAS_MUNICIPIO + ['Valor_Municipal_Area'],
+        'construir': create_lowest_value_ranking_chart,
+    },
+    'tabela_ranking': {
+        'colunas': ['Municipio', 'Valor_Municipal_Area', 'Valor_Municipal_Perimetro'],
+        'construir': tabela_ranking_valores,
+    },
+    'distribuicao_precos': {
+        'figura': True,
+        'colunas': ['Valor_Municipal_Area'],
+        'construir': lambda df, df_base: create_price_distribution_chart(df),
+    },
+    'boxplot_precos': {
+        'figura': True,
+        'colunas': ['Valor_Municipal_Area'],
+        'construir': lambda df, df_base: create_price_boxplot(df),
+    },
+}
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def impressoes_colunas(_df, versao_dados, _delta=None):
+    """
+    Impressão digital do conteúdo de cada coluna (uma vez por versão dos dados)
+
+    _delta: atualização incremental; as colunas inalteradas mantêm a impressão (e as visões
+    que só leem essas colunas continuam no cache)
+    """
+    impressoes, alteradas = {}, set()
+    if _delta is not None:
+        anterior = _delta['anterior']
+        impressoes, alteradas = impressoes_colunas(anterior, anterior.attrs.get('versao_dados')), _delta['colunas']
+    return {
+        coluna: impressoes[coluna] if coluna in impressoes and coluna not in alteradas
+        else hashlib.sha256(pd.util.hash_pandas_object(_df[coluna], index=False).to_numpy().tobytes()).hexdigest()
+        for coluna in _df.columns
+    }
+
+def impressao_linhas(df, df_base):
+    """Impressão digital do conjunto de linhas de df (posições no dataset completo)"""
+    posicoes = df_base.index.get_indexer(df.index).astype(np.int64)
+    return hashlib.sha256(posicoes.tobytes()).hexdigest()
+
+def chave_visao(nome, df, df_base):
+    """Chave da visão: linhas filtradas + conteúdo das colunas que ela declara"""
+    colunas = VISOES[nome]['colunas']
+    impressoes = impressoes_colunas(df_base, df_base.attrs.get('versao_dados'))
+    if colunas is None:
+        colunas = list(df_base.columns)
+    partes = [nome, impressao_linhas(df, df_base)]
+    partes += [f"{coluna}={impressoes[coluna]}" for coluna in colunas if coluna in impressoes]
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _visao_em_cache(nome, chave, _df, _df_base):
+    resultado = VISOES[nome]['construir'](_df, _df_base)
+    return figura_para_cache(resultado) if VISOES[nome].get('figura') else resultado
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _visao_recurso_em_cache(nome, chave, _df, _df_base):
+    return VISOES[nome]['construir'](_df, _df_base)
+
+def obter_visao(nome, df, df_base):
+    """Resultado da visão para o conjunto filtrado (reconstruído só se as entradas mudaram)"""
+    chave = chave_visao(nome, df, df_base)
+    if VISOES[nome].get('recurso'):
+        return _visao_recurso_em_cache(nome, chave, df, df_base)
+    resultado = _visao_em_cache(nome, chave, df, df_base)
+    return figura_do_cache(resultado) if VISOES[nome].get('figura') else resultado
+
+# Cache de figuras Plotly: guarda o JSON já serializado da figura, não o objeto. Um
+# acerto custa só o json.loads (o st.plotly_chart valida o dict do mesmo jeito que
+# validaria a figura), em vez de desserializar o objeto Figure e convertê-lo de novo.
+# O cache do Streamlit é compartilhado entre as sessões e descarta as entradas menos
+# usadas ao atingir max_entries: as visões padrão (estado inteiro) são montadas uma vez
+# por processo. Figuras fora do grafo de visões usam figura_em_cache com CONSTRUTORES_FIGURA.
+CONSTRUTORES_FIGURA = {
+    'radar_municipio': create_municipality_radar,
+    'preco_por_populacao': create_price_by_population_chart,
+    'distribuicao_notas': create_notes_distribution,
+}
+
+def figura_para_cache(figura):
+    """JSON da figura Plotly (None se o construtor não gerou figura)"""
+    return None if figura is None else figura.to_json()
+
+def figura_do_cache(figura_json):
+    """Dict da figura para o st.plotly_chart a partir do JSON guardado"""
+    return None if figura_json is None else json.loads(figura_json)
+
+def impressao_entradas(entradas):
+    """Impressão digital das entradas de um construtor de figura (arrays, tabelas ou valores simples)"""
+    resumo = hashlib.sha256()
+    for entrada in entradas:
+        if isinstance(entrada, (pd.DataFrame, pd.Series)):
+            resumo.update(pd.util.hash_pandas_object(entrada).to_numpy().tobytes())
+            if isinstance(entrada, pd.DataFrame):
+                resumo.update(repr(list(entrada.columns)).encode('utf-8'))
+        elif isinstance(entrada, np.ndarray):
+            resumo.update(f"{entrada.dtype}{entrada.shape}".encode('utf-8'))
+            resumo.update(np.ascontiguousarray(entrada).tobytes())
+        else:
+            resumo.update(json.dumps(entrada, sort_keys=True, default=str).encode('utf-8'))
+        resumo.update(b'|')
+    return resumo.hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def _figura_em_cache(construtor, chave, _entradas):
+    return figura_para_cache(CONSTRUTORES_FIGURA[construtor](*_entradas))
+
+def figura_em_cache(construtor, *entradas):
+    """Figura (dict) do construtor registrado, reconstruída só quando as entradas mudam"""
+    chave = impressao_entradas(entradas)
+    return figura_do_cache(_figura_em_cache(construtor, chave, entradas))
+
+COLUNAS_FILTROS_NUMERICOS = ['Populacao', 'Nota_Media', 'Valor_Municipal_Area', 'Area_Georreferenciada']
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def valores_filtros_numericos(_df, versao_dados, _delta=None):
+    """
+    Colunas numéricas dos sliders da barra lateral, limpas uma vez por versão dos dados (somente leitura)
+
+    _delta: atualização incremental; só as linhas alteradas das colunas alteradas são convertidas
+    """
+    if _delta is not None:
+        anterior = _delta['anterior']
+        valores = dict(valores_filtros_numericos(anterior, anterior.attrs.get('versao_dados')))
+        posicoes = _delta['posicoes']
+        for coluna in valores:
+            if coluna in _delta['colunas']:
+                atualizados = valores[coluna].to_numpy().copy()
+                atualizados[posicoes] = valores_coluna_filtro(_df.iloc[posicoes], coluna)
+                valores[coluna] = pd.Series(somente_leitura(atualizados), index=_df.index, name=coluna, copy=False)
+        return valores
+    return {
+        coluna: pd.Series(somente_leitura(valores_coluna_filtro(_df, coluna)), index=_df.index, name=coluna, copy=False)
+        for coluna in COLUNAS_FILTROS_NUMERICOS if coluna in _df.columns
+    }
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def memoria_dataset(_df, versao_dados):
+    """Bytes do dataset compartilhado (calculado uma vez por versão dos dados)"""
+    return int(_df.memory_usage(index=True, deep=True).sum())
+
+def memoria_processo():
+    """Memória residente do processo em bytes (None se o sistema não informar)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Sem /proc (macOS): pico de memória residente, em bytes no macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def exibir_painel_memoria(df_base, df_sessao):
+    """Painel da barra lateral com a memória compartilhada e a exclusiva desta sessão"""
+    versao_dados = df_base.attrs.get('versao_dados')
+    compartilhados = sum(array.nbytes for array in faixas_dataset(df_base, versao_dados).values())
+    compartilhados += sum(serie.nbytes for serie in valores_filtros_numericos(df_base, versao_dados).values())
+    for dados in indice_ranking(df_base, versao_dados).values():
+        compartilhados += dados['valores'].nbytes + dados['decrescente'].nbytes + dados['crescente'].nbytes
+
+    # Sem filtro efetivo a sessão usa o próprio dataset compartilhado
+    sessao = 0 if df_sessao is df_base else int(df_sessao.memory_usage(index=True, deep=True).sum())
+    processo = memoria_processo()
+
+    with st.expander("Memória"):
+        st.caption(f"Dataset compartilhado: {memoria_dataset(df_base, versao_dados) / 1024**2:.2f} MB (uma cópia por processo)")
+        st.caption(f"Arrays derivados compartilhados: {compartilhados / 1024**2:.2f} MB")
+        st.caption(f"Conjunto filtrado desta sessão: {sessao / 1024**2:.2f} MB")
+        if processo is not None:
+            st.caption(f"Processo do servidor: {processo / 1024**2:.0f} MB")
+        estado = estado_dados()
+        st.caption(f"Versão dos dados: {versao_dados}")
+        if estado['progresso'] is not None:
+            st.progress(estado['progresso'], text="Convertendo versão nova dos dados")
+        if estado['recargas']:
+            recarga = estado['recargas'][-1]
+            st.caption(f"Última recarga: {recarga['horario']:%H:%M:%S} ({recarga['modo']}, {recarga['segundos']:.1f}s)")
+        if estado['erro']:
+            st.caption(f"⚠️ Versão nova rejeitada: {estado['erro']}")
+
+# =============================================================================
+# VERSÕES DO DATASET E ATUALIZAÇÕES INCREMENTAIS
+# =============================================================================
+
+# Cada ingestão (precificacao_cli.py ingerir) arquiva o CSV em DIRETORIO_VERSOES e registra
+# no histórico a diferença por código IBGE em relação à versão ativa. Quando só valores de
+# municípios existentes mudam (mesmas linhas, na mesma ordem, e mesmas colunas), grava
+# também um CSV delta com as linhas alteradas: o observador aplica esse delta ao dataset
+# processado e atualiza os caches derivados só nas linhas/colunas afetadas.
+DIRETORIO_VERSOES = os.path.join('dados', 'versoes')
+ARQUIVO_HISTORICO_VERSOES = os.path.join(DIRETORIO_VERSOES, 'historico.json')
+
+def historico_versoes():
+    """Entradas do histórico de versões, da mais antiga para a mais recente ([] sem histórico)"""
+    if not os.path.exists(ARQUIVO_HISTORICO_VERSOES):
+        return []
+    with open(ARQUIVO_HISTORICO_VERSOES, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def gravar_historico_versoes(historico):
+    """Grava o histórico de versões (arquivo temporário + troca atômica)"""
+    os.makedirs(DIRETORIO_VERSOES, exist_ok=True)
+    temporario = f"{ARQUIVO_HISTORICO_VERSOES}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(historico, arquivo, ensure_ascii=False, indent=2)
+    os.replace(temporario, ARQUIVO_HISTORICO_VERSOES)
+
+def entrada_historico(versao_dados, versao_base=None):
+    """Entrada do histórico que produziu versao_dados (a partir de versao_base, se informada)"""
+    for entrada in reversed(historico_versoes()):
+        if entrada['versao'] == versao_dados and (versao_base is None or entrada['versao_base'] == versao_base):
+            return entrada
+    return None
+
+def carregar_versao(identificador):
+    """Dataset processado de uma versão arquivada (consultas e relatórios sobre versões antigas)"""
+    for entrada in historico_versoes():
+        if entrada['id'] == identificador:
+            return processar_arquivo_dados(entrada['arquivo'])
+    raise KeyError(f"versão não encontrada no histórico: {identificador}")
+
+def _codigos_ibge(dados, nome):
+    """Códigos IBGE (CD_MUN) de um CSV bruto como inteiros; exige códigos presentes e únicos"""
+    if 'CD_MUN' not in dados.columns:
+        raise ValueError(f"CSV {nome} sem a coluna CD_MUN (rode: python precificacao_cli.py reconciliar)")
+    codigos = pd.to_numeric(dados['CD_MUN'], errors='coerce')
+    if codigos.isna().any() or codigos.duplicated().any():
+        raise ValueError(f"CSV {nome} com CD_MUN ausente, inválido ou repetido")
+    return pd.Index(codigos.astype(np.int64))
+
+def diferenca_por_municipio(base, novo):
+    """
+    Diferença por código IBGE entre dois CSVs de precificação lidos como texto
+
+    Retorna {'adicionados', 'removidos': códigos, 'alterados': {código: [colunas]},
+             'colunas_adicionadas', 'colunas_removidas', 'mesma_ordem', 'incremental'}
+    """
+    codigos_base, codigos_novo = _codigos_ibge(base, 'atual'), _codigos_ibge(novo, 'novo')
+    colunas = [coluna for coluna in novo.columns if coluna in base.columns]
+
+    comuns = codigos_novo.intersection(codigos_base, sort=False)
+    antigos = base[colunas].set_axis(codigos_base).loc[comuns]
+    atuais = novo[colunas].set_axis(codigos_novo).loc[comuns]
+    ausentes = antigos.isna().to_numpy() & atuais.isna().to_numpy()
+    diferentes = (antigos.to_numpy() != atuais.to_numpy()) & ~ausentes
+
+    alterados = {
+        int(codigo): [colunas[j] for j in np.flatnonzero(linha)]
+        for codigo, linha in zip(comuns, diferentes) if linha.any()
+    }
+    diferenca = {
+        'adicionados': [int(codigo) for codigo in codigos_novo.difference(codigos_base, sort=False)],
+        'removidos': [int(codigo) for codigo in codigos_base.difference(codigos_novo, sort=False)],
+        'alterados': alterados,
+        'colunas_adicionadas': [coluna for coluna in novo.columns if coluna not in base.columns],
+        'colunas_removidas': [coluna for coluna in base.columns if coluna not in novo.columns],
+        'mesma_ordem': codigos_base.equals(codigos_novo),
+    }
+    diferenca['incremental'] = (
+        diferenca['mesma_ordem'] and not diferenca['colunas_adicionadas'] and not diferenca['colunas_removidas']
+    )
+    return diferenca
+
+def aplicar_delta(df, delta_bruto):
+    """
+    Aplica ao dataset processado as linhas alteradas (CSV bruto com as mesmas colunas)
+
+    Retorna (novo dataset, delta) com delta = {'anterior', 'posicoes', 'colunas'}, usado
+    pelos caches derivados para atualizar só as linhas e colunas afetadas
+    """
+    alteradas = processar_dados_brutos(delta_bruto)
+    if list(alteradas.columns) != list(df.columns):
+        raise ValueError("delta com colunas diferentes do dataset ativo")
+    posicoes = pd.Index(df['Codigo_Municipio']).get_indexer(alteradas['Codigo_Municipio'])
+    if (posicoes < 0).any():
+        raise ValueError("delta com municípios fora do dataset ativo")
+
+    # Cópia rasa: as colunas inalteradas continuam compartilhando os buffers da versão anterior
+    novo = df.copy(deep=False)
+    colunas = set()
+    for coluna in alteradas.columns:
+        atuais, valores = df[coluna].iloc[posicoes], alteradas[coluna]
+        iguais = (atuais.to_numpy() == valores.to_numpy()) | (atuais.isna().to_numpy() & valores.isna().to_numpy())
+        if iguais.all():
+            continue
+        serie = df[coluna].copy()
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.cat.add_categories(pd.Index(valores.dropna().unique()).difference(serie.cat.categories))
+            valores = valores.astype(object)
+        serie.iloc[posicoes] = valores.to_numpy()
+        novo[coluna] = serie
+        colunas.add(coluna)
+
+    return novo, {'anterior': df, 'posicoes': posicoes.astype(np.intp), 'colunas': colunas}
+
+# =============================================================================
+# RECARGA A QUENTE DOS DADOS
+# =============================================================================
+
+# Observador do arquivo de dados: a cada INTERVALO_OBSERVADOR_DADOS segundos compara a
+# versão (nome, tamanho, mtime) do CSV com a ativa. Uma versão nova só é carregada depois
+# de ficar estável por duas verificações seguidas (arquivo já terminou de ser gravado);
+# o dataset e os caches derivados são montados nesta thread e só então trocados de uma
+# vez, de modo que as sessões passam para a nova versão no próximo rerun sem esperar.
+INTERVALO_OBSERVADOR_DADOS = 5
+
+# Caches indexados por (_df, versao_dados), liberados quando a versão sai de uso
+CACHES_POR_VERSAO = [
+    indice_busca_municipios,
+    faixas_dataset,
+    indice_ranking,
+    valores_filtros_numericos,
+    impressoes_colunas,
+    memoria_dataset,
+    dataset_colunar,
+]
+
+def liberar_versao(df):
+    """Remove dos caches do processo as entradas de uma versão que saiu de uso"""
+    versao_dados = df.attrs.get('versao_dados')
+    for funcao in CACHES_POR_VERSAO:
+        funcao.clear(None, versao_dados)
+    calcular_estatisticas.clear(None, chave_dados_completos(df))
+
+def recarregar_dados(estado, csv_file):
+    """
+    Carrega a versão nova, prepara os caches e troca o dataset ativo; retorna segundos
+
+    Se o histórico tiver um delta da versão ativa para a nova, só as linhas alteradas são processadas
+    """
+    inicio = time.perf_counter()
+    versao_dados = versao_arquivo_dados(csv_file)
+    novo, delta, modo = None, None, 'completa'
+    entrada = entrada_historico(versao_dados, estado['versao'])
+    if entrada and entrada.get('delta') and not estado['df'].empty:
+        try:
+            novo, delta = aplicar_delta(estado['df'], pd.read_csv(entrada['delta'], dtype=str))
+            novo.attrs['versao_dados'] = versao_dados
+            modo = f"incremental ({len(delta['posicoes'])} município(s))"
+        except Exception as e:
+            # Delta inconsistente com o dataset ativo: recarga completa
+            print(f"Delta da versão {entrada['id']} ignorado: {e}")
+            novo, delta = None, None
+    if novo is None:
+        try:
+            novo = processar_arquivo_dados(
+                csv_file, progresso=lambda linhas, fracao: estado.update(progresso=fracao)
+            )
+        finally:
+            estado['progresso'] = None
+    if novo.empty:
+        raise ValueError("arquivo sem linhas")
+    preparar_versao(novo, delta=delta)
+
+    with estado['trava']:
+        anterior = estado['df']
+        estado['df'] = novo
+        estado['versao'] = novo.attrs.get('versao_dados')
+    segundos = time.perf_counter() - inicio
+    estado['recargas'] = estado['recargas'][-9:] + [
+        {'versao': estado['versao'], 'modo': modo, 'segundos': segundos, 'horario': datetime.now()}
+    ]
+
+    # Sessões em rerun ainda podem usar a versão anterior; os caches dela são recalculados
+    # sob demanda nesse caso e voltam a ser descartados pelo limite de entradas
+    if anterior.attrs.get('versao_dados') != estado['versao']:
+        liberar_versao(anterior)
+    return segundos
+
+def observar_arquivo_dados(estado):
+    """Laço da thread observadora: detecta versões novas do CSV e as coloca no ar"""
+    candidata = None
+    while not estado['parar'].wait(INTERVALO_OBSERVADOR_DADOS):
+        try:
+            csv_file = localizar_arquivo_dados()
+            versao_dados = versao_arquivo_dados(csv_file) if csv_file else None
+            if versao_dados in (None, estado['versao'], estado['versao_rejeitada']):
+                candidata = None
+                continue
+            if versao_dados != candidata:
+                candidata = versao_dados
+                continue
+            recarregar_dados(estado, csv_file)
+            estado['erro'] = None
+            candidata = None
+        except Exception as e:
+            # Mantém a versão ativa; a mesma versão só é tentada de novo se o arquivo mudar
+            estado['erro'] = f"{candidata}: {e}"
+            estado['versao_rejeitada'] = candidata
+            candidata = None
+
 # =============================================================================
 # INTERFACE PRINCIPAL E CONTROLE DE APLICAÇÃO  
 # =============================================================================
 
+def preparar_versao(df, tempos=None, delta=None):
+    """
+    Calcula os caches derivados de uma versão do dataset (busca, estatísticas, faixas,
+    ranking, filtros, impressões das colunas e Parquet); retorna {etapa: segundos}
+
+    delta: atualização incremental em relação à versão anterior (ver aplicar_delta)
+    """
+    tempos = {} if tempos is None else tempos
+    versao_dados = df.attrs.get('versao_dados')
+
+    inicio = time.perf_counter()
+    indice_busca_municipios(df, versao_dados, _delta=delta)
+    tempos['indice_busca'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    calcular_estatisticas(df, chave_dados_completos(df))
+    tempos['estatisticas'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    faixas_dataset(df, versao_dados, _delta=delta)
+    tempos['faixas'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indice_ranking(df, versao_dados, _delta=delta)
+    tempos['indice_ranking'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    valores_filtros_numericos(df, versao_dados, _delta=delta)
+    impressoes_colunas(df, versao_dados, _delta=delta)
+    tempos['filtros'] = time.perf_counter() - inicio
+
+    if DUCKDB_AVAILABLE:
+        inicio = time.perf_counter()
+        dataset_colunar(df, versao_dados)
+        tempos['dataset_colunar'] = time.perf_counter() - inicio
+
+    return tempos
+
+# Aquecimento: preenche os caches do processo (dados, índice de busca, estatísticas, índice de ranking,
+# Parquet do construtor de consultas, geometria indexada por código IBGE e bibliotecas do mapa) antes da primeira sessão. Executado uma vez por
+# processo no início de main(); o script de gerenciamento só considera o servidor
+# pronto quando /_stcore/script-health-check responde (ver manage_dashboard.sh).
+def executar_aquecimento():
+    """
+    Executa as etapas de aquecimento em sequência
+
+    Retorna {etapa: segundos}; etapas sem efeito (ex.: sem GeoPandas) são omitidas
+    """
+    tempos = {}
+
+    inicio = time.perf_counter()
+    df = dataset_base()
+    tempos['dados'] = time.perf_counter() - inicio
+    if df.empty:
+        return tempos
+
+    preparar_versao(df, tempos)
+
+    if GEOPANDAS_AVAILABLE:
+        inicio = time.perf_counter()
+        indice_geometria()
+        tempos['geometria'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    import plotly.express  # noqa: F401
+    import folium  # noqa: F401
+    import streamlit_folium  # noqa: F401
+    tempos['bibliotecas_mapa'] = time.perf_counter() - inicio
+
+    return tempos
+
+@st.cache_resource(show_spinner="Preparando dados do painel...")
+def aquecer_caches():
+    """Aquecimento executado uma única vez por processo do servidor"""
+    return executar_aquecimento()
+
 def main():
     # Header principal centralizado e bonito
+    import plotly.express as px
+    from streamlit_folium import st_folium
+
+    preparar_ingestao_em_blocos()
+    aquecer_caches()
+
     st.markdown("""
     <div class="header-container">
         <h1 class="main-header">Dashboard de Precificação<br>Municípios de Alagoas</h1>
     </div>
     """, unsafe_allow_html=True)
     
-    # Carrega os dados primeiro
-    df = load_data()
+    # Carrega os dados primeiro (instância compartilhada por todas as sessões)
+    df = dataset_base()
     
     if df.empty:
         st.error("❌ Não foi possível carregar os dados. Verifique se o arquivo CSV está no diretório correto.")
         return
     
+    # Versão nova colocada no ar pelo observador: avisa e descarta seleções que deixaram de existir
+    versao_sessao = st.session_state.get('versao_dados_sessao')
+    if versao_sessao is not None and versao_sessao != df.attrs.get('versao_dados'):
+        opcoes_validas = set(indice_busca_municipios(df, df.attrs.get('versao_dados'))['opcoes'])
+        st.session_state.municipios_selecionados = [
+            municipio for municipio in st.session_state.get('municipios_selecionados', [])
+            if municipio in opcoes_validas
+        ]
+        st.toast("🔄 Dados atualizados para a versão mais recente")
+    st.session_state.versao_dados_sessao = df.attrs.get('versao_dados')
+    
     # Inicializar valores padrão no session_state se não existirem
     if 'municipios_selecionados' not in st.session_state:
         st.session_state.municipios_selecionados = []
@@ -4017,11 +5928,12 @@ def main():
                 col_municipio = col
                 break
         
-        if col_municipio:
-            municipios_serie = df[col_municipio]
-            municipios_originais = sorted(municipios_serie.unique()) if hasattr(municipios_serie, 'unique') else []
-        else:
-            municipios_originais = []
+        # Opções do seletor vêm do índice de busca (calculado uma vez por versão dos dados)
+        indice_busca = indice_busca_municipios(df, df.attrs.get('versao_dados'))
+        municipios_originais = indice_busca['opcoes'] if col_municipio else []
+        
+        # Limites dos sliders a partir das colunas já limpas (uma vez por versão dos dados)
+        valores_sliders = valores_filtros_numericos(df, df.attrs.get('versao_dados'))
         
         # Seleção de UF (preparado para futuras expansões)
         ufs_disponiveis = ["AL"]  # No futuro: ["AL", "PE", "SE", "BA", etc.]
@@ -4044,7 +5956,7 @@ def main():
         # População
         if 'Populacao' in df.columns:
             # Usar clean_brazilian_number para garantir conversão correta
-            pop_clean = df['Populacao'].apply(clean_brazilian_number).fillna(0)
+            pop_clean = valores_sliders['Populacao']
             pop_valid = pop_clean[pop_clean > 0]
             
             if not pop_valid.empty:
@@ -4074,7 +5986,7 @@ def main():
         
         # Nota média
         if 'Nota_Media' in df.columns:
-            nota_clean = pd.to_numeric(df['Nota_Media'], errors='coerce').fillna(0)
+            nota_clean = valores_sliders['Nota_Media']
             nota_valid = nota_clean[nota_clean > 0]
             
             if not nota_valid.empty:
@@ -4101,7 +6013,7 @@ def main():
         # Valor por área
         if 'Valor_Municipal_Area' in df.columns:
             # Usar clean_brazilian_number para garantir conversão correta
-            area_values = df['Valor_Municipal_Area'].apply(clean_brazilian_number).fillna(0)
+            area_values = valores_sliders['Valor_Municipal_Area']
             area_valid = area_values[area_values > 0]
             
             if not area_valid.empty:
@@ -4134,7 +6046,7 @@ def main():
         # Área Georef
         if 'Area_Georreferenciada' in df.columns:
             # Usar clean_brazilian_number para garantir conversão correta
-            area_georef_values = df['Area_Georreferenciada'].apply(clean_brazilian_number).fillna(0)
+            area_georef_values = valores_sliders['Area_Georreferenciada']
             area_georef_valid = area_georef_values[area_georef_values > 0]
             
             if not area_georef_valid.empty:
@@ -4174,7 +6086,7 @@ def main():
             st.rerun()
     # Aplica filtros com indicador de carregamento
     with st.spinner("Aplicando filtros..."):
-        df_original = df.copy()  # Manter cópia original para estatísticas
+        df_original = df  # Dataset completo para estatísticas (compartilhado, não é alterado)
         
         # Obter valores dos filtros do session_state
         municipios_selecionados = st.session_state.get('municipios_selecionados', [])
@@ -4187,7 +6099,7 @@ def main():
         pop_range_val = (int(pop_range_k[0] * 1000), int(pop_range_k[1] * 1000))
     else:
         if 'Populacao' in df.columns:
-            pop_clean = df['Populacao'].apply(clean_brazilian_number).fillna(0)
+            pop_clean = valores_sliders['Populacao']
             pop_valid = pop_clean[pop_clean > 0]
             if not pop_valid.empty:
                 pop_range_val = (int(pop_valid.min()), int(pop_valid.max()))
@@ -4201,7 +6113,7 @@ def main():
         nota_range_val = st.session_state['nota_range']
     else:
         if 'Nota_Media' in df.columns:
-            nota_clean = pd.to_numeric(df['Nota_Media'], errors='coerce').fillna(0)
+            nota_clean = valores_sliders['Nota_Media']
             nota_range_val = (float(nota_clean.min()), float(nota_clean.max()))
         else:
             nota_range_val = (0, 0)
@@ -4212,7 +6124,7 @@ def main():
         valor_range_val = (valor_range_mi[0] * 1_000_000, valor_range_mi[1] * 1_000_000)
     else:
         if 'Valor_Municipal_Area' in df.columns:
-            valor_clean = df['Valor_Municipal_Area'].apply(clean_brazilian_number).fillna(0)
+            valor_clean = valores_sliders['Valor_Municipal_Area']
             valor_valid = valor_clean[valor_clean > 0]
             if not valor_valid.empty:
                 valor_range_val = (float(valor_valid.min()), float(valor_valid.max()))
@@ -4227,7 +6139,7 @@ def main():
         georef_range_val = (georef_range_ha[0] * 10000, georef_range_ha[1] * 10000)
     else:
         if 'Area_Georreferenciada' in df.columns:
-            georef_clean = df['Area_Georreferenciada'].apply(clean_brazilian_number).fillna(0)
+            georef_clean = valores_sliders['Area_Georreferenciada']
             georef_valid = georef_clean[georef_clean > 0]
             if not georef_valid.empty:
                 georef_range_val = (float(georef_valid.min()), float(georef_valid.max()))
@@ -4244,7 +6156,9 @@ def main():
         pop_range_val, 
         nota_range_val, 
         valor_range_val,
-        georef_range_val
+        georef_range_val,
+        indice_busca=indice_busca,
+        valores_numericos=valores_sliders
     )
     
     # Verificar se há dados após filtros
@@ -4252,500 +6166,535 @@ def main():
         st.warning("Nenhum município corresponde aos filtros aplicados. Tente ajustar os critérios.")
         df_filtered = df_original  # Usar dados originais se filtros resultarem em conjunto vazio
     
+    # Chave do conjunto filtrado: versão dos dados + linhas resultantes. Combinações de
+    # filtros que chegam aos mesmos municípios compartilham estatísticas, consultas e tabelas;
+    # sem filtro efetivo, vale a chave dos dados completos (a mesma preenchida pelo aquecimento)
+    if len(df_filtered) == len(df_original):
+        chave_filtro = chave_dados_completos(df_original)
+    else:
+        chave_filtro = (df_original.attrs.get('versao_dados'), impressao_linhas(df_filtered, df_original))
+    
+    with st.sidebar:
+        exibir_painel_memoria(df_original, df_filtered)
+    
     # Usar dados filtrados para todas as visualizações
     df = df_filtered
     
+    # Estatísticas do conjunto filtrado (calculadas uma vez e lidas por todas as abas)
+    estatisticas = calcular_estatisticas(df_filtered, chave_filtro)
+    
     # Métricas de visão geral
     st.markdown("<h2 style='text-align: center;'>Visão Geral</h2>", unsafe_allow_html=True)
-    create_overview_metrics(df)
+    create_overview_metrics(df, estatisticas)
     
     st.markdown("---")
     
-    # Tabs para diferentes análises focadas em precificação
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Mapa", "Ranking", "Distribuição", "Dados", "Recomendação", "Relatório"])
+    # Tabs para diferentes análises focadas em precificação. Com on_change="rerun" o
+    # Streamlit acompanha a aba selecionada e só o conteúdo dela é executado (tabN.open);
+    # trocar de aba dispara um rerun que constrói a aba escolhida
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
+        ["Mapa", "Ranking", "Distribuição", "Dados", "Recomendação", "Relatório"],
+        key="aba_principal",
+        on_change="rerun"
+    )
     
     with tab1:
-        st.markdown("<h3 style='text-align: center;'>Mapa Interativo dos Municípios</h3>", unsafe_allow_html=True)
+        if tab1.open:
+            st.markdown("<h3 style='text-align: center;'>Mapa Interativo dos Municípios</h3>", unsafe_allow_html=True)
         
-        # Informações sobre filtros aplicados
-        total_municipios = len(df_original) if 'df_original' in locals() else len(df)
-        municipios_filtrados = len(df_filtered)
+            # Informações sobre filtros aplicados
+            total_municipios = len(df_original) if 'df_original' in locals() else len(df)
+            municipios_filtrados = len(df_filtered)
         
         
-        # Criar e exibir o mapa em tela cheia
-        # Mostrar municípios filtrados no mapa
-        with st.spinner("Carregando mapa interativo..."):
-            try:
-                # Usar df_filtered para mostrar apenas municípios que atendem aos filtros
-                interactive_map = create_interactive_map(df_filtered, df_original)
-                # Mapa ocupando toda a largura da tela
-                st_folium(interactive_map, height=600, width='stretch')
+            # Criar e exibir o mapa em tela cheia
+            # Mostrar municípios filtrados no mapa
+            with st.spinner("Carregando mapa interativo..."):
+                try:
+                    # Usar df_filtered para mostrar apenas municípios que atendem aos filtros
+                    # (reconstruído só quando os municípios filtrados ou os dados mudam)
+                    interactive_map = obter_visao('mapa', df_filtered, df_original)
+                    # Mapa ocupando toda a largura da tela
+                    st_folium(interactive_map, height=600, width='stretch')
                 
-            except Exception as e:
-                st.error(f"❌ Erro ao carregar o mapa: {str(e)}")
-                st.info("Dica: Certifique-se de que os dados de localização estão disponíveis.")
+                except Exception as e:
+                    st.error(f"❌ Erro ao carregar o mapa: {str(e)}")
+                    st.info("Dica: Certifique-se de que os dados de localização estão disponíveis.")
         
-        if len(df_filtered) == 0:
-            st.warning("⚠️ Nenhum município encontrado com os filtros aplicados. Ajuste os filtros para visualizar o mapa.")
+            if len(df_filtered) == 0:
+                st.warning("⚠️ Nenhum município encontrado com os filtros aplicados. Ajuste os filtros para visualizar o mapa.")
 
     with tab2:
-        st.markdown("<h3 style='text-align: center;'>Ranking dos Municípios por Valor</h3>", unsafe_allow_html=True)
+        if tab2.open:
+            st.markdown("<h3 style='text-align: center;'>Ranking dos Municípios por Valor</h3>", unsafe_allow_html=True)
         
-        # Dois gráficos lado a lado
-        col1, col2 = st.columns(2)
+            # Dois gráficos lado a lado
+            col1, col2 = st.columns(2)
         
-        with col1:
-            with st.spinner("Gerando gráfico dos maiores valores..."):
-                fig_ranking = create_value_ranking_chart(df_filtered)
-                if fig_ranking:
-                    st.plotly_chart(fig_ranking, use_container_width=True, config=PLOTLY_CONFIG)
+            with col1:
+                with st.spinner("Gerando gráfico dos maiores valores..."):
+                    fig_ranking = obter_visao('ranking_maiores', df_filtered, df_original)
+                    if fig_ranking:
+                        st.plotly_chart(fig_ranking, use_container_width=True, config=PLOTLY_CONFIG)
         
-        with col2:
-            with st.spinner("Gerando gráfico dos menores valores..."):
-                fig_lowest = create_lowest_value_ranking_chart(df_filtered)
-                if fig_lowest:
-                    st.plotly_chart(fig_lowest, use_container_width=True, config=PLOTLY_CONFIG)
+            with col2:
+                with st.spinner("Gerando gráfico dos menores valores..."):
+                    fig_lowest = obter_visao('ranking_menores', df_filtered, df_original)
+                    if fig_lowest:
+                        st.plotly_chart(fig_lowest, use_container_width=True, config=PLOTLY_CONFIG)
         
-        # Resumo estatístico abaixo dos gráficos
-        st.markdown("---")
-        st.markdown("<h4 style='text-align: center;'>Resumo Estatístico</h4>", unsafe_allow_html=True)
+            # Resumo estatístico abaixo dos gráficos
+            st.markdown("---")
+            st.markdown("<h4 style='text-align: center;'>Resumo Estatístico</h4>", unsafe_allow_html=True)
         
-        col_stats1, col_stats2, col_stats3, col_stats4 = st.columns(4)
+            col_stats1, col_stats2, col_stats3, col_stats4 = st.columns(4)
         
-        if 'Valor_Municipal_Area' in df_filtered.columns:
-            valores_clean = df_filtered['Valor_Municipal_Area'].apply(clean_brazilian_number)
-            valores_valid = valores_clean.dropna()
+            if 'Valor_Municipal_Area' in df_filtered.columns:
+                est_valor = estatisticas['valor']
             
-            if not valores_valid.empty:
-                with col_stats1:
-                    st.metric("Maior Valor", f"R$ {valores_valid.max()/1_000_000:.1f}M".replace('.', ','))
+                if est_valor:
+                    with col_stats1:
+                        st.metric("Maior Valor", f"R$ {est_valor['maximo']/1_000_000:.1f}M".replace('.', ','))
                 
-                with col_stats2:
-                    st.metric("Menor Valor", f"R$ {valores_valid.min()/1_000_000:.1f}M".replace('.', ','))
+                    with col_stats2:
+                        st.metric("Menor Valor", f"R$ {est_valor['minimo']/1_000_000:.1f}M".replace('.', ','))
                 
-                with col_stats3:
-                    media = valores_valid.mean()
-                    st.metric("Valor Médio", f"R$ {media/1_000_000:.1f}M".replace('.', ','))
+                    with col_stats3:
+                        st.metric("Valor Médio", f"R$ {est_valor['medio']/1_000_000:.1f}M".replace('.', ','))
                 
-                with col_stats4:
-                    total = valores_valid.sum()
-                    st.metric("Valor Total", f"R$ {total/1_000_000_000:.1f}B".replace('.', ','))
-            else:
-                st.info("Nenhum dado de valor disponível para os filtros aplicados")
-        
-        # Tabela detalhada
-        st.markdown("<h3 style='text-align: center;'>Dados Detalhados</h3>", unsafe_allow_html=True)
-        if 'Municipio' in df_filtered.columns and 'Valor_Municipal_Area' in df_filtered.columns:
-            display_df = df_filtered[['Municipio', 'Valor_Municipal_Area', 'Valor_Municipal_Perimetro']].copy()
-            display_df['Valor_Area_Limpo'] = display_df['Valor_Municipal_Area'].apply(clean_brazilian_number)
-            display_df['Valor_Perim_Limpo'] = display_df['Valor_Municipal_Perimetro'].apply(clean_brazilian_number)
-            display_df = display_df.sort_values('Valor_Area_Limpo', ascending=False)
-            
-            # Formata para exibição
-            display_df['Valor Área (R$ Mi)'] = (display_df['Valor_Area_Limpo'] / 1_000_000).round(1)
-            display_df['Valor Perímetro (R$ Mi)'] = (display_df['Valor_Perim_Limpo'] / 1_000_000).round(2)
-            
-            final_df = display_df[['Municipio', 'Valor Área (R$ Mi)', 'Valor Perímetro (R$ Mi)']]
-            st.dataframe(final_df, width='stretch')
+                    with col_stats4:
+                        st.metric("Valor Total", f"R$ {est_valor['total']/1_000_000_000:.1f}B".replace('.', ','))
+                else:
+                    st.info("Nenhum dado de valor disponível para os filtros aplicados")
+        
+            # Tabela detalhada
+            st.markdown("<h3 style='text-align: center;'>Dados Detalhados</h3>", unsafe_allow_html=True)
+            final_df = obter_visao('tabela_ranking', df_filtered, df_original)
+            if final_df is not None:
+                st.dataframe(final_df, width='stretch')
 
     with tab3:
-        st.markdown("<h1 style='text-align: center;'>Distribuição de Preços</h1>", unsafe_allow_html=True)
-        st.markdown("---")
+        if tab3.open:
+            st.markdown("<h1 style='text-align: center;'>Distribuição de Preços</h1>", unsafe_allow_html=True)
+            st.markdown("---")
         
 
         
-        # Layout em duas colunas para os gráficos principais
-        col1, col2 = st.columns(2)
+            # Layout em duas colunas para os gráficos principais
+            col1, col2 = st.columns(2)
         
-        with col1:
-            # Gráfico de distribuição principal
-            fig_distribution = create_price_distribution_chart(df_filtered)
-            if fig_distribution:
-                st.plotly_chart(fig_distribution, use_container_width=True, config=PLOTLY_CONFIG)
+            with col1:
+                # Gráfico de distribuição principal
+                fig_distribution = obter_visao('distribuicao_precos', df_filtered, df_original)
+                if fig_distribution:
+                    st.plotly_chart(fig_distribution, use_container_width=True, config=PLOTLY_CONFIG)
                 
-        with col2:
-            # Boxplot para mostrar estatísticas
-            fig_boxplot = create_price_boxplot(df_filtered)
-            if fig_boxplot:
-                st.plotly_chart(fig_boxplot, use_container_width=True, config=PLOTLY_CONFIG)
+            with col2:
+                # Boxplot para mostrar estatísticas
+                fig_boxplot = obter_visao('boxplot_precos', df_filtered, df_original)
+                if fig_boxplot:
+                    st.plotly_chart(fig_boxplot, use_container_width=True, config=PLOTLY_CONFIG)
         
         
-        st.markdown("---")
+            st.markdown("---")
         
-        # Análise por faixas de preço
-        st.markdown("<h3 style='text-align: left;'>Análise por Faixas de Preço</h3>", unsafe_allow_html=True)
-        if 'Valor_Municipal_Area' in df_filtered.columns:
-            valores_clean = df_filtered['Valor_Municipal_Area'].apply(clean_brazilian_number)
-            valores_valid = valores_clean.dropna()
+            # Análise por faixas de preço
+            st.markdown("<h3 style='text-align: left;'>Análise por Faixas de Preço</h3>", unsafe_allow_html=True)
+            if 'Valor_Municipal_Area' in df_filtered.columns:
+                # Contagem por faixas de preço (CLASSIFICACOES_FAIXAS['preco']), já calculada no pacote de estatísticas
+                faixas = estatisticas['faixas']
             
-            if not valores_valid.empty:
-                # Converte para milhões
-                valores_mi = valores_valid / 1_000_000
+                if faixas:
                 
-                # Define faixas fixas conforme especificado
-                faixas = {
-                    "Baixo (0 - 2M)": ((valores_mi >= 0) & (valores_mi <= 2)).sum(),
-                    "Médio (2 - 4M)": ((valores_mi > 2) & (valores_mi <= 4)).sum(),
-                    "Alto (> 4M)": (valores_mi > 4).sum()
-                }
+                    # Layout reorganizado com métricas e gráficos
+                    col_metrics, col_charts = st.columns([1, 2])
                 
-                # Layout reorganizado com métricas e gráficos
-                col_metrics, col_charts = st.columns([1, 2])
+                    with col_metrics:
+                        # Layout das faixas em lista vertical
+                        for faixa, count in faixas.items():
+                            st.metric(
+                                faixa, 
+                                f"{count} municípios"
+                            )
                 
-                with col_metrics:
-                    # Layout das faixas em lista vertical
-                    for faixa, count in faixas.items():
-                        st.metric(
-                            faixa, 
-                            f"{count} municípios"
-                        )
-                
-                with col_charts:
-                    # Cria dados para o gráfico de pizza
-                    labels = list(faixas.keys())
-                    values = list(faixas.values())
+                    with col_charts:
+                        # Cria dados para o gráfico de pizza
+                        labels = list(faixas.keys())
+                        values = list(faixas.values())
                     
-                    # Remove faixas vazias
-                    filtered_data = [(label, value) for label, value in zip(labels, values) if value > 0]
+                        # Remove faixas vazias
+                        filtered_data = [(label, value) for label, value in zip(labels, values) if value > 0]
                     
-                    if filtered_data:
-                        labels_filtered, values_filtered = zip(*filtered_data)
+                        if filtered_data:
+                            labels_filtered, values_filtered = zip(*filtered_data)
                         
-                        # Gráfico de Pizza (sem título)
-                        fig_pie = px.pie(
-                            values=values_filtered,
-                            names=labels_filtered,
-                            color_discrete_sequence=['#00D4AA', '#FFD700', '#FF6B6B']
-                        )
+                            # Gráfico de Pizza (sem título)
+                            fig_pie = px.pie(
+                                values=values_filtered,
+                                names=labels_filtered,
+                                color_discrete_sequence=['#00D4AA', '#FFD700', '#FF6B6B']
+                            )
                         
-                        fig_pie.update_traces(
-                            textposition='inside',
-                            textinfo='percent+label',
-                            textfont_size=12,
-                            hovertemplate='<b>%{label}</b><br>' +
-                                          'Municípios: %{value}<br>' +
-                                          'Percentual: %{percent}<br>' +
-                                          '<extra></extra>'
-                        )
+                            fig_pie.update_traces(
+                                textposition='inside',
+                                textinfo='percent+label',
+                                textfont_size=12,
+                                hovertemplate='<b>%{label}</b><br>' +
+                                              'Municípios: %{value}<br>' +
+                                              'Percentual: %{percent}<br>' +
+                                              '<extra></extra>'
+                            )
                         
-                        fig_pie.update_layout(
-                            height=400,
-                            font=dict(size=12),
-                            margin=dict(l=10, r=10, t=10, b=10),
-                            showlegend=False
-                        )
+                            fig_pie.update_layout(
+                                height=400,
+                                font=dict(size=12),
+                                margin=dict(l=10, r=10, t=10, b=10),
+                                showlegend=False
+                            )
                         
-                        st.plotly_chart(fig_pie, use_container_width=True, config=PLOTLY_CONFIG)
-                    else:
-                        st.info("📊 Nenhuma faixa de valor com dados disponíveis para o gráfico.")
+                            st.plotly_chart(fig_pie, use_container_width=True, config=PLOTLY_CONFIG)
+                        else:
+                            st.info("📊 Nenhuma faixa de valor com dados disponíveis para o gráfico.")
                 
-        else:
-            st.warning("⚠️ Dados de valor municipal não disponíveis para análise de faixas.")
+            else:
+                st.warning("⚠️ Dados de valor municipal não disponíveis para análise de faixas.")
 
     # Tab 4: Consultor de Dados
     with tab4:
-        st.markdown("# Construtor de Consultas")
-        create_query_builder_interface(df_filtered)
+        if tab4.open:
+            st.markdown("# Construtor de Consultas")
+            create_query_builder_interface(df_filtered, chave_filtro, df_original)
 
     # Tab 5: Recomendação AI
     with tab5:
-        st.markdown("### Sistema de Recomendação Inteligente")
+        if tab5.open:
+            st.markdown("### Sistema de Recomendação Inteligente")
         
-        # Análise contextual dos filtros aplicados
-        num_filtrados = len(df_filtered)
-        num_total = len(df_original)
+            # Análise contextual dos filtros aplicados
+            num_filtrados = len(df_filtered)
+            num_total = len(df_original)
         
-        # Interface de preferências
-        preferences = create_recommendation_interface(df_filtered)
+            # Interface de preferências
+            preferences = create_recommendation_interface(df_filtered)
         
-        # Sugestões automáticas baseadas nos filtros
-        if num_filtrados > 0:
-            st.markdown("#### Sugestões Baseadas nos Seus Filtros:")
-            
-            # Analisar padrões dos dados filtrados
-            if 'Valor_Municipal_Area' in df_filtered.columns:
-                valores = pd.to_numeric(df_filtered['Valor_Municipal_Area'], errors='coerce')
-                valor_medio = valores.mean()
+            # Sugestões automáticas baseadas nos filtros
+            if num_filtrados > 0:
+                st.markdown("#### Sugestões Baseadas nos Seus Filtros:")
                 
-        # Botão para gerar recomendações
-        if st.button("Gerar Recomendações", type="primary", key="ai_recommendations"):
-            # Log da ação (removido para evitar erros)
-            # log_user_interaction("ai_recommendation_generate", {"preferences": preferences, "filtered_data": num_filtrados})
+            # Botão para gerar recomendações
+            if st.button("Gerar Recomendações", type="primary", key="ai_recommendations"):
+                # Log da ação (removido para evitar erros)
+                # log_user_interaction("ai_recommendation_generate", {"preferences": preferences, "filtered_data": num_filtrados})
             
-            with st.spinner("Analisando dados e gerando recomendações..."):
-                # Gerar recomendações
-                recommendations = get_smart_recommendations(df_filtered, preferences, top_n=5)
+                with st.spinner("Analisando dados e gerando recomendações..."):
+                    # Gerar recomendações
+                    recommendations = get_smart_recommendations(df_filtered, preferences, top_n=5)
                 
-                # Exibir recomendações
-                display_recommendations(recommendations, df_filtered)
+                    # Exibir recomendações
+                    display_recommendations(recommendations, df_filtered)
                 
-                # Estatísticas das recomendações
-                if recommendations:
-                    st.markdown("### Resumo das Recomendações")
-                    col1, col2, col3, col4 = st.columns(4)
+                    # Estatísticas das recomendações
+                    if recommendations:
+                        st.markdown("### Resumo das Recomendações")
+                        col1, col2, col3, col4 = st.columns(4)
                     
-                    with col1:
-                        avg_score = sum([r['score'] for r in recommendations]) / len(recommendations)
-                        st.metric("Score Médio", f"{avg_score:.1f}/100")
+                        with col1:
+                            avg_score = sum([r['score'] for r in recommendations]) / len(recommendations)
+                            st.metric("Score Médio", f"{avg_score:.1f}/100")
                     
-                    with col2:
-                        valores = [r['data'].get('Valor_Municipal_Area', 0) for r in recommendations]
-                        avg_valor = sum(valores) / len(valores) if valores else 0
-                        st.metric("Valor Médio", formatar_valor_grande(avg_valor))
+                        with col2:
+                            valores = [r['data'].get('Valor_Municipal_Area', 0) for r in recommendations]
+                            avg_valor = sum(valores) / len(valores) if valores else 0
+                            st.metric("Valor Médio", formatar_valor_grande(avg_valor))
                     
-                    with col3:
-                        populacoes = [r['data'].get('Populacao', 0) for r in recommendations]
-                        avg_pop = sum(populacoes) / len(populacoes) if populacoes else 0
-                        st.metric("Pop. Média", formatar_valor_grande(avg_pop))
+                        with col3:
+                            populacoes = [r['data'].get('Populacao', 0) for r in recommendations]
+                            avg_pop = sum(populacoes) / len(populacoes) if populacoes else 0
+                            st.metric("Pop. Média", formatar_valor_grande(avg_pop))
                     
-                    with col4:
-                        notas = [r['data'].get('Nota_Media', 0) for r in recommendations]
-                        avg_nota = sum(notas) / len(notas) if notas else 0
-                        st.metric("Nota Média", f"{avg_nota:.1f}")
+                        with col4:
+                            notas = [r['data'].get('Nota_Media', 0) for r in recommendations]
+                            avg_nota = sum(notas) / len(notas) if notas else 0
+                            st.metric("Nota Média", f"{avg_nota:.1f}")
                     
-                    # Gráfico comparativo dos top 5
-                    st.markdown("### Comparação Visual dos Top 5")
+                        # Gráfico comparativo dos top 5
+                        st.markdown("### Comparação Visual dos Top 5")
                     
-                    municipios = [r['municipio'] for r in recommendations]
-                    scores = [r['score'] for r in recommendations]
+                        municipios = [r['municipio'] for r in recommendations]
+                        scores = [r['score'] for r in recommendations]
                     
-                    fig_comparison = px.bar(
-                        x=municipios,
-                        y=scores,
-                        title="Scores de Recomendação por Município",
-                        labels={'x': 'Município', 'y': 'Score (0-100)'},
-                        color=scores,
-                        color_continuous_scale='Viridis'
-                    )
+                        fig_comparison = px.bar(
+                            x=municipios,
+                            y=scores,
+                            title="Scores de Recomendação por Município",
+                            labels={'x': 'Município', 'y': 'Score (0-100)'},
+                            color=scores,
+                            color_continuous_scale='Viridis'
+                        )
                     
-                    fig_comparison.update_layout(
-                        xaxis_tickangle=-45,
-                        height=400,
-                        showlegend=False
-                    )
+                        fig_comparison.update_layout(
+                            xaxis_tickangle=-45,
+                            height=400,
+                            showlegend=False
+                        )
                     
-                    st.plotly_chart(fig_comparison, use_container_width=True, config=PLOTLY_CONFIG)
+                        st.plotly_chart(fig_comparison, use_container_width=True, config=PLOTLY_CONFIG)
     
     # Tab 7: PDF Personalizado
     with tab6:
-        st.markdown("# Gerador de PDF Personalizado")
+        if tab6.open:
+            st.markdown("# Gerador de PDF Personalizado")
         
-        st.markdown("---")
+            st.markdown("---")
         
-        # CONFIGURAÇÕES PRINCIPAIS
-        col_config1, col_config2 = st.columns(2)
+            # CONFIGURAÇÕES PRINCIPAIS
+            col_config1, col_config2 = st.columns(2)
         
-        with col_config1:
-            st.markdown("**Configurações**")
-            # Aplicar filtros ou usar dados completos  
-            usar_filtros = st.radio(
-                "Dados:",
-                ["Usar dados filtrados atuais", "Usar todos os dados"],
-                help="Escolha quais dados incluir no PDF"
-            )
+            with col_config1:
+                st.markdown("**Configurações**")
+                # Aplicar filtros ou usar dados completos  
+                usar_filtros = st.radio(
+                    "Dados:",
+                    ["Usar dados filtrados atuais", "Usar todos os dados"],
+                    help="Escolha quais dados incluir no PDF"
+                )
             
-            # Título personalizado
-            titulo_personalizado = st.text_input(
-                "Título:",
-                value="Relatório Municipal - Alagoas",
-                help="Título da capa"
-            )
+                # Título personalizado
+                titulo_personalizado = st.text_input(
+                    "Título:",
+                    value="Relatório Municipal - Alagoas",
+                    help="Título da capa"
+                )
         
-        with col_config2:
-            st.markdown("**Opções do Ranking**")
-            # Configurações de ranking
-            top_municipios_count = st.slider(
-                "Qtd no ranking:",
-                min_value=5, max_value=15, value=10
-            )
+            with col_config2:
+                st.markdown("**Opções do Ranking**")
+                # Configurações de ranking
+                top_municipios_count = st.slider(
+                    "Qtd no ranking:",
+                    min_value=5, max_value=15, value=10
+                )
             
-            criterio_ranking = st.selectbox(
-                "Critério:",
-                ["Valor Municipal", "População", "Valor per Capita"]
-            )
+                criterio_ranking = st.selectbox(
+                    "Critério:",
+                    ["Valor Municipal", "População", "Valor per Capita"]
+                )
         
-        st.markdown("---")
+            st.markdown("---")
         
-        # CONTEÚDO DO RELATÓRIO - Simplificado
-        st.markdown("**O que incluir no PDF:**")
+            # CONTEÚDO DO RELATÓRIO - Simplificado
+            st.markdown("**O que incluir no PDF:**")
         
-        col_content1, col_content2 = st.columns(2)
+            col_content1, col_content2 = st.columns(2)
         
-        with col_content1:
-            incluir_capa = st.checkbox("Capa Premium", value=True)
-            incluir_resumo_executivo = st.checkbox("Resumo Executivo", value=True)
-            incluir_ranking = st.checkbox("Ranking", value=True)
-            incluir_graficos = st.checkbox("Gráficos", value=True)
+            with col_content1:
+                incluir_capa = st.checkbox("Capa Premium", value=True)
+                incluir_resumo_executivo = st.checkbox("Resumo Executivo", value=True)
+                incluir_ranking = st.checkbox("Ranking", value=True)
+                incluir_graficos = st.checkbox("Gráficos", value=True)
         
-        with col_content2:
-            incluir_insights = st.checkbox("Insights", value=True)
-            incluir_recomendacoes = st.checkbox("Recomendações", value=True)
-            incluir_estatisticas = st.checkbox("Estatísticas", value=True)
-            incluir_metodologia = st.checkbox("Metodologia", value=False)
+            with col_content2:
+                incluir_insights = st.checkbox("Insights", value=True)
+                incluir_recomendacoes = st.checkbox("Recomendações", value=True)
+                incluir_estatisticas = st.checkbox("Estatísticas", value=True)
+                incluir_metodologia = st.checkbox("Metodologia", value=False)
         
-        # Mostrar status dos dados de forma concisa
-        col_config, col_info = st.columns([1, 1])
+            # Mostrar status dos dados de forma concisa
+            col_config, col_info = st.columns([1, 1])
         
-        with col_config:
-            st.markdown("### Configuração")
+            with col_config:
+                st.markdown("### Configuração")
             
-            # Definir colunas padrão
-            colunas_padrao = []
-            if 'Municipio' in df.columns:
-                colunas_padrao.append('Municipio')
-            if 'População' in df.columns:
-                colunas_padrao.append('População')
-            if 'Valor_Municipal_Area' in df.columns:
-                colunas_padrao.append('Valor_Municipal_Area')
-            if 'Nota_Media' in df.columns:
-                colunas_padrao.append('Nota_Media')
+                # Definir colunas padrão
+                colunas_padrao = []
+                if 'Municipio' in df.columns:
+                    colunas_padrao.append('Municipio')
+                if 'População' in df.columns:
+                    colunas_padrao.append('População')
+                if 'Valor_Municipal_Area' in df.columns:
+                    colunas_padrao.append('Valor_Municipal_Area')
+                if 'Nota_Media' in df.columns:
+                    colunas_padrao.append('Nota_Media')
             
-            # Se não encontrou as colunas padrão, usar as 5 primeiras
-            if not colunas_padrao:
-                colunas_padrao = df.columns[:5].tolist()
+                # Se não encontrou as colunas padrão, usar as 5 primeiras
+                if not colunas_padrao:
+                    colunas_padrao = df.columns[:5].tolist()
             
-            # Seleção de colunas
-            show_cols = st.multiselect(
-                "Colunas para Exportar",
-                options=df.columns.tolist(),
-                default=colunas_padrao,
-                key="export_columns_selector"
-            )
+                # Seleção de colunas
+                show_cols = st.multiselect(
+                    "Colunas para Exportar",
+                    options=df.columns.tolist(),
+                    default=colunas_padrao,
+                    key="export_columns_selector"
+                )
             
-            # Opções de exportação
-            incluir_todos_dados = st.checkbox(
-                "Incluir dados completos (sem filtros)"
-            )
+                # Opções de exportação
+                incluir_todos_dados = st.checkbox(
+                    "Incluir dados completos (sem filtros)"
+                )
         
-        st.markdown("---")
+            st.markdown("---")
         
-        # Visualização dos dados primeiro
-        tab_view1, tab_view2 = st.tabs(["Tabela", "Estatísticas"])
-        
-        with tab_view1:
-            if len(df) > 0 and show_cols:
-                # Criar DataFrame formatado para exibição
-                df_formatado_completo = formatar_dataframe_para_exibicao(df[show_cols], show_cols)
-                st.dataframe(
-                    df_formatado_completo, 
-                    width='stretch',
-                    height=500
-                )
-            elif not show_cols:
-                st.warning("Selecione colunas para visualizar")
-            else:
-                st.info("Nenhum dado disponível com os filtros selecionados")
+            # Visualização dos dados primeiro
+            tab_view1, tab_view2 = st.tabs(["Tabela", "Estatísticas"])
+        
+            with tab_view1:
+                if len(df) > 0 and show_cols:
+                    # Tabela paginada: só a página visível é formatada e enviada ao navegador
+                    df_tabela = df[show_cols]
+                    exibir_tabela_paginada(
+                        df_tabela,
+                        chave_filtro,
+                        "tabela_dados",
+                        formatar=lambda pagina: formatar_dataframe_para_exibicao(pagina, show_cols, df_referencia=df_tabela),
+                        altura=500
+                    )
+                elif not show_cols:
+                    st.warning("Selecione colunas para visualizar")
+                else:
+                    st.info("Nenhum dado disponível com os filtros selecionados")
         
-        with tab_view2:
-            if len(df) > 0:
-                # Identificar colunas numéricas
-                numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+            with tab_view2:
+                if len(df) > 0:
+                    # Identificar colunas numéricas (o código IBGE é identificador, não medida)
+                    numeric_cols = df.select_dtypes(include=[np.number]).columns.drop('Codigo_Municipio', errors='ignore').tolist()
                 
-                if numeric_cols:
-                    stats_df = df[numeric_cols].describe()
+                    if numeric_cols:
+                        stats_df = df[numeric_cols].describe()
                     
-                    # Criar DataFrame formatado para estatísticas
-                    stats_formatadas = pd.DataFrame(index=stats_df.index)
+                        # Criar DataFrame formatado para estatísticas
+                        stats_formatadas = pd.DataFrame(index=stats_df.index)
                     
-                    for coluna in stats_df.columns:
-                        if ('Valor_Municipal' in coluna or 'valor_municipal' in coluna.lower() or 
-                            any(palavra in coluna.lower() for palavra in ['preco', 'valor', 'custo', 'receita'])):
-                            # Se os valores são muito grandes, formatá-los
-                            if stats_df[coluna].max() > 1_000_000:
-                                stats_formatadas[coluna] = [
-                                    formatar_valor_grande(valor) if pd.notna(valor) else 'N/A' 
-                                    for valor in stats_df[coluna]
-                                ]
+                        for coluna in stats_df.columns:
+                            if ('Valor_Municipal' in coluna or 'valor_municipal' in coluna.lower() or 
+                                any(palavra in coluna.lower() for palavra in ['preco', 'valor', 'custo', 'receita'])):
+                                # Se os valores são muito grandes, formatá-los
+                                if stats_df[coluna].max() > 1_000_000:
+                                    stats_formatadas[coluna] = [
+                                        formatar_valor_grande(valor) if pd.notna(valor) else 'N/A' 
+                                        for valor in stats_df[coluna]
+                                    ]
+                                else:
+                                    stats_formatadas[coluna] = stats_df[coluna]
                             else:
                                 stats_formatadas[coluna] = stats_df[coluna]
-                        else:
-                            stats_formatadas[coluna] = stats_df[coluna]
                     
-                    st.dataframe(stats_formatadas, width='stretch')
+                        st.dataframe(stats_formatadas, width='stretch')
+                    else:
+                        st.warning("Nenhuma coluna numérica encontrada")
                 else:
-                    st.warning("Nenhuma coluna numérica encontrada")
-            else:
-                st.info("Aplique filtros para ver estatísticas")
+                    st.info("Aplique filtros para ver estatísticas")
         
-        st.markdown("---")
+            st.markdown("---")
         
-        st.markdown("---")
+            st.markdown("---")
         
-        # PREVIEW COMPACTO
-        df_para_pdf = df if usar_filtros == "Usar dados filtrados atuais" else df_original
+            # PREVIEW COMPACTO
+            df_para_pdf = df if usar_filtros == "Usar dados filtrados atuais" else df_original
         
-        # Contar seções selecionadas
-        secoes_selecionadas = []
-        if incluir_capa: secoes_selecionadas.append("Capa")
-        if incluir_resumo_executivo: secoes_selecionadas.append("Resumo")
-        if incluir_ranking: secoes_selecionadas.append("Ranking")
-        if incluir_graficos: secoes_selecionadas.append("Gráficos")
-        if incluir_insights: secoes_selecionadas.append("Insights")
-        if incluir_recomendacoes: secoes_selecionadas.append("Recomendações")
-        if incluir_estatisticas: secoes_selecionadas.append("Estatísticas")
-        if incluir_metodologia: secoes_selecionadas.append("Metodologia")
+            # Contar seções selecionadas
+            secoes_selecionadas = []
+            if incluir_capa: secoes_selecionadas.append("Capa")
+            if incluir_resumo_executivo: secoes_selecionadas.append("Resumo")
+            if incluir_ranking: secoes_selecionadas.append("Ranking")
+            if incluir_graficos: secoes_selecionadas.append("Gráficos")
+            if incluir_insights: secoes_selecionadas.append("Insights")
+            if incluir_recomendacoes: secoes_selecionadas.append("Recomendações")
+            if incluir_estatisticas: secoes_selecionadas.append("Estatísticas")
+            if incluir_metodologia: secoes_selecionadas.append("Metodologia")
         
 
         
-        st.markdown("---")
+            st.markdown("---")
         
-        # GERAÇÃO DO PDF
-        if len(df_para_pdf) == 0:
-            st.error("❌ Nenhum dado disponível. Ajuste os filtros.")
-        else:
-            if st.button("GERAR PDF PERSONALIZADO", type="primary", width='stretch'):
-                with st.spinner("Gerando relatório..."):
-                    try:
-                        pdf_personalizado = generate_pdf_report(df_para_pdf)
+            # GERAÇÃO DO PDF
+            if len(df_para_pdf) == 0:
+                st.error("❌ Nenhum dado disponível. Ajuste os filtros.")
+            else:
+                if st.button("GERAR PDF PERSONALIZADO", type="primary", width='stretch'):
+                    with st.spinner("Gerando relatório..."):
+                        try:
+                            # Apenas as seções marcadas são renderizadas (o rodapé é sempre incluído)
+                            secoes_pdf = [
+                                secao for opcao in secoes_selecionadas
+                                for secao in SECOES_POR_OPCAO_RELATORIO[opcao]
+                            ] + ['rodape']
+                            estatisticas_pdf = (
+                                estatisticas if usar_filtros == "Usar dados filtrados atuais"
+                                else calcular_estatisticas(df_original, chave_dados_completos(df_original))
+                            )
+                            pdf_personalizado, tempos_pdf = gerar_relatorio_pdf(
+                                df_para_pdf,
+                                secoes_pdf,
+                                estatisticas=estatisticas_pdf,
+                                df_base=df_original,
+                                titulo=titulo_personalizado,
+                                subtitulo="Análise Estratégica",
+                                top_count=top_municipios_count,
+                                criterio_ranking=criterio_ranking
+                            )
                         
-                        timestamp = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"relatorio_{len(df_para_pdf)}municipios_{timestamp}.pdf"
+                            timestamp = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
+                            filename = f"relatorio_{len(df_para_pdf)}municipios_{timestamp}.pdf"
                         
-                        st.success("✅ PDF gerado!")
+                            st.success(f"✅ PDF gerado em {sum(tempos_pdf.values()):.1f}s!")
                         
-                        st.download_button(
-                            label="BAIXAR PDF",
-                            data=pdf_personalizado,
-                            file_name=filename,
-                            mime="application/pdf",
-                            type="primary",
-                            width='stretch'
-                        )
+                            with st.expander("Tempo de geração por seção"):
+                                st.dataframe(
+                                    pd.DataFrame({
+                                        'Seção': [rotulo_etapa_relatorio(chave) for chave in tempos_pdf],
+                                        'Tempo (s)': [round(segundos, 3) for segundos in tempos_pdf.values()]
+                                    }),
+                                    hide_index=True,
+                                    width='stretch'
+                                )
                         
-                    except Exception as e:
-                        st.error(f"❌ Erro: {str(e)}")
-                        st.info("Tente desmarcar algumas opções de gráficos.")
+                            st.download_button(
+                                label="BAIXAR PDF",
+                                data=pdf_personalizado,
+                                file_name=filename,
+                                mime="application/pdf",
+                                type="primary",
+                                width='stretch'
+                            )
+                        
+                        except Exception as e:
+                            st.error(f"❌ Erro: {str(e)}")
+                            st.info("Tente desmarcar algumas opções de gráficos.")
         
-        # Downloads Complementares
-        st.markdown("---")
-        st.markdown("## Downloads Complementares")
+            # Downloads Complementares
+            st.markdown("---")
+            st.markdown("## Downloads Complementares")
         
-        col_export1, col_export3 = st.columns(2)
+            col_export1, col_export3 = st.columns(2)
         
-        with col_export1:
-            st.markdown("**Download Rápido**")
-            if len(df_para_pdf) > 0:
-                # CSV essencial
-                colunas_essenciais = ['Municipio', 'População', 'Valor_Municipal_Area']
-                colunas_disponiveis = [col for col in colunas_essenciais if col in df_para_pdf.columns]
+            with col_export1:
+                st.markdown("**Download Rápido**")
+                if len(df_para_pdf) > 0:
+                    # CSV essencial
+                    colunas_essenciais = ['Municipio', 'População', 'Valor_Municipal_Area']
+                    colunas_disponiveis = [col for col in colunas_essenciais if col in df_para_pdf.columns]
                 
-                if colunas_disponiveis:
-                    csv_simples = df_para_pdf[colunas_disponiveis].to_csv(index=False)
-                    st.download_button(
-                        label="CSV Dados",
-                        data=csv_simples,
-                        file_name=f"dados_{pd.Timestamp.now().strftime('%H%M')}.csv",
-                        mime="text/csv"
-                    )
-            else:
-                st.info("Sem dados disponíveis")
+                    if colunas_disponiveis:
+                        chave_exportacao = (
+                            chave_filtro if usar_filtros == "Usar dados filtrados atuais"
+                            else chave_dados_completos(df_original)
+                        )
+                        botao_exportacao(
+                            df_para_pdf[colunas_disponiveis],
+                            chave_exportacao,
+                            f"dados_{pd.Timestamp.now().strftime('%H%M')}",
+                            "relatorio_exportacao",
+                            rotulo="Baixar Dados"
+                        )
+                else:
+                    st.info("Sem dados disponíveis")
         
-        with col_export3:
-            st.markdown("**Status**")
-            if len(secoes_selecionadas) >= 4:
-                st.success("✅ Relatório completo")
-            else:
-                st.warning("⚠️ Relatório básico")
+            with col_export3:
+                st.markdown("**Status**")
+                if len(secoes_selecionadas) >= 4:
+                    st.success("✅ Relatório completo")
+                else:
+                    st.warning("⚠️ Relatório básico")
         
     # Footer com informações úteis
     st.markdown("---")
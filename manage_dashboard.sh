@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # Script para gerenciar o Dashboard de Precificação
-# Uso: ./manage_dashboard.sh [start|stop|restart|status|logs]
+# Uso: ./manage_dashboard.sh [start|stop|restart|status|ready|logs]
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 VENV_PATH="$SCRIPT_DIR/.venv"
@@ -9,6 +9,7 @@ DASHBOARD_FILE="$SCRIPT_DIR/dashboard_precificacao.py"
 LOG_FILE="$SCRIPT_DIR/streamlit.log"
 PID_FILE="$SCRIPT_DIR/streamlit.pid"
 PORT=8520
+READY_TIMEOUT=${READY_TIMEOUT:-120}
 
 case "$1" in
     start)
@@ -23,22 +24,26 @@ case "$1" in
             exit 1
         fi
         
-        # Inicia o servidor
+        # Inicia o servidor (script-health-check habilitado para a verificação de prontidão)
         nohup streamlit run "$DASHBOARD_FILE" \
             --server.port $PORT \
             --server.headless true \
             --server.runOnSave true \
+            --server.scriptHealthCheckEnabled true \
             --server.address localhost > "$LOG_FILE" 2>&1 &
         
         echo $! > "$PID_FILE"
-        sleep 3
         
-        if ps -p $(cat "$PID_FILE") > /dev/null 2>&1; then
+        # Aguarda o aquecimento dos caches: o endpoint de prontidão só responde
+        # depois que o script roda por completo
+        if python precificacao_cli.py aquecer --url "http://localhost:$PORT" --timeout "$READY_TIMEOUT" \
+            && ps -p $(cat "$PID_FILE") > /dev/null 2>&1; then
             echo "✅ Dashboard iniciado com sucesso!"
             echo "🌐 Acesse: http://localhost:$PORT"
             echo "📋 Logs: tail -f $LOG_FILE"
         else
-            echo "❌ Erro ao iniciar o dashboard"
+            echo "❌ Erro ao iniciar o dashboard (veja $LOG_FILE)"
+            kill $(cat "$PID_FILE") > /dev/null 2>&1
             rm -f "$PID_FILE"
             exit 1
         fi
@@ -81,6 +86,16 @@ case "$1" in
         fi
         ;;
         
+    ready)
+        # Verificação de prontidão (para balanceador de carga / orquestrador)
+        if curl -sf "http://localhost:$PORT/_stcore/script-health-check" > /dev/null; then
+            echo "✅ Dashboard pronto"
+        else
+            echo "❌ Dashboard não está pronto"
+            exit 1
+        fi
+        ;;
+        
     logs)
         echo "📋 Logs do Dashboard (Ctrl+C para sair):"
         tail -f "$LOG_FILE"
@@ -89,13 +104,14 @@ case "$1" in
     *)
         echo "🗺️  Dashboard de Precificação - Municípios de Alagoas"
         echo ""
-        echo "Uso: $0 {start|stop|restart|status|logs}"
+        echo "Uso: $0 {start|stop|restart|status|ready|logs}"
         echo ""
         echo "Comandos:"
-        echo "  start   - Inicia o dashboard"
+        echo "  start   - Inicia o dashboard e aguarda o aquecimento dos caches"
         echo "  stop    - Para o dashboard"
         echo "  restart - Reinicia o dashboard"
         echo "  status  - Verifica status do dashboard"
+        echo "  ready   - Verifica se o dashboard está pronto para receber acessos"
         echo "  logs    - Mostra logs em tempo real"
         echo ""
         echo "Exemplo: $0 start"
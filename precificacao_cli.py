@@ -0,0 +1,795 @@
+# =============================================================================
+# FERRAMENTAS DE LINHA DE COMANDO DO DASHBOARD DE PRECIFICAÇÃO
+# =============================================================================
+#
+# Uso:
+#   python precificacao_cli.py relatorios --por municipio --saida relatorios/
+#   python precificacao_cli.py relatorios --por uf --processos 4
+#   python precificacao_cli.py relatorios --por faixa --titulo "Relatório por Faixa"
+#   python precificacao_cli.py benchmark-importacao --repeticoes 5
+#   python precificacao_cli.py benchmark-formatacao --linhas 100000
+#   python precificacao_cli.py aquecer --url http://localhost:8520 --timeout 120
+#   python precificacao_cli.py centroides
+#   python precificacao_cli.py reconciliar --simular
+#   python precificacao_cli.py ingerir novos_precos.csv --simular
+#   python precificacao_cli.py versoes
+#   python precificacao_cli.py converter --arquivo dados/car_nacional.csv --linhas-por-bloco 100000
+#   python precificacao_cli.py relatorios --por faixa --versao 20250301-101500
+#
+# Os comandos reutilizam as funções do dashboard (dashboard_precificacao.py),
+# sem precisar abrir a interface do Streamlit.
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+# Diretório do projeto: o dashboard procura os dados em caminhos relativos ('dados/')
+DIRETORIO_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+# =============================================================================
+# GERAÇÃO DE RELATÓRIOS EM LOTE
+# =============================================================================
+
+# Estado de cada processo do pool (preenchido uma única vez pelo inicializador)
+_DF_WORKER = None
+_TITULO_WORKER = None
+
+
+def _importar_dashboard():
+    """Importa o módulo do dashboard a partir do diretório do projeto"""
+    if DIRETORIO_PROJETO not in sys.path:
+        sys.path.insert(0, DIRETORIO_PROJETO)
+    os.chdir(DIRETORIO_PROJETO)
+    import dashboard_precificacao
+    return dashboard_precificacao
+
+
+def _preparar_fontes():
+    """Carrega uma única vez o cache de fontes do matplotlib e os estilos do ReportLab"""
+    from matplotlib import font_manager
+    from reportlab.lib.styles import getSampleStyleSheet
+
+    font_manager.fontManager.ttflist  # força a leitura do cache de fontes
+    getSampleStyleSheet()
+
+
+def _inicializar_worker(df, titulo):
+    """Inicializador do pool: recebe o dataset já processado e prepara as fontes"""
+    global _DF_WORKER, _TITULO_WORKER
+    _importar_dashboard()
+    _DF_WORKER = df
+    _TITULO_WORKER = titulo
+    _preparar_fontes()
+
+
+def _gerar_relatorio_grupo(chave, rotulo, indices, caminho_pdf):
+    """Gera o PDF de um grupo de municípios dentro de um processo do pool"""
+    dashboard = _importar_dashboard()
+    inicio = time.perf_counter()
+    entrada = {
+        'chave': chave,
+        'rotulo': rotulo,
+        'arquivo': os.path.basename(caminho_pdf),
+        'municipios': len(indices),
+    }
+
+    try:
+        df_grupo = _DF_WORKER.loc[indices]
+        opcoes = {'titulo': _TITULO_WORKER, 'subtitulo': rotulo} if _TITULO_WORKER else {}
+        buffer, tempos = dashboard.gerar_relatorio_pdf(df_grupo, df_base=_DF_WORKER, **opcoes)
+
+        conteudo = buffer.getvalue()
+        with open(caminho_pdf, 'wb') as f:
+            f.write(conteudo)
+
+        entrada['bytes'] = len(conteudo)
+        entrada['status'] = 'ok'
+        entrada['tempos_secoes'] = {etapa: round(segundos, 3) for etapa, segundos in tempos.items()}
+    except Exception as e:
+        entrada['status'] = 'erro'
+        entrada['erro'] = str(e)
+
+    entrada['segundos'] = round(time.perf_counter() - inicio, 3)
+    return entrada
+
+
+def _slug(texto, normalizar_texto):
+    """Gera um nome de arquivo seguro a partir de um texto (sem acentos e espaços)"""
+    texto_normalizado = normalizar_texto(texto)
+    caracteres = [c if c.isalnum() else '-' for c in texto_normalizado]
+    return '-'.join(parte for parte in ''.join(caracteres).split('-') if parte) or 'sem-nome'
+
+
+def montar_grupos_relatorio(df, agrupamento, dashboard):
+    """
+    Divide o dataset nos grupos de relatório
+
+    Retorna lista de tuplas (chave, rótulo, índices do DataFrame)
+    """
+    grupos = []
+    col_municipio = dashboard.get_municipio_column(df)
+
+    if agrupamento == 'municipio':
+        for indice, row in df.iterrows():
+            codigo = row.get('Codigo_Municipio', indice)
+            nome = row[col_municipio] if col_municipio else str(codigo)
+            grupos.append((f"{codigo}_{_slug(nome, dashboard.normalizar_texto)}", nome, [indice]))
+
+    elif agrupamento == 'uf':
+        if 'UF' not in df.columns:
+            raise ValueError("Coluna 'UF' não encontrada nos dados")
+        for uf, df_uf in df.groupby('UF', sort=True, observed=True):
+            grupos.append((_slug(uf, dashboard.normalizar_texto), f"Estado {uf}", df_uf.index.tolist()))
+
+    elif agrupamento == 'faixa':
+        if 'Valor_Municipal_Area' not in df.columns:
+            raise ValueError("Coluna 'Valor_Municipal_Area' não encontrada nos dados")
+        codigos = dashboard.codigos_faixas(df, 'preco', df)
+        for codigo, rotulo in enumerate(dashboard.CLASSIFICACOES_FAIXAS['preco']['rotulos']):
+            indices = df.index[codigos == codigo].tolist()
+            if indices:
+                grupos.append((_slug(rotulo, dashboard.normalizar_texto), rotulo, indices))
+
+    else:
+        raise ValueError(f"Agrupamento desconhecido: {agrupamento}")
+
+    return grupos
+
+
+def comando_relatorios(args):
+    """Gera um relatório PDF por município, faixa de preço ou UF em um pool de processos"""
+    saida = os.path.abspath(args.saida)
+    dashboard = _importar_dashboard()
+
+    # O dataset é carregado uma única vez e enviado para cada processo do pool
+    if args.versao:
+        try:
+            df = dashboard.carregar_versao(args.versao)
+        except KeyError as e:
+            print(f"❌ {e.args[0]} (veja: python precificacao_cli.py versoes)", file=sys.stderr)
+            return 1
+    else:
+        df = dashboard.load_data()
+    if df.empty:
+        print("❌ Não foi possível carregar os dados.", file=sys.stderr)
+        return 1
+
+    grupos = montar_grupos_relatorio(df, args.por, dashboard)
+    if args.limite:
+        grupos = grupos[:args.limite]
+
+    os.makedirs(saida, exist_ok=True)
+    processos = args.processos or os.cpu_count() or 1
+    print(f"📄 Gerando {len(grupos)} relatório(s) por {args.por} com {processos} processo(s) em {saida}")
+
+    inicio = time.perf_counter()
+    entradas = []
+    with ProcessPoolExecutor(
+        max_workers=processos,
+        initializer=_inicializar_worker,
+        initargs=(df, args.titulo),
+    ) as executor:
+        futuros = [
+            executor.submit(
+                _gerar_relatorio_grupo,
+                chave,
+                rotulo,
+                indices,
+                os.path.join(saida, f"relatorio_{args.por}_{chave}.pdf"),
+            )
+            for chave, rotulo, indices in grupos
+        ]
+        for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+            entrada = futuro.result()
+            entradas.append(entrada)
+            status = '✅' if entrada['status'] == 'ok' else f"❌ {entrada.get('erro')}"
+            print(f"[{concluidos}/{len(grupos)}] {entrada['rotulo']} ({entrada['segundos']:.2f}s) {status}")
+
+    # Manifesto na ordem dos grupos (os processos terminam fora de ordem)
+    ordem = {chave: posicao for posicao, (chave, _, _) in enumerate(grupos)}
+    entradas.sort(key=lambda entrada: ordem[entrada['chave']])
+    falhas = [entrada for entrada in entradas if entrada['status'] != 'ok']
+
+    manifesto = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'agrupamento': args.por,
+        'titulo': args.titulo,
+        'processos': processos,
+        'total': len(entradas),
+        'sucesso': len(entradas) - len(falhas),
+        'falhas': len(falhas),
+        'duracao_segundos': round(time.perf_counter() - inicio, 3),
+        'relatorios': entradas,
+    }
+    caminho_manifesto = os.path.join(saida, 'manifesto.json')
+    with open(caminho_manifesto, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+    print(f"📋 Manifesto: {caminho_manifesto} ({manifesto['sucesso']} ok, {manifesto['falhas']} falha(s), "
+          f"{manifesto['duracao_segundos']:.1f}s)")
+    return 1 if falhas else 0
+
+
+# =============================================================================
+# BENCHMARK DE IMPORTAÇÃO (INICIALIZAÇÃO A FRIO)
+# =============================================================================
+
+# Pilhas pesadas que o dashboard só deve carregar quando o recurso é usado
+PILHAS_PESADAS = [
+    ('plotly', 'plotly.express'),
+    ('folium', 'folium'),
+    ('matplotlib', 'matplotlib.pyplot'),
+    ('reportlab', 'reportlab.platypus'),
+    ('geopandas', 'geopandas'),
+    ('requests', 'requests'),
+    ('seaborn', 'seaborn'),
+]
+
+
+def _medir_importacao(modulo, repeticoes):
+    """
+    Importa um módulo em processos Python novos e mede o tempo
+
+    Retorna {'segundos': mediana, 'carregados': pilhas pesadas presentes após a importação}
+    ou None se o módulo não puder ser importado
+    """
+    pacotes = [pacote for pacote, _ in PILHAS_PESADAS]
+    codigo = (
+        "import json, sys, time\n"
+        "inicio = time.perf_counter()\n"
+        f"import {modulo}\n"
+        "segundos = time.perf_counter() - inicio\n"
+        f"print(json.dumps({{'segundos': segundos, 'carregados': [p for p in {pacotes!r} if p in sys.modules]}}))\n"
+    )
+
+    medicoes = []
+    for _ in range(repeticoes):
+        processo = subprocess.run(
+            [sys.executable, '-c', codigo], cwd=DIRETORIO_PROJETO, capture_output=True, text=True
+        )
+        if processo.returncode != 0:
+            return None
+        medicoes.append(json.loads(processo.stdout.strip().splitlines()[-1]))
+
+    return {
+        'segundos': statistics.median(m['segundos'] for m in medicoes),
+        'carregados': medicoes[-1]['carregados'],
+    }
+
+
+def comando_benchmark_importacao(args):
+    """Mede o custo de importação a frio do dashboard e de cada pilha pesada"""
+    print(f"⏱️ Importação a frio (mediana de {args.repeticoes} processo(s) novo(s))")
+
+    resultado = _medir_importacao('dashboard_precificacao', args.repeticoes)
+    if resultado is None:
+        print("❌ Não foi possível importar dashboard_precificacao", file=sys.stderr)
+        return 1
+    carregados = ', '.join(resultado['carregados']) or 'nenhuma'
+    print(f"  {'dashboard_precificacao':<24} {resultado['segundos']:7.2f}s  (pilhas já carregadas: {carregados})")
+
+    print("  Custo isolado de cada pilha (pago no primeiro uso do recurso):")
+    for pacote, modulo in PILHAS_PESADAS:
+        medicao = _medir_importacao(modulo, args.repeticoes)
+        if medicao is None:
+            print(f"    {pacote:<22} {'não instalado':>8}")
+        else:
+            print(f"    {pacote:<22} {medicao['segundos']:7.2f}s")
+
+    return 0
+
+
+# =============================================================================
+# BENCHMARK DE FORMATAÇÃO PARA EXIBIÇÃO
+# =============================================================================
+
+def _formatar_por_celula(dashboard, df):
+    """Referência: formatação célula a célula (.apply) usada antes da versão vetorizada"""
+    import pandas as pd
+
+    df_formatado = df.copy()
+    for coluna in df_formatado.columns:
+        valores = pd.to_numeric(df_formatado[coluna], errors='coerce')
+        if 'populacao' in coluna.lower():
+            df_formatado[coluna] = valores.apply(
+                lambda x: dashboard.formatar_numero_brasileiro(x) if pd.notna(x) else 'N/A'
+            ).astype(str)
+        else:
+            df_formatado[coluna] = valores.apply(
+                lambda x: dashboard.formatar_valor_grande(x) if pd.notna(x) and x > 0 else 'N/A'
+            ).astype(str)
+    return df_formatado
+
+
+def comando_benchmark_formatacao(args):
+    """Compara a formatação vetorizada com a formatação célula a célula em um DataFrame sintético"""
+    import numpy as np
+    import pandas as pd
+
+    dashboard = _importar_dashboard()
+    gerador = np.random.default_rng(args.semente)
+    valores = 10 ** gerador.uniform(0, 10, args.linhas)
+    valores[gerador.random(args.linhas) < 0.02] = np.nan
+    df = pd.DataFrame({
+        'Valor_Municipal_Area': valores,
+        'Valor_Municipal_Perimetro': np.round(valores, 2),
+        'Populacao': gerador.integers(800, 1_000_000, args.linhas),
+    })
+
+    print(f"⏱️ Formatação para exibição ({args.linhas} linhas, melhor de {args.repeticoes})")
+    tempos = {}
+    resultados = {}
+    for nome, funcao in (
+        ('celula_a_celula', lambda: _formatar_por_celula(dashboard, df)),
+        ('vetorizada', lambda: dashboard.formatar_dataframe_para_exibicao(df)),
+    ):
+        medicoes = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            resultados[nome] = funcao()
+            medicoes.append(time.perf_counter() - inicio)
+        tempos[nome] = min(medicoes)
+        print(f"  {nome:<22} {tempos[nome]:7.3f}s")
+
+    print(f"  ganho: {tempos['celula_a_celula'] / tempos['vetorizada']:.1f}x")
+    if not resultados['celula_a_celula'].equals(resultados['vetorizada']):
+        print("❌ Saídas diferentes entre as duas formatações", file=sys.stderr)
+        return 1
+    print("✅ Saídas idênticas")
+    return 0
+
+
+# =============================================================================
+# AQUECIMENTO E PRONTIDÃO DO SERVIDOR
+# =============================================================================
+
+# Endpoint do Streamlit que executa o script do dashboard e responde "ok" quando ele
+# termina sem erro (exige --server.scriptHealthCheckEnabled true). Como main() chama
+# aquecer_caches(), a primeira resposta só chega com os caches do processo preenchidos.
+ENDPOINT_PRONTIDAO = '/_stcore/script-health-check'
+
+
+def _aguardar_servidor(url, timeout):
+    """
+    Consulta o endpoint de prontidão até responder 200 ou estourar o timeout
+
+    Retorna os segundos até ficar pronto ou None
+    """
+    import urllib.error
+    import urllib.request
+
+    endereco = url.rstrip('/') + ENDPOINT_PRONTIDAO
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < timeout:
+        try:
+            with urllib.request.urlopen(endereco, timeout=timeout) as resposta:
+                if resposta.status == 200:
+                    return time.perf_counter() - inicio
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(1)
+    return None
+
+
+def comando_aquecer(args):
+    """Executa o aquecimento dos caches e, com --url, aguarda o servidor ficar pronto"""
+    if args.url:
+        print(f"⏳ Aguardando {args.url.rstrip('/')}{ENDPOINT_PRONTIDAO} (timeout {args.timeout}s)")
+        segundos = _aguardar_servidor(args.url, args.timeout)
+        if segundos is None:
+            print("❌ Servidor não ficou pronto dentro do timeout", file=sys.stderr)
+            return 1
+        print(f"✅ Servidor pronto em {segundos:.1f}s")
+        return 0
+
+    # Sem servidor: valida dados e geometria e aquece os caches de disco e de fontes
+    dashboard = _importar_dashboard()
+    tempos = dashboard.executar_aquecimento()
+    if 'indice_busca' not in tempos:
+        print("❌ Não foi possível carregar os dados", file=sys.stderr)
+        return 1
+    _preparar_fontes()
+
+    print("🔥 Aquecimento concluído")
+    for etapa, segundos in tempos.items():
+        print(f"  {etapa:<22} {segundos:7.2f}s")
+    return 0
+
+
+# =============================================================================
+# TABELA DE CENTROIDES
+# =============================================================================
+
+def comando_centroides(args):
+    """Gera a tabela de centroides usada pelo mapa simplificado (requer GeoPandas)"""
+    dashboard = _importar_dashboard()
+    if not dashboard.GEOPANDAS_AVAILABLE:
+        print("❌ GeoPandas é necessário para ler o shapefile", file=sys.stderr)
+        return 1
+    if not os.path.exists(args.shapefile):
+        print(f"❌ Shapefile não encontrado: {args.shapefile}", file=sys.stderr)
+        return 1
+
+    inicio = time.perf_counter()
+    total = dashboard.gerar_tabela_centroides(args.shapefile, args.saida)
+    tamanho_kb = os.path.getsize(args.saida) / 1024
+    print(f"🗺️ {total} municípios gravados em {args.saida} ({tamanho_kb:.0f} KB, {time.perf_counter() - inicio:.1f}s)")
+    return 0
+
+
+# =============================================================================
+# RECONCILIAÇÃO DOS CÓDIGOS IBGE
+# =============================================================================
+
+def comando_reconciliar(args):
+    """Grava no CSV de precificação o CD_MUN das linhas que só trazem o nome do município"""
+    import pandas as pd
+
+    arquivo = os.path.abspath(args.arquivo) if args.arquivo else None
+    saida = os.path.abspath(args.saida) if args.saida else None
+    dashboard = _importar_dashboard()
+    arquivo = arquivo or dashboard.localizar_arquivo_dados()
+    if not arquivo or not os.path.exists(arquivo):
+        print(f"❌ CSV de precificação não encontrado: {arquivo}", file=sys.stderr)
+        return 1
+    tabela = dashboard.carregar_centroides()
+    if tabela is None:
+        print(f"❌ Tabela de centroides não encontrada: {dashboard.ARQUIVO_CENTROIDES} "
+              "(gere com: python precificacao_cli.py centroides)", file=sys.stderr)
+        return 1
+
+    dados = pd.read_csv(arquivo, dtype=str, keep_default_na=False, na_values=[''])
+    dados, relatorio = dashboard.reconciliar_codigos_municipios(dados, tabela)
+
+    print(f"🔎 {arquivo}: {len(dados)} linhas")
+    print(f"   ✅ {relatorio['validos']} com código IBGE válido")
+    print(f"   🧩 {relatorio['preenchidos']} preenchidas pelo nome + UF")
+    sem_correspondencia = relatorio['sem_correspondencia']
+    if sem_correspondencia:
+        print(f"   ⚠️ {len(sem_correspondencia)} sem correspondência: {', '.join(sorted(set(sem_correspondencia))[:10])}")
+
+    if args.simular or relatorio['preenchidos'] == 0:
+        return 1 if sem_correspondencia else 0
+
+    # Grava em arquivo temporário e troca de uma vez: o dashboard nunca lê um CSV pela metade
+    saida = saida or arquivo
+    temporario = f"{saida}.tmp"
+    dados.to_csv(temporario, index=False)
+    os.replace(temporario, saida)
+    print(f"💾 Códigos gravados em {saida}")
+    return 1 if sem_correspondencia else 0
+
+
+# =============================================================================
+# VERSÕES DO DATASET
+# =============================================================================
+
+def _arquivar_versao(dashboard, origem, identificador):
+    """Copia o CSV para o diretório de versões e retorna o caminho arquivado"""
+    os.makedirs(dashboard.DIRETORIO_VERSOES, exist_ok=True)
+    destino = os.path.join(dashboard.DIRETORIO_VERSOES, f"{identificador}.csv")
+    shutil.copyfile(origem, destino)
+    return destino
+
+
+def _identificador_versao(historico, instante):
+    """Identificador da versão pelo horário (com sufixo se já existir no histórico)"""
+    base = instante.strftime('%Y%m%d-%H%M%S')
+    existentes = {entrada['id'] for entrada in historico}
+    identificador, sufixo = base, 1
+    while identificador in existentes:
+        sufixo += 1
+        identificador = f"{base}-{sufixo}"
+    return identificador
+
+
+def comando_ingerir(args):
+    """Calcula a diferença por município para a versão ativa, arquiva e coloca a nova versão no ar"""
+    import pandas as pd
+
+    novo_arquivo = os.path.abspath(args.arquivo)
+    dashboard = _importar_dashboard()
+    ativo = dashboard.localizar_arquivo_dados()
+    if not os.path.exists(novo_arquivo):
+        print(f"❌ Arquivo não encontrado: {novo_arquivo}", file=sys.stderr)
+        return 1
+    if not ativo:
+        print("❌ Nenhum CSV de precificação ativo em dados/", file=sys.stderr)
+        return 1
+
+    base = pd.read_csv(ativo, dtype=str)
+    novo = pd.read_csv(novo_arquivo, dtype=str)
+    try:
+        diferenca = dashboard.diferenca_por_municipio(base, novo)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    alterados = diferenca['alterados']
+    contagem_colunas = {}
+    for colunas in alterados.values():
+        for coluna in colunas:
+            contagem_colunas[coluna] = contagem_colunas.get(coluna, 0) + 1
+    print(f"🔎 {novo_arquivo} → {ativo}")
+    print(f"   ✏️ {len(alterados)} município(s) alterado(s)")
+    for coluna, total in sorted(contagem_colunas.items(), key=lambda item: -item[1])[:10]:
+        print(f"      {coluna:<24} {total}")
+    print(f"   ➕ {len(diferenca['adicionados'])} adicionado(s)   ➖ {len(diferenca['removidos'])} removido(s)")
+    if diferenca['colunas_adicionadas'] or diferenca['colunas_removidas']:
+        print(f"   🧱 colunas novas: {diferenca['colunas_adicionadas']}  removidas: {diferenca['colunas_removidas']}")
+    incremental = diferenca['incremental']
+    print("   ⚡ atualização incremental" if incremental else "   🔄 recarga completa (linhas, ordem ou colunas mudaram)")
+
+    if args.simular:
+        return 0
+    if incremental and not alterados:
+        print("✅ Nenhuma mudança: versão ativa mantida")
+        return 0
+
+    historico = dashboard.historico_versoes()
+    versao_base = dashboard.versao_arquivo_dados(ativo)
+    if not historico or historico[-1]['versao'] != versao_base:
+        # Primeira ingestão (ou arquivo ativo trocado fora do comando): arquiva a versão atual
+        instante = datetime.fromtimestamp(os.path.getmtime(ativo))
+        identificador = _identificador_versao(historico, instante)
+        historico.append({
+            'id': identificador,
+            'horario': instante.isoformat(timespec='seconds'),
+            'arquivo': _arquivar_versao(dashboard, ativo, identificador),
+            'delta': None,
+            'versao': versao_base,
+            'versao_base': None,
+            'linhas': len(base),
+        })
+
+    instante = datetime.now()
+    identificador = _identificador_versao(historico, instante)
+    arquivo_versao = _arquivar_versao(dashboard, novo_arquivo, identificador)
+    arquivo_delta = None
+    if incremental:
+        arquivo_delta = os.path.join(dashboard.DIRETORIO_VERSOES, f"{identificador}.delta.csv")
+        codigos = pd.to_numeric(novo['CD_MUN'], errors='coerce')
+        novo[codigos.isin(list(alterados)).to_numpy()].to_csv(arquivo_delta, index=False)
+
+    # A cópia temporária já tem o tamanho e a data de modificação do arquivo final: o histórico
+    # é gravado antes da troca, e o observador do dashboard encontra o delta ao ver a versão nova
+    temporario = f"{ativo}.tmp"
+    shutil.copyfile(novo_arquivo, temporario)
+    historico.append({
+        'id': identificador,
+        'horario': instante.isoformat(timespec='seconds'),
+        'arquivo': arquivo_versao,
+        'delta': arquivo_delta,
+        'versao': dashboard.versao_arquivo_dados(temporario, nome=os.path.basename(ativo)),
+        'versao_base': versao_base,
+        'linhas': len(novo),
+        'alterados': {str(codigo): colunas for codigo, colunas in alterados.items()},
+        'adicionados': diferenca['adicionados'],
+        'removidos': diferenca['removidos'],
+    })
+    dashboard.gravar_historico_versoes(historico)
+    os.replace(temporario, ativo)
+    print(f"💾 Versão {identificador} ativa em {ativo} (arquivada em {arquivo_versao})")
+    return 0
+
+
+def comando_versoes(args):
+    """Lista as versões do dataset registradas no histórico"""
+    dashboard = _importar_dashboard()
+    historico = dashboard.historico_versoes()
+    if not historico:
+        print("Nenhuma versão registrada (use: python precificacao_cli.py ingerir <arquivo.csv>)")
+        return 0
+    ativo = dashboard.localizar_arquivo_dados()
+    versao_ativa = dashboard.versao_arquivo_dados(ativo) if ativo else None
+    for entrada in historico:
+        marcador = '▶' if entrada['versao'] == versao_ativa else ' '
+        mudancas = (f"{len(entrada.get('alterados', {}))} alterado(s), {len(entrada.get('adicionados', []))} adicionado(s), "
+                    f"{len(entrada.get('removidos', []))} removido(s)") if entrada['versao_base'] else "versão inicial"
+        modo = ' · delta' if entrada['delta'] else ''
+        print(f"{marcador} {entrada['id']:<18} {entrada['horario']}  {entrada['linhas']:>6} linhas  {mudancas}{modo}")
+    return 0
+
+
+# =============================================================================
+# INGESTÃO EM BLOCOS
+# =============================================================================
+
+def _pico_memoria_mb():
+    """Pico de memória residente do processo em MB (None sem o módulo resource)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS em bytes
+    return pico / 1024**2 if sys.platform == 'darwin' else pico / 1024
+
+
+def comando_converter(args):
+    """Converte um CSV de precificação em blocos para o Parquet lido pelo dashboard"""
+    arquivo = os.path.abspath(args.arquivo) if args.arquivo else None
+    saida = os.path.abspath(args.saida) if args.saida else None
+    dashboard = _importar_dashboard()
+    arquivo = arquivo or dashboard.localizar_arquivo_dados()
+    if not arquivo or not os.path.exists(arquivo):
+        print(f"❌ CSV não encontrado: {arquivo}", file=sys.stderr)
+        return 1
+    # Sem --saida, grava onde o dashboard procura a versão atual do arquivo
+    saida = saida or dashboard.caminho_armazenamento_colunar(arquivo)
+
+    def progresso(linhas, fracao):
+        print(f"\r   {fracao:6.1%}  {linhas:>12,} linhas".replace(',', '.'), end='', flush=True)
+
+    linhas_por_bloco = args.linhas_por_bloco or dashboard.LINHAS_POR_BLOCO_INGESTAO
+    print(f"📥 {arquivo} ({os.path.getsize(arquivo) / 1024**2:.1f} MB) em blocos de {linhas_por_bloco} linhas")
+    inicio = time.perf_counter()
+    try:
+        linhas = dashboard.ingerir_csv_em_blocos(arquivo, saida, linhas_por_bloco, progresso=progresso)
+    except (ValueError, OSError) as e:
+        print(f"\n❌ {e}", file=sys.stderr)
+        return 1
+    print()
+    pico = _pico_memoria_mb()
+    print(f"💾 {linhas} linhas em {saida} ({os.path.getsize(saida) / 1024**2:.1f} MB, "
+          f"{time.perf_counter() - inicio:.1f}s" + (f", pico de memória {pico:.0f} MB)" if pico else ")"))
+    return 0
+
+
+# =============================================================================
+# PONTO DE ENTRADA
+# =============================================================================
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        description="Ferramentas de linha de comando do Dashboard de Precificação"
+    )
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    parser_relatorios = subparsers.add_parser(
+        'relatorios', help="Gera relatórios PDF em lote (por município, faixa de preço ou UF)"
+    )
+    parser_relatorios.add_argument(
+        '--por', choices=['municipio', 'faixa', 'uf'], default='municipio',
+        help="Agrupamento dos relatórios (padrão: municipio)"
+    )
+    parser_relatorios.add_argument(
+        '--saida', default='relatorios',
+        help="Diretório de saída dos PDFs e do manifesto (padrão: relatorios/)"
+    )
+    parser_relatorios.add_argument(
+        '--processos', type=int, default=None,
+        help="Número de processos do pool (padrão: número de CPUs)"
+    )
+    parser_relatorios.add_argument(
+        '--titulo', default=None,
+        help="Título da capa; o rótulo do grupo vira o subtítulo (padrão: relatório executivo)"
+    )
+    parser_relatorios.add_argument(
+        '--limite', type=int, default=None,
+        help="Gera apenas os N primeiros grupos (útil para testes)"
+    )
+    parser_relatorios.add_argument(
+        '--versao', default=None,
+        help="Gera a partir de uma versão arquivada do dataset (id listado em 'versoes'; padrão: versão ativa)"
+    )
+    parser_relatorios.set_defaults(funcao=comando_relatorios)
+
+    parser_benchmark = subparsers.add_parser(
+        'benchmark-importacao', help="Mede o tempo de importação a frio do dashboard e das pilhas pesadas"
+    )
+    parser_benchmark.add_argument(
+        '--repeticoes', type=int, default=3,
+        help="Processos novos por medição; o resultado é a mediana (padrão: 3)"
+    )
+    parser_benchmark.set_defaults(funcao=comando_benchmark_importacao)
+
+    parser_formatacao = subparsers.add_parser(
+        'benchmark-formatacao', help="Compara a formatação vetorizada de tabelas com a formatação célula a célula"
+    )
+    parser_formatacao.add_argument(
+        '--linhas', type=int, default=100_000,
+        help="Linhas do DataFrame sintético (padrão: 100000)"
+    )
+    parser_formatacao.add_argument(
+        '--repeticoes', type=int, default=3,
+        help="Execuções por formatação; o resultado é o melhor tempo (padrão: 3)"
+    )
+    parser_formatacao.add_argument(
+        '--semente', type=int, default=42,
+        help="Semente do gerador de dados sintéticos (padrão: 42)"
+    )
+    parser_formatacao.set_defaults(funcao=comando_benchmark_formatacao)
+
+    parser_aquecer = subparsers.add_parser(
+        'aquecer', help="Preenche os caches (dados, índice de busca, estatísticas, geometria) ou aguarda o servidor"
+    )
+    parser_aquecer.add_argument(
+        '--url', default=None,
+        help="Endereço do servidor (ex.: http://localhost:8520); aguarda o endpoint de prontidão responder"
+    )
+    parser_aquecer.add_argument(
+        '--timeout', type=int, default=120,
+        help="Tempo máximo de espera pelo servidor, em segundos (padrão: 120)"
+    )
+    parser_aquecer.set_defaults(funcao=comando_aquecer)
+
+    parser_centroides = subparsers.add_parser(
+        'centroides', help="Deriva do shapefile nacional a tabela de centroides do mapa simplificado"
+    )
+    parser_centroides.add_argument(
+        '--shapefile', default='dados/geo/municipios_brasil_com_uf.shp',
+        help="Shapefile com CD_MUN, NM_MUN e SIGLA_UF (padrão: dados/geo/municipios_brasil_com_uf.shp)"
+    )
+    parser_centroides.add_argument(
+        '--saida', default='dados/geo/centroides_municipios.npz',
+        help="Arquivo NumPy de saída (padrão: dados/geo/centroides_municipios.npz)"
+    )
+    parser_centroides.set_defaults(funcao=comando_centroides)
+
+    parser_reconciliar = subparsers.add_parser(
+        'reconciliar', help="Preenche o código IBGE (CD_MUN) do CSV de precificação a partir do nome + UF"
+    )
+    parser_reconciliar.add_argument(
+        '--arquivo', default=None,
+        help="CSV de precificação (padrão: o mesmo arquivo que o dashboard carrega)"
+    )
+    parser_reconciliar.add_argument(
+        '--saida', default=None,
+        help="Arquivo de saída (padrão: sobrescreve o arquivo de entrada)"
+    )
+    parser_reconciliar.add_argument(
+        '--simular', action='store_true',
+        help="Apenas mostra o relatório, sem gravar"
+    )
+    parser_reconciliar.set_defaults(funcao=comando_reconciliar)
+
+    parser_ingerir = subparsers.add_parser(
+        'ingerir', help="Coloca no ar uma nova versão do CSV de precificação (diferença por município, arquivo e delta)"
+    )
+    parser_ingerir.add_argument('arquivo', help="CSV com a nova versão dos dados")
+    parser_ingerir.add_argument(
+        '--simular', action='store_true',
+        help="Apenas mostra a diferença para a versão ativa, sem gravar"
+    )
+    parser_ingerir.set_defaults(funcao=comando_ingerir)
+
+    parser_versoes = subparsers.add_parser(
+        'versoes', help="Lista as versões do dataset registradas (use o id em 'relatorios --versao')"
+    )
+    parser_versoes.set_defaults(funcao=comando_versoes)
+
+    parser_converter = subparsers.add_parser(
+        'converter', help="Converte um CSV grande em blocos para Parquet (memória limitada ao tamanho do bloco)"
+    )
+    parser_converter.add_argument(
+        '--arquivo', default=None,
+        help="CSV de precificação (padrão: o mesmo arquivo que o dashboard carrega)"
+    )
+    parser_converter.add_argument(
+        '--saida', default=None,
+        help="Parquet de saída (padrão: o armazenamento colunar que o dashboard lê para a versão atual)"
+    )
+    parser_converter.add_argument(
+        '--linhas-por-bloco', type=int, default=None,
+        help="Linhas lidas e processadas por bloco (padrão: LINHAS_POR_BLOCO_INGESTAO do dashboard)"
+    )
+    parser_converter.set_defaults(funcao=comando_converter)
+
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    return args.funcao(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())